@@ -0,0 +1,264 @@
+"""
+Non-blocking sibling of ClientBase that multiplexes many requests over
+a single thread with select().
+"""
+
+import errno
+import httplib
+import logging
+import select
+import socket
+import ssl
+import time
+from cStringIO import StringIO
+from common import config
+from client_base import ClientError
+
+_READ, _WRITE = 'r', 'w'
+
+
+class _BufferSocket(object):
+    """
+    Just enough of a socket for httplib.HTTPResponse to parse a
+    response that has already been received in full.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def makefile(self, *args, **kwargs):
+        return StringIO(self._data)
+
+
+class _Exchange(object):
+    """
+    One request/response round trip, driven a step at a time by
+    AsyncClientBase's event loop whenever its socket becomes ready.
+    """
+
+    def __init__(self, client, addr, url, request, headers, deadline):
+        self.client = client
+        self.url = url
+        self.deadline = deadline
+        self.started = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.done = False
+        self._recv = []
+        lines = ["POST %s HTTP/1.1" % url,
+                 "Host: %s" % client.host_header,
+                 "Content-length: %d" % len(request),
+                 "Connection: close"]
+        for header, value in headers.items():
+            lines.append("%s: %s" % (header, value))
+        self._out = memoryview("\r\n".join(lines) + "\r\n\r\n" + request)
+        family, socktype, proto, _, sockaddr = addr
+        self.sock = socket.socket(family, socktype, proto)
+        self.sock.setblocking(0)
+        err = self.sock.connect_ex(sockaddr)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.sock.close()
+            raise socket.error(err, "connect failed")
+        self.wants = _WRITE
+        self._step = self._connected
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def step(self):
+        try:
+            self._step()
+        except ssl.SSLWantReadError:
+            self.wants = _READ
+        except ssl.SSLWantWriteError:
+            self.wants = _WRITE
+        except (socket.error, httplib.HTTPException, ClientError), err:
+            self.finish(error=err)
+
+    def finish(self, result=None, error=None):
+        self.result, self.error, self.done = result, error, True
+        self.finished = time.time()
+        self.sock.close()
+
+    def close(self):
+        self.sock.close()
+
+    def _connected(self):
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            raise socket.error(err, "connect failed")
+        if self.client.use_ssl:
+            self.sock = self.client.ssl_context.wrap_socket(
+                self.sock, server_hostname=self.client.host,
+                do_handshake_on_connect=False)
+            self._step = self._handshake
+        else:
+            self._step = self._send
+        self._step()
+
+    def _handshake(self):
+        self.sock.do_handshake()
+        self._step = self._send
+        self._step()
+
+    def _send(self):
+        self.wants = _WRITE
+        sent = self.sock.send(self._out)
+        self._out = self._out[sent:]
+        if not len(self._out):
+            self.wants = _READ
+            self._step = self._receive
+
+    def _receive(self):
+        self.wants = _READ
+        while True:
+            # an SSL socket may hold decrypted data that select() can't
+            # see, so keep reading until it would block
+            try:
+                data = self.sock.recv(65536)
+            except ssl.SSLError, err:
+                # plenty of servers close without a TLS close_notify;
+                # httplib's framing still catches a truncated response
+                if not (isinstance(err, ssl.SSLEOFError) or
+                        'unexpected eof' in str(err).lower()):
+                    raise
+                data = ''
+            except socket.error, err:
+                if err.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            if not data:
+                break
+            self._recv.append(data)
+        response = httplib.HTTPResponse(_BufferSocket(''.join(self._recv)),
+                                        method='POST')
+        response.begin()
+        resp = response.read()
+        if (response.status != 200):
+            self.client.log.error("HTTP %d: %s", response.status, resp)
+            raise ClientError(resp)
+        self.finish(result=resp)
+
+
+class AsyncClientBase(object):
+    """
+    AsyncClientBase has the same send_command(url, request, headers)
+    contract as ClientBase, but rather than blocking a thread on every
+    request it drives non-blocking sockets from one select() loop.
+    send_many() uses that to send a whole batch concurrently while
+    keeping no more than max_in_flight requests open at once.
+    """
+
+    def __init__(self, host, port, headers={}, use_ssl=True,
+                 max_in_flight=64, timeout=600.0, ssl_context=None):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.use_ssl = use_ssl
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        if use_ssl and ssl_context is None:
+            ssl_context = ssl.create_default_context()
+        self.ssl_context = ssl_context
+        if self.port == (443 if use_ssl else 80):
+            self.host_header = host
+        else:
+            self.host_header = "%s:%s" % (host, port)
+        self.log = logging.getLogger(__name__)
+        FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+        logging.basicConfig(filename=config('DEBUG_LOGFILE'),
+                            level=logging.DEBUG, format=FORMAT)
+
+    def send_command(self, url, request, headers={}):
+        """
+        Sends request to url with supplied headers.
+        """
+        return self.send_many([(url, request, headers)])[0]
+
+    def send_many(self, commands, max_in_flight=None,
+                  return_exceptions=False, timings=None):
+        """
+        Sends each (url, request[, headers]) in commands concurrently
+        and returns the responses in the same order. A failed command
+        doesn't stop the rest of the batch; once the batch is done the
+        first failure is raised, or with return_exceptions=True each
+        failure is returned in its command's place instead.
+
+        A request may be text, which is sent UTF-8 encoded, or a byte
+        string, which is sent as it is. If timings is a list, it's
+        filled with the seconds each command took from opening its
+        connection to finishing (None for one that couldn't connect).
+        """
+        if max_in_flight is None:
+            max_in_flight = self.max_in_flight
+        commands = list(commands)
+        results = [None] * len(commands)
+        if timings is not None:
+            timings[:] = [None] * len(commands)
+        try:
+            addr = socket.getaddrinfo(self.host, self.port, 0,
+                                      socket.SOCK_STREAM)[0]
+        except socket.error, err:
+            self.log.error("lookup of %s failed - %s", self.host, err)
+            raise socket.error("connect failed")
+        self.log.debug("sending %d commands to %s:%s", len(commands),
+                       self.host, self.port)
+        queued = iter(enumerate(commands))
+        active = {}
+        exhausted = False
+        try:
+            while active or not exhausted:
+                while not exhausted and len(active) < max_in_flight:
+                    try:
+                        index, command = queued.next()
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    url, request = command[:2]
+                    headers = command[2] if len(command) > 2 else {}
+                    if isinstance(request, unicode):
+                        request = request.encode('utf-8')
+                    try:
+                        active[index] = _Exchange(
+                            self, addr, url, request, headers,
+                            time.time() + self.timeout)
+                    except socket.error, err:
+                        results[index] = err
+                if not active:
+                    continue
+                now = time.time()
+                wait = max(0, min(x.deadline for x in active.values()) - now)
+                readable, writable, _ = select.select(
+                    [x for x in active.values() if x.wants == _READ],
+                    [x for x in active.values() if x.wants == _WRITE], [],
+                    wait)
+                for exchange in readable + writable:
+                    exchange.step()
+                now = time.time()
+                for index, exchange in active.items():
+                    if not exchange.done and exchange.deadline <= now:
+                        exchange.finish(error=socket.timeout(
+                            "Socket read() timed out"))
+                    if exchange.done:
+                        del active[index]
+                        if timings is not None:
+                            timings[index] = (exchange.finished -
+                                              exchange.started)
+                        if exchange.error is not None:
+                            self.log.error("send_command %s:%s%s failed - %s",
+                                           self.host, self.port, exchange.url,
+                                           exchange.error)
+                            results[index] = exchange.error
+                        else:
+                            results[index] = exchange.result
+        finally:
+            # don't leak the sockets of exchanges cut short by an error
+            for exchange in active.values():
+                exchange.close()
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        self.log.info("send_many(%d commands) done", len(commands))
+        return results
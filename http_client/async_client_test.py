@@ -0,0 +1,179 @@
+"""
+Unit tests for async_client
+"""
+import unittest
+from mock import Mock, patch
+import async_client
+import socket
+
+
+class FakeExchange(object):
+    in_flight = 0
+    max_in_flight = 0
+    closed = 0
+
+    def __init__(self, client, addr, url, request, headers, deadline):
+        self.url = url
+        self.request = request
+        self.deadline = deadline
+        self.started = deadline - 600
+        self.finished = None
+        self.wants = async_client._READ
+        self.done = False
+        self.result = self.error = None
+        FakeExchange.in_flight += 1
+        FakeExchange.max_in_flight = max(FakeExchange.max_in_flight,
+                                         FakeExchange.in_flight)
+
+    def close(self):
+        FakeExchange.closed += 1
+
+    def step(self):
+        FakeExchange.in_flight -= 1
+        self.done = True
+        self.finished = self.started + len(self.request)
+        if self.request == 'bad':
+            self.error = async_client.ClientError('bad')
+        else:
+            self.result = 'echo:' + self.request
+
+
+class AsyncClientBaseTest(unittest.TestCase):
+
+    def setUp(self):
+        # keep basicConfig() from creating the log file in the tree
+        patcher = patch.object(async_client.logging, 'basicConfig')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        async_client.config = Mock()
+        async_client.config.return_value = "testfilename.log"
+        async_client.socket = Mock(wraps=socket)
+        async_client.socket.error = socket.error
+        async_client.socket.timeout = socket.timeout
+        async_client.socket.getaddrinfo = Mock()
+        async_client.socket.getaddrinfo.return_value = [
+            (2, 1, 6, '', ('127.0.0.1', 443))]
+        async_client.select = Mock()
+        async_client.select.select.side_effect = lambda r, w, x, t: (r, w, x)
+        self.real_exchange = async_client._Exchange
+        async_client._Exchange = FakeExchange
+        FakeExchange.in_flight = FakeExchange.max_in_flight = 0
+        FakeExchange.closed = 0
+        self.obj_ut = async_client.AsyncClientBase('testhost', 443)
+        self.obj_ut.log = Mock()
+
+    def tearDown(self):
+        async_client._Exchange = self.real_exchange
+        async_client.socket = socket
+
+    def test_send_command(self):
+        self.assertEqual(self.obj_ut.send_command('/foo', 'data'),
+                         'echo:data')
+
+    def test_send_many_in_order_and_bounded(self):
+        commands = [('/foo', 'r%d' % i) for i in range(20)]
+        r = self.obj_ut.send_many(commands, max_in_flight=4)
+        self.assertEqual(r, ['echo:r%d' % i for i in range(20)])
+        self.assertEqual(FakeExchange.max_in_flight, 4)
+
+    def test_send_many_errors(self):
+        commands = [('/foo', 'a'), ('/foo', 'bad', {'X-A': 'b'}),
+                    ('/foo', 'c')]
+        r = self.obj_ut.send_many(commands, return_exceptions=True)
+        self.assertEqual(r[0], 'echo:a')
+        self.assertTrue(isinstance(r[1], async_client.ClientError))
+        self.assertEqual(r[2], 'echo:c')
+        with self.assertRaises(async_client.ClientError):
+            self.obj_ut.send_many(commands)
+
+    def test_send_many_timings(self):
+        timings = ['stale']
+        self.obj_ut.send_many([('/foo', 'a'), ('/foo', 'abc')],
+                              max_in_flight=1, timings=timings)
+        self.assertEqual(timings, [1, 3])
+
+    def test_send_many_bodies(self):
+        r = self.obj_ut.send_many([('/foo', u'caf\xe9'),
+                                   ('/foo', 'caf\xc3\xa9')])
+        self.assertEqual(r, ['echo:caf\xc3\xa9', 'echo:caf\xc3\xa9'])
+
+    def test_send_many_closes_on_error(self):
+        async_client.select.select.side_effect = KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            self.obj_ut.send_many([('/foo', 'a'), ('/foo', 'b')])
+        self.assertEqual(FakeExchange.closed, 2)
+
+    def test_send_many_lookup_failure(self):
+        async_client.socket.getaddrinfo.side_effect = socket.gaierror(-2)
+        with self.assertRaises(socket.error):
+            self.obj_ut.send_many([('/foo', 'a')])
+
+
+class ExchangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.client.use_ssl = False
+        self.client.host_header = 'testhost'
+        async_client.socket = Mock(wraps=socket)
+        async_client.socket.error = socket.error
+        self.sock = Mock()
+        self.sock.connect_ex.return_value = 0
+        self.sock.getsockopt.return_value = 0
+        async_client.socket.socket = Mock(return_value=self.sock)
+
+    def tearDown(self):
+        async_client.socket = socket
+
+    def exchange(self):
+        return async_client._Exchange(
+            self.client, (2, 1, 6, '', ('127.0.0.1', 80)), '/foo', 'data',
+            {'X-A': 'b'}, 0)
+
+    def test_round_trip(self):
+        self.sock.send.side_effect = lambda buf: len(buf)
+        self.sock.recv.side_effect = [
+            'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\n', 'crap', '']
+        x = self.exchange()
+        x.step()
+        sent = self.sock.send.call_args[0][0].tobytes()
+        self.assertTrue(sent.startswith('POST /foo HTTP/1.1\r\n'))
+        self.assertTrue('\r\nX-A: b\r\n' in sent)
+        self.assertTrue(sent.endswith('\r\n\r\ndata'))
+        self.assertEqual(x.wants, async_client._READ)
+        x.step()
+        self.assertTrue(x.done)
+        self.assertEqual(x.result, 'crap')
+        self.sock.close.assert_called_once_with()
+
+    def test_http_error(self):
+        self.sock.send.side_effect = lambda buf: len(buf)
+        self.sock.recv.side_effect = [
+            'HTTP/1.1 500 Oops\r\nContent-Length: 4\r\n\r\nfail', '']
+        x = self.exchange()
+        x.step()
+        x.step()
+        self.assertTrue(isinstance(x.error, async_client.ClientError))
+
+    def test_partial_reads(self):
+        self.sock.send.side_effect = lambda buf: len(buf)
+        self.sock.recv.side_effect = [
+            'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\ncr',
+            socket.error(async_client.errno.EAGAIN), 'ap', '']
+        x = self.exchange()
+        x.step()
+        x.step()
+        self.assertFalse(x.done)
+        x.step()
+        self.assertEqual(x.result, 'crap')
+
+    def test_connect_refused(self):
+        self.sock.getsockopt.return_value = 111
+        x = self.exchange()
+        x.step()
+        self.assertTrue(x.done)
+        self.assertTrue(isinstance(x.error, socket.error))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+"""
+Throughput and latency benchmark for ClientBase.
+
+Starts a local stand-in HTTP (or HTTPS) server with configurable
+latency, payload sizes and error rate, then drives ClientBase against
+it in each requested mode (httplib, urllib, and AsyncClientBase as
+async) at each concurrency level. Every run happens in a fresh child
+process so its peak RSS is its own.
+
+Results are written as JSON, and a previous results file can be given
+with --compare to fail (exit status 1) on regressions:
+
+    ./benchmark.py --requests 2000 --concurrency 1,8,32 -o new.json
+    ./benchmark.py --requests 2000 --concurrency 1,8,32 --compare new.json
+"""
+
+import BaseHTTPServer
+import SocketServer
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from optparse import OptionParser, SUPPRESS_HELP
+
+MODES = ('httplib', 'urllib', 'async')
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers every POST with server.payload after server.latency seconds
+    (plus up to server.jitter more), or with a 500 for a server.error_rate
+    fraction of requests.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('content-length', 0))
+        self.rfile.read(length)
+        delay = server.latency + random.random() * server.jitter
+        if delay:
+            time.sleep(delay)
+        if random.random() < server.error_rate:
+            body = 'injected error'
+            self.send_response(500)
+        else:
+            body = server.payload
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.0, jitter=0.0, response_size=1024,
+                 error_rate=0.0, certfile=None, keyfile=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           StandInHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload = 'x' * response_size
+        if certfile is not None:
+            self.socket = ssl.wrap_socket(self.socket, keyfile, certfile,
+                                          server_side=True)
+
+    def shutdown_request(self, request):
+        # send close_notify, or clients reading to EOF (urllib) see the
+        # close as a truncation attack
+        if isinstance(request, ssl.SSLSocket):
+            try:
+                request = request.unwrap()
+            except (ssl.SSLError, socket.error):
+                pass
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def handle_error(self, request, client_address):
+        # clients hanging up mid-request are expected
+        pass
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.server_address[1]
+
+
+def make_certificate(directory):
+    """
+    Creates a throwaway self-signed certificate with the openssl command
+    and returns (certfile, keyfile).
+    """
+    certfile = os.path.join(directory, 'cert.pem')
+    keyfile = os.path.join(directory, 'key.pem')
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+             '-days', '1', '-subj', '/CN=localhost', '-keyout', keyfile,
+             '-out', certfile], stdout=devnull, stderr=devnull)
+    return certfile, keyfile
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+def run_client(options):
+    """
+    Runs one benchmark (one mode at one concurrency) in this process
+    and returns its results as a dict.
+    """
+    import client_base
+    import async_client
+    if not options.with_logging:
+        logging.disable(logging.CRITICAL)
+    if options.ssl:
+        # the stand-in server's certificate is self-signed
+        ssl._create_default_https_context = ssl._create_unverified_context
+    concurrency = options.concurrency_level
+    request = 'r' * options.request_size
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    host = 'localhost' if options.ssl else '127.0.0.1'
+
+    if options.mode == 'async':
+        client = async_client.AsyncClientBase(
+            host, options.port, use_ssl=options.ssl,
+            ssl_context=ssl._create_unverified_context())
+        # one send_many() keeps `concurrency` requests in flight for the
+        # whole run, and times each request on its own
+        timings = []
+        started = time.time()
+        results = client.send_many([('/bench', request)] * options.requests,
+                                   max_in_flight=concurrency,
+                                   return_exceptions=True, timings=timings)
+        for result, seconds in zip(results, timings):
+            if isinstance(result, Exception):
+                errors[0] += 1
+            else:
+                latencies.append(seconds)
+    else:
+        per_thread = [options.requests // concurrency] * concurrency
+        for i in range(options.requests % concurrency):
+            per_thread[i] += 1
+
+        def worker(count):
+            client = client_base.ClientBase(
+                host, options.port, use_ssl=options.ssl,
+                use_urllib=(options.mode == 'urllib'))
+            mine = []
+            failed = 0
+            for i in xrange(count):
+                t = time.time()
+                try:
+                    client.send_command('/bench', request)
+                except Exception:
+                    failed += 1
+                else:
+                    mine.append(time.time() - t)
+            with lock:
+                latencies.extend(mine)
+                errors[0] += failed
+
+        threads = [threading.Thread(target=worker, args=(n, ))
+                   for n in per_thread]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.time() - started
+    latencies.sort()
+    return {'mode': options.mode,
+            'concurrency': concurrency,
+            'requests': options.requests,
+            'errors': errors[0],
+            'seconds': elapsed,
+            'rps': options.requests / elapsed,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+            'max_rss_kb': resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss}
+
+
+def run_child(options, mode, concurrency, port):
+    args = [sys.executable, os.path.abspath(__file__), '--client-only',
+            '--mode', mode, '--concurrency', str(concurrency),
+            '--port', str(port), '--requests', str(options.requests),
+            '--request-size', str(options.request_size)]
+    if options.ssl:
+        args.append('--ssl')
+    if options.with_logging:
+        args.append('--with-logging')
+    output = subprocess.check_output(args)
+    return json.loads(output)
+
+
+def compare(old, new, tolerance):
+    """
+    Returns a list of descriptions of runs in new that are more than
+    tolerance (a fraction) slower than the same run in old.
+    """
+    before = dict(((r['mode'], r['concurrency']), r) for r in old['results'])
+    regressions = []
+    for result in new['results']:
+        previous = before.get((result['mode'], result['concurrency']))
+        if previous is None:
+            continue
+        name = '%s x%d' % (result['mode'], result['concurrency'])
+        if result['rps'] < previous['rps'] * (1 - tolerance):
+            regressions.append('%s: %.0f req/s, was %.0f' % (
+                name, result['rps'], previous['rps']))
+        if (result['p99'] is not None and previous['p99'] is not None and
+                result['p99'] > previous['p99'] * (1 + tolerance)):
+            regressions.append('%s: p99 %.2fms, was %.2fms' % (
+                name, result['p99'] * 1000, previous['p99'] * 1000))
+    return regressions
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog <options>")
+    parser.add_option('-n', '--requests', type='int', default=1000,
+        help="Requests per run (default 1000)")
+    parser.add_option('-c', '--concurrency', default='1,4,16',
+        help="Comma separated concurrency levels (default 1,4,16)")
+    parser.add_option('-m', '--modes', default=','.join(MODES),
+        help="Comma separated client modes (default %s)" % ','.join(MODES))
+    parser.add_option('--ssl', action='store_true', default=False,
+        help="Serve HTTPS with a throwaway self-signed certificate")
+    parser.add_option('--latency', type='float', default=0.0,
+        help="Server latency per request in ms")
+    parser.add_option('--jitter', type='float', default=0.0,
+        help="Random extra server latency of up to this many ms")
+    parser.add_option('--request-size', type='int', default=256,
+        help="Request body size in bytes")
+    parser.add_option('--response-size', type='int', default=1024,
+        help="Response body size in bytes")
+    parser.add_option('--error-rate', type='float', default=0.0,
+        help="Fraction of requests the server fails with a 500")
+    parser.add_option('-o', '--output', default=None,
+        help="Write JSON results here instead of stdout")
+    parser.add_option('--compare', default=None,
+        help="Previous results file to check for regressions against")
+    parser.add_option('--tolerance', type='float', default=0.1,
+        help="Allowed slowdown before --compare reports a regression")
+    parser.add_option('--with-logging', action='store_true', default=False,
+        help="Leave ClientBase's logging on")
+    # used internally to run a single benchmark in a child process
+    parser.add_option('--client-only', action='store_true', default=False,
+        help=SUPPRESS_HELP)
+    parser.add_option('--mode', help=SUPPRESS_HELP)
+    parser.add_option('--port', type='int', help=SUPPRESS_HELP)
+    options, args = parser.parse_args(argv[1:])
+
+    if options.client_only:
+        options.concurrency_level = int(options.concurrency)
+        print(json.dumps(run_client(options)))
+        return 0
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        certfile = keyfile = None
+        if options.ssl:
+            certfile, keyfile = make_certificate(tmpdir)
+        server = StandInServer(options.latency / 1000.0,
+                               options.jitter / 1000.0,
+                               options.response_size, options.error_rate,
+                               certfile, keyfile)
+        port = server.start()
+        results = []
+        for mode in options.modes.split(','):
+            for concurrency in options.concurrency.split(','):
+                result = run_child(options, mode, int(concurrency), port)
+                results.append(result)
+                sys.stderr.write(
+                    "%-8s x%-4d %8.0f req/s  p50 %7.2fms  p99 %7.2fms  "
+                    "errors %d  rss %dkB\n" % (
+                        mode, result['concurrency'], result['rps'],
+                        (result['p50'] or 0) * 1000,
+                        (result['p99'] or 0) * 1000, result['errors'],
+                        result['max_rss_kb']))
+        server.shutdown()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    report = {'python': sys.version.split()[0],
+              'config': {'requests': options.requests,
+                         'ssl': options.ssl,
+                         'latency_ms': options.latency,
+                         'jitter_ms': options.jitter,
+                         'request_size': options.request_size,
+                         'response_size': options.response_size,
+                         'error_rate': options.error_rate},
+              'results': results}
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if options.compare:
+        with open(options.compare) as f:
+            regressions = compare(json.load(f), report, options.tolerance)
+        for regression in regressions:
+            sys.stderr.write("REGRESSION: %s\n" % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
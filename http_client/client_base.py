@@ -3,11 +3,27 @@ Base class for HTTP-based clients.
 """
 
 import httplib
+import os
 import urllib
 import socket
 import select
+import ssl
 import logging
+import sys
+import threading
+import time
+import Queue
 from common import config
+from connection_pool import ConnectionPool
+from instrumentation import RequestTiming
+from resolver import CachingResolver
+
+# Shared by every ClientBase that isn't handed a pool or resolver of its
+# own.
+default_pool = ConnectionPool()
+default_resolver = CachingResolver()
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
 
 
 class ClientError(Exception):
@@ -17,14 +33,347 @@ class ClientError(Exception):
     pass
 
 
+class _DeadConnection(Exception):
+    """
+    Raised internally when a connection fails before any part of the
+    response has been received, so the request is safe to resend.
+    """
+    pass
+
+
+class Timeouts(object):
+    """
+    Per-phase time limits in seconds for ClientBase requests; None means
+    no limit. connect covers the TCP connect and TLS handshake, write
+    the wait for the socket to accept the request, and first_byte the
+    wait for the response to start arriving. total, if set, caps the
+    whole request from start to the end of the response body, and
+    shortens the other limits as it runs out.
+    """
+
+    def __init__(self, connect=None, write=600.0, first_byte=600.0,
+                 total=None):
+        self.connect = connect
+        self.write = write
+        self.first_byte = first_byte
+        self.total = total
+
+    def deadline(self):
+        """
+        The time by which a request starting now must finish, or None.
+        """
+        if self.total is None:
+            return None
+        return time.time() + self.total
+
+
+def _phase_timeout(limit, deadline):
+    """
+    Returns how long a phase may take given its own limit and the
+    request's overall deadline, raising socket.timeout if the deadline
+    has already passed.
+    """
+    if deadline is None:
+        return limit
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise socket.timeout("Request deadline exceeded")
+    if limit is None:
+        return remaining
+    return min(limit, remaining)
+
+
+class _DeadlineSocket(object):
+    """
+    Wraps the socket a response body is read from so that each recv()
+    waits no longer than is left before deadline, and raises
+    socket.timeout once it has passed. A single socket timeout would
+    only bound each recv(), and a server trickling out the body could
+    keep the request going indefinitely.
+    """
+
+    def __init__(self, sock, deadline):
+        self._sock = sock
+        self._deadline = deadline
+
+    def recv(self, size):
+        self._sock.settimeout(_phase_timeout(None, self._deadline))
+        return self._sock.recv(size)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+def _limit_reads(response, deadline):
+    """
+    Make every read of response's body finish by deadline.
+    """
+    fp = response.fp
+    sock = getattr(fp, '_sock', None)
+    if sock is not None and not isinstance(sock, _DeadlineSocket):
+        fp._sock = _DeadlineSocket(sock, deadline)
+
+
+class _Attempt(object):
+    """
+    One of the attempts at a hedged request. Cancelling it shuts down
+    its connection, which wakes the thread waiting on it. lock is held
+    while cancelling and while the attempt releases its connection, so
+    a connection already back in the pool is never shut down.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+
+    def attach(self, connection):
+        with self.lock:
+            self.connection = connection
+            if self.cancelled:
+                self._shutdown()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            self._shutdown()
+
+    def _shutdown(self):
+        connection = self.connection
+        if connection is not None and connection.sock is not None:
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+def _preview(request, size=54):
+    """
+    The start of a request body for logging, without copying the rest.
+    """
+    if hasattr(request, 'read'):
+        return repr(request)
+    if isinstance(request, unicode):
+        return request[:size].encode('utf-8')
+    return str(request[:size])
+
+
+class _RequestBody(object):
+    """
+    A request body in whichever form the caller had it: text (encoded
+    to UTF-8 exactly once), a byte string, a bytearray or memoryview
+    (sent as-is without copying), or a file object (streamed from its
+    current position in fixed-size chunks).
+    """
+
+    chunk_size = 65536
+
+    def __init__(self, request):
+        if isinstance(request, unicode):
+            request = request.encode('utf-8')
+        self.request = request
+        self.is_file = hasattr(request, 'read')
+        if self.is_file:
+            self.start = request.tell()
+            try:
+                self.length = os.fstat(request.fileno()).st_size - self.start
+            except (AttributeError, IOError, OSError):
+                request.seek(0, os.SEEK_END)
+                self.length = request.tell() - self.start
+                request.seek(self.start)
+        elif isinstance(request, memoryview):
+            self.length = len(request) * request.itemsize
+        else:
+            self.length = len(request)
+
+    def rewind(self):
+        """
+        Get ready to send the body again.
+        """
+        if self.is_file:
+            self.request.seek(self.start)
+
+    def send(self, connection):
+        """
+        Send the body on connection, whose headers have been sent.
+        """
+        if not self.is_file:
+            connection.send(self.request)
+            return
+        buf = bytearray(self.chunk_size)
+        view = memoryview(buf)
+        readinto = getattr(self.request, 'readinto', None)
+        while True:
+            if readinto is not None:
+                n = readinto(buf)
+                chunk = view[:n]
+            else:
+                chunk = self.request.read(self.chunk_size)
+                n = len(chunk)
+            if not n:
+                break
+            connection.sock.sendall(chunk)
+
+class StreamingResponse(object):
+    """
+    A response body that is read from the server as the caller consumes
+    it rather than all at once, so memory use stays flat however large
+    the body is. Iterating yields chunks of up to chunk_size bytes and
+    readinto() fills a caller-supplied bytearray or memoryview. A
+    compressed body is decoded on the fly when a decoder is given.
+
+    Once the body has been read to the end the underlying connection is
+    released for reuse; close() (or leaving a with block) early gives up
+    on the rest of the body and drops the connection.
+    """
+
+    def __init__(self, fp, log, release, chunk_size=65536, decoder=None):
+        self._fp = fp
+        self._log = log
+        self._release = release
+        self._decoder = decoder
+        self._extra = ''
+        self.chunk_size = chunk_size
+        self.closed = False
+        self.bytes_read = 0
+
+    def read(self, amt=None):
+        """
+        Read up to amt bytes of the body, or the rest of it if amt is
+        None. Returns an empty string at the end of the body.
+        """
+        if self.closed:
+            return ''
+        try:
+            if self._decoder is not None:
+                data = self._read_decoded(amt)
+            elif amt is None:
+                data = self._fp.read()
+            else:
+                data = self._fp.read(amt)
+        except socket.sslerror, e:
+            self._log.error("read() failed due to sslerror \"%s\"", e)
+            self._finish(False)
+            raise
+        except:
+            self._finish(False)
+            raise
+        self.bytes_read += len(data)
+        if not data or amt is None:
+            self._finish(True)
+        return data
+
+    def _read_decoded(self, amt):
+        decoder = self._decoder
+        if amt is None:
+            data = self._extra + decoder.decompress(self._fp.read())
+            self._extra = ''
+            return data + decoder.flush()
+        while True:
+            if self._extra:
+                data = self._extra[:amt]
+                self._extra = self._extra[amt:]
+            elif decoder.pending:
+                data = decoder.decompress('', amt)
+            else:
+                raw = self._fp.read(amt)
+                if not raw:
+                    data = decoder.flush()
+                    self._extra = data[amt:]
+                    return data[:amt]
+                data = decoder.decompress(raw, amt)
+            if data:
+                return data
+
+    def readinto(self, b):
+        """
+        Read up to len(b) bytes of the body into b, a bytearray or
+        writable memoryview. Returns the number of bytes read, which is
+        0 at the end of the body.
+        """
+        view = memoryview(b)
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        self._finish(False)
+
+    def _finish(self, finished):
+        if not self.closed:
+            self.closed = True
+            self._release(finished)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 class ClientBase(object):
     """
     ClientBase is basically a thin wrapper around HTTPConnection.
     It handles things like timeouts and low level details of sending
     an HTTP payload to a server.
+
+    Connections are kept alive and reused through pool, which defaults
+    to a pool shared by all clients in the process. Pass a
+    ConnectionPool(maxsize=0) to get a new connection for every request.
+
+    Commands that are idempotent lookups can be answered from a
+    ResponseCache passed as cache; send_command_httplib() consults it
+    for every request, so don't give one to a client that sends
+    commands with side effects.
+
+    Requests made with httplib can be timed phase by phase (connect,
+    TLS handshake, request write, time to first byte and body read) by
+    registering a RequestObserver such as LatencyHistogram with
+    add_observer(). Nothing is timed while no observer is registered.
+
+    With a Compression as compression, large request bodies are
+    gzipped and gzip/deflate responses are accepted and decoded, also
+    when streamed. (urllib requests are never compressed.)
+
+    Name lookups go through resolver, a CachingResolver shared by all
+    clients unless one is given. All of a client's HTTPS connections
+    share one SSL context (ssl_context, or the default https context),
+    so CA certificates are loaded once per client rather than once per
+    handshake; tls_stats() counts the handshakes made.
+
+    timeouts sets per-phase limits (see Timeouts). With a HedgePolicy
+    as hedging, an idempotent request that hasn't been answered within
+    the policy's delay is sent a second time on another connection and
+    the first answer wins.
     """
 
-    def __init__(self, host, port, headers={}, use_ssl=True, use_urllib=False):
+    def __init__(self, host, port, headers={}, use_ssl=True, use_urllib=False,
+                 pool=None, cache=None, observers=(), timeouts=None,
+                 hedging=None, compression=None, resolver=None,
+                 ssl_context=None):
+        if pool is None:
+            pool = default_pool
+        if resolver is None:
+            resolver = default_resolver
+        if timeouts is None:
+            timeouts = Timeouts()
+        self.pool = pool
+        self.cache = cache
+        self.observers = list(observers)
+        self.timeouts = timeouts
+        self.hedging = hedging
+        self.compression = compression
+        self.resolver = resolver
+        self.ssl_context = ssl_context
+        self._handshakes = 0
+        self._handshakes_lock = threading.Lock()
         self.host = host
         self.port = port
         self.headers = headers
@@ -35,13 +384,66 @@ class ClientBase(object):
         logging.basicConfig(filename=config('DEBUG_LOGFILE'),
                             level=logging.DEBUG, format=FORMAT)
 
-    def send_command_urllib(self, url, request, headers={}):
+    def add_observer(self, observer):
         """
-        Due to some bug in python2.4, httplib doesn't work with
-        certain http load balancers. I believe it has something to
-        do with the port number being included with the request,
-        but I'm really not sure. urllib seems to work ok, so this
-        function attempts to replicate the same functionality.
+        Have observer.request_finished() called with the RequestTiming
+        of every request this client makes with httplib.
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def _start_timing(self, url, method):
+        if not self.observers:
+            return None
+        return RequestTiming(self.host, self.port, url, method, time.time())
+
+    def _finish_timing(self, timing, status=None, error=None):
+        """
+        Hand a finished request's timing to every observer. A broken
+        observer is logged rather than allowed to fail the request.
+        """
+        if timing is None:
+            return
+        timing.total = time.time() - timing.started
+        timing.status = status
+        timing.error = error
+        for observer in self.observers:
+            try:
+                observer.request_finished(timing)
+            except Exception:
+                self.log.exception("observer %r failed", observer)
+
+    def tls_stats(self):
+        """
+        Returns a dict counting the TLS handshakes made by this client.
+        """
+        with self._handshakes_lock:
+            return {'handshakes': self._handshakes}
+
+    def _count_handshake(self):
+        with self._handshakes_lock:
+            self._handshakes += 1
+
+    def _get_ssl_context(self):
+        if self.ssl_context is None:
+            self.ssl_context = ssl._create_default_https_context()
+        return self.ssl_context
+
+    @property
+    def _pool_key(self):
+        # connections are only shared between clients using the same SSL
+        # context, so one made without certificate checks can't go to a
+        # client that wants them. Pooled connections keep their context
+        # alive, so its id can't be reused while they're in the pool.
+        if self.use_ssl:
+            return (self.host, self.port, True, id(self._get_ssl_context()))
+        return (self.host, self.port, False, None)
+
+    def _full_url(self, url):
+        """
+        Returns the absolute URL for url on this client's server.
         """
         port = ""
         if self.use_ssl:
@@ -52,67 +454,435 @@ class ClientBase(object):
             pfx = "http"
             if self.port != 80:
                 port = ":%s" % self.port
+        return "%s://%s%s%s" % (pfx, self.host, port, url)
 
-        fullurl = "%s://%s%s%s" % (pfx, self.host, port, url)
-        r = urllib.urlopen(fullurl, request)
+    def send_command_urllib(self, url, request, headers={}):
+        """
+        Due to some bug in python2.4, httplib doesn't work with
+        certain http load balancers. I believe it has something to
+        do with the port number being included with the request,
+        but I'm really not sure. urllib seems to work ok, so this
+        function attempts to replicate the same functionality.
+        """
+        r = urllib.urlopen(self._full_url(url), request)
         return r.read()
 
-    def send_command_httplib(self, url, request, headers={}, method='POST'):
+    def stream_command_urllib(self, url, request, headers={},
+                              chunk_size=65536):
+        """
+        Like send_command_urllib(), but returns a StreamingResponse
+        instead of reading the whole response body.
+        """
+        r = urllib.urlopen(self._full_url(url), request)
+        return StreamingResponse(r, self.log, lambda finished: r.close(),
+                                 chunk_size)
+
+    def _open_connection(self, url, timing=None, deadline=None):
         """
-        Open an HTTP connection, send request to url with headers.
+        Open a new HTTP(S) connection to the server.
         """
         if (self.use_ssl):
             self.log.debug("opening https://%s:%s%s", self.host,
                            self.port, url)
-            connection = httplib.HTTPSConnection(self.host, self.port)
+            connection = httplib.HTTPSConnection(
+                self.host, self.port, context=self._get_ssl_context())
         else:
             self.log.debug("opening http://%s:%s%s", self.host,
                            self.port, url)
             connection = httplib.HTTPConnection(self.host, self.port)
         connection.set_debuglevel(0)
+        if hasattr(connection, '_create_connection'):
+            connection._create_connection = self.resolver.create_connection
+        connect_timeout = _phase_timeout(self.timeouts.connect, deadline)
+        if connect_timeout is not None:
+            connection.timeout = connect_timeout
+        if timing is not None:
+            start = self._time_tcp_connect(connection, timing)
         try:
             connection.connect()
+            if connect_timeout is not None:
+                # reads are bounded with select(), not socket timeouts
+                connection.sock.settimeout(None)
+            # Headers and body go out in separate writes; without this
+            # the body waits on the server's delayed ACK of the headers.
+            connection.sock.setsockopt(socket.IPPROTO_TCP,
+                                       socket.TCP_NODELAY, 1)
+        except httplib.socket.error, err:
+            self.log.error("socket error %s:%d%s - %s", self.host, self.port,
+                           url, err)
+            connection.close()
+            raise socket.error("connect failed")
+        if self.use_ssl:
+            self._count_handshake()
+        if timing is not None:
+            elapsed = time.time() - start
+            if timing.connect is None:
+                timing.connect = elapsed
+            if self.use_ssl:
+                timing.tls = elapsed - timing.connect
+        return connection
+
+    @staticmethod
+    def _time_tcp_connect(connection, timing):
+        """
+        HTTPSConnection.connect() does the TCP connect and the TLS
+        handshake in one go. Wrapping the socket factory it uses lets
+        the two be timed separately.
+        """
+        create_connection = getattr(connection, '_create_connection', None)
+        if create_connection is not None:
+            def timed_create_connection(*args, **kwargs):
+                start = time.time()
+                try:
+                    return create_connection(*args, **kwargs)
+                finally:
+                    timing.connect = time.time() - start
+            connection._create_connection = timed_create_connection
+        return time.time()
+
+    def _exchange(self, connection, url, request, headers, method,
+                  timing=None, deadline=None):
+        """
+        Send request on an open connection and wait for the response.
+        Raises _DeadConnection if the connection failed before any
+        part of a response was received.
+        """
+        if timing is not None:
+            start = time.time()
+        try:
             connection.putrequest(method, url)
-            connection.putheader("Content-length",
-                                 len(request.encode('utf-8')))
+            connection.putheader("Content-length", request.length)
             for header, value in headers.items():
                 connection.putheader(header, value)
             connection.endheaders()
-            readysocks = select.select((), (connection.sock,), (), 600.0)
+            readysocks = select.select(
+                (), (connection.sock,), (),
+                _phase_timeout(self.timeouts.write, deadline))
             if (readysocks[1] == []):
                 raise socket.timeout("Socket send() timed out")
             else:
-                connection.send(request.encode('utf-8'))
+                request.send(connection)
+        except socket.timeout:
+            raise
         except httplib.socket.error, err:
-            self.log.error("socket error %s:%d%s - %s", self.host, self.port,
-                           url, err)
-            raise socket.error("connect failed")
+            raise _DeadConnection(err)
+        if timing is not None:
+            sent = time.time()
+            timing.write = sent - start
+            timing.bytes_sent = request.length
         # Since we're on python 2.4, we have to implement a socket read timeout
         # using select() rather than setting the timeout in the connection
         # constructor.
-        readysocks = select.select((connection.sock, ), (), (), 600.0)
+        readysocks = select.select(
+            (connection.sock, ), (), (),
+            _phase_timeout(self.timeouts.first_byte, deadline))
         if (readysocks[0] == []):
             raise socket.timeout("Socket read() timed out")
-        response = connection.getresponse()
         try:
+            response = connection.getresponse()
+        except (httplib.BadStatusLine, httplib.socket.error), err:
+            raise _DeadConnection(err)
+        if timing is not None:
+            timing.first_byte = time.time() - sent
+        return response
+
+    def _request(self, url, request, headers, method, timing=None,
+                 deadline=None, attempt=None, idempotent=None):
+        """
+        Send request (text, bytes, bytearray, memoryview or an open
+        file) to url with headers over a keep-alive connection from the
+        pool and return (connection, response) once the
+        response status and headers have arrived. A pooled connection
+        that turns out to be dead is discarded and, if the request is
+        idempotent (by default, if its method is in IDEMPOTENT_METHODS),
+        the request retried once on a new connection. Anything else may
+        already have reached the server, so it isn't sent again.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        body = _RequestBody(request)
+        connection = self.pool.get(self._pool_key)
+        reused = connection is not None
+        while True:
+            if connection is None:
+                connection = self._open_connection(url, timing, deadline)
+            if attempt is not None:
+                attempt.attach(connection)
+            if timing is not None:
+                timing.reused = reused
+            try:
+                return connection, self._exchange(connection, url, body,
+                                                  headers, method, timing,
+                                                  deadline)
+            except _DeadConnection, err:
+                connection.close()
+                if attempt is not None and attempt.cancelled:
+                    raise socket.error("hedged attempt cancelled")
+                if not reused or not idempotent:
+                    self.log.error("socket error %s:%d%s - %s", self.host,
+                                   self.port, url, err)
+                    raise socket.error("connect failed")
+                self.log.info("pooled connection to %s:%d is dead (%s), "
+                              "reconnecting", self.host, self.port, err)
+                connection, reused = None, False
+                body.rewind()
+                if timing is not None:
+                    timing.retried = True
+            except:
+                connection.close()
+                raise
+
+    def _encode_request(self, request, headers):
+        """
+        With compression, advertise the encodings we can decode and
+        gzip the request body if it's big enough to be worth it.
+        Returns the request and headers to send.
+        """
+        if self.compression is None:
+            return request, headers
+        headers = dict(headers)
+        sent = set(h.lower() for h in headers)
+        if 'accept-encoding' not in sent:
+            headers['Accept-Encoding'] = 'gzip, deflate'
+        if 'content-encoding' not in sent and not hasattr(request, 'read'):
+            if isinstance(request, unicode):
+                request = request.encode('utf-8')
+            compressed = self.compression.compress(request)
+            if compressed is not None:
+                request = compressed
+                headers['Content-Encoding'] = 'gzip'
+        return request, headers
+
+    def _decoder(self, response):
+        if self.compression is None:
+            return None
+        return self.compression.decoder(
+            response.getheader('content-encoding'))
+
+    def _release(self, connection, response, attempt=None, deadline=None):
+        """
+        Return connection to the pool once response has been read to
+        the end, unless the server said it's closing it. If the body was
+        read against a deadline, the socket's timeout is cleared first.
+        A hedged attempt gives up its connection here, so cancelling it
+        afterwards leaves the connection alone.
+        """
+        if attempt is not None:
+            with attempt.lock:
+                attempt.connection = None
+                if attempt.cancelled:
+                    connection.close()
+                    return
+                self._release(connection, response, deadline=deadline)
+            return
+        if response.will_close:
+            connection.close()
+        else:
+            if deadline is not None:
+                connection.sock.settimeout(None)
+            self.pool.put(self._pool_key, connection)
+
+    def _read_all(self, connection, response, timing=None, deadline=None,
+                  attempt=None):
+        """
+        Read and return the whole response body, then release the
+        connection.
+        """
+        if timing is not None:
+            start = time.time()
+        try:
+            if deadline is not None:
+                _limit_reads(response, deadline)
             resp = response.read()
+            decoder = self._decoder(response)
+            if decoder is not None:
+                resp = decoder.decompress(resp) + decoder.flush()
         except socket.sslerror, e:
             self.log.error("read() failed due to sslerror \"%s\"", e)
+            connection.close()
             raise
-        finally:
+        except:
             connection.close()
-        if (response.status != 200):
+            raise
+        self._release(connection, response, attempt, deadline)
+        if timing is not None:
+            timing.read = time.time() - start
+            timing.bytes_received = len(resp)
+        return resp
+
+    def _fetch(self, url, request, headers, method, conditional=False,
+               attempt=None, idempotent=None):
+        """
+        Send request and return (status, body, getheader) for the
+        response. Anything but a 200 (or a 304 for a conditional
+        request) is raised as a ClientError.
+        """
+        timing = self._start_timing(url, method)
+        deadline = self.timeouts.deadline()
+        try:
+            connection, response = self._request(url, request, headers,
+                                                 method, timing, deadline,
+                                                 attempt, idempotent)
+            resp = self._read_all(connection, response, timing, deadline,
+                                  attempt)
+        except Exception, err:
+            self._finish_timing(timing, error=err)
+            raise
+        self._finish_timing(timing, response.status)
+        if (response.status != 200 and
+                not (conditional and response.status == 304)):
             self.log.error("HTTP %d: %s", response.status, resp)
             raise ClientError(resp)
+        return response.status, resp, response.getheader
+
+    def _hedged_fetch(self, url, request, headers, method,
+                      conditional=False, idempotent=True):
+        """
+        Like _fetch(), but if there's no answer within the hedge policy's
+        delay a second attempt is sent on another connection. The first
+        attempt to succeed wins (or the last to fail, if both fail) and
+        the other is cancelled.
+        """
+        results = Queue.Queue()
+        attempts = []
+
+        def start():
+            attempt = _Attempt()
+            attempts.append(attempt)
+
+            def run():
+                try:
+                    result = self._fetch(url, request, headers, method,
+                                         conditional, attempt, idempotent)
+                except Exception:
+                    results.put((attempt, None, sys.exc_info()))
+                else:
+                    results.put((attempt, result, None))
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+
+        started = time.time()
+        start()
+        try:
+            outcome = results.get(timeout=self.hedging.delay())
+        except Queue.Empty:
+            self.log.info("no response from %s:%d%s after %.3fs, hedging",
+                          self.host, self.port, url, time.time() - started)
+            start()
+            outcome = results.get()
+            if outcome[2] is not None:
+                outcome = results.get()
+            self.hedging.count(outcome[0] is attempts[1])
+        winner, result, exc_info = outcome
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.cancel()
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        self.hedging.record(time.time() - started)
+        return result
+
+    def send_command_httplib(self, url, request, headers={}, method='POST',
+                             idempotent=None):
+        """
+        Send request to url with headers and return the response body.
+        With a cache, the answer to a repeated request may come from
+        the cache instead. With hedging, an idempotent request (by
+        default, one whose method is in IDEMPOTENT_METHODS) may be sent
+        twice, and is resent if a pooled connection turns out to be dead.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if (self.hedging is not None and idempotent and
+                not hasattr(request, 'read')):
+            fetch_once = self._hedged_fetch
+        else:
+            fetch_once = self._fetch
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(method, url, headers, request)
+        body, send_headers = self._encode_request(request, headers)
+        if key is None:
+            resp = fetch_once(url, body, send_headers, method,
+                              idempotent=idempotent)[1]
+        else:
+            def fetch(validators):
+                return fetch_once(url, body,
+                                  dict(send_headers, **validators),
+                                  method, bool(validators),
+                                  idempotent=idempotent)
+            resp = self.cache.fetch(key, fetch)
         self.log.info("send_command(headers=%s...)", str(headers)[:54])
-        self.log.debug("send_command(request=%s...)", str(request)[:54])
+        self.log.debug("send_command(request=%s...)", _preview(request))
         return resp
 
-    def send_command(self, url, request, headers={}):
+    def stream_command_httplib(self, url, request, headers={}, method='POST',
+                               chunk_size=65536):
         """
-        Sends request to url with supplied headers.
+        Like send_command_httplib(), but returns a StreamingResponse as
+        soon as the response headers arrive instead of reading the whole
+        body. Error responses are still read in full and raised as
+        ClientError. A total timeout applies until the body has been
+        read to the end.
+        """
+        timing = self._start_timing(url, method)
+        deadline = self.timeouts.deadline()
+        body, send_headers = self._encode_request(request, headers)
+        try:
+            connection, response = self._request(url, body, send_headers,
+                                                 method, timing, deadline)
+            if (response.status != 200):
+                resp = self._read_all(connection, response, timing,
+                                      deadline)
+        except Exception, err:
+            self._finish_timing(timing, error=err)
+            raise
+        if (response.status != 200):
+            self._finish_timing(timing, response.status)
+            self.log.error("HTTP %d: %s", response.status, resp)
+            raise ClientError(resp)
+        self.log.info("stream_command(headers=%s...)", str(headers)[:54])
+        self.log.debug("stream_command(request=%s...)", _preview(request))
+        if timing is not None:
+            start = time.time()
+
+        if deadline is not None:
+            _limit_reads(response, deadline)
+
+        def release(finished):
+            if finished:
+                self._release(connection, response, deadline=deadline)
+            else:
+                connection.close()
+            if timing is not None:
+                timing.read = time.time() - start
+                timing.bytes_received = stream.bytes_read
+                self._finish_timing(timing, response.status)
+        stream = StreamingResponse(response, self.log, release, chunk_size,
+                                   self._decoder(response))
+        return stream
+
+    def send_command(self, url, request, headers={}, idempotent=False):
+        """
+        Sends request to url with supplied headers. Pass idempotent=True
+        if the command is safe to send more than once, to allow it to be
+        hedged.
         """
         if self.use_urllib:
             return self.send_command_urllib(url, request, headers)
         else:
-            return self.send_command_httplib(url, request, headers)
+            return self.send_command_httplib(url, request, headers,
+                                             idempotent=idempotent)
+
+    def stream_command(self, url, request, headers={}, chunk_size=65536):
+        """
+        Sends request to url with supplied headers and returns a
+        StreamingResponse for reading the response body incrementally.
+        """
+        if self.use_urllib:
+            return self.stream_command_urllib(url, request, headers,
+                                              chunk_size)
+        else:
+            return self.stream_command_httplib(url, request, headers,
+                                               chunk_size=chunk_size)
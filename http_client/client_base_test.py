@@ -2,10 +2,19 @@
 Unit tests for client_base
 """
 import unittest
-from mock import Mock
+from mock import Mock, patch
 from mock import sentinel as _
 import client_base
+import compression
+import connection_pool
+import hedging
+import response_cache
 import socket
+import tempfile
+import zlib
+import threading
+import time
+from StringIO import StringIO
 
 
 def fake_file_obj():
@@ -17,8 +26,17 @@ def fake_file_obj():
 class ClientBaseTest(unittest.TestCase):
 
     def setUp(self):
+        # keep basicConfig() from creating the log file in the tree
+        patcher = patch.object(client_base.logging, 'basicConfig')
+        patcher.start()
+        self.addCleanup(patcher.stop)
         self.logger = Mock()
-        self.obj_ut = client_base.ClientBase('testhost', 443, use_ssl=True)
+        self.pool = connection_pool.ConnectionPool()
+        self.resolver = Mock()
+        self.obj_ut = client_base.ClientBase('testhost', 443, use_ssl=True,
+                                             pool=self.pool,
+                                             resolver=self.resolver,
+                                             ssl_context=_.ssl_context)
         self.obj_ut.log = self.logger
         client_base.config = Mock()
         client_base.config.return_value = "testfilename.log"
@@ -26,6 +44,8 @@ class ClientBaseTest(unittest.TestCase):
         client_base.httplib = Mock()
         client_base.select = Mock()
         client_base.select.select.return_value = [[3], [2]]
+        connection_pool.select = Mock()
+        connection_pool.select.select.return_value = [[], [], []]
         client_base.httplib.HTTPConnection = Mock()
         client_base.httplib.HTTPSConnection = Mock()
 
@@ -58,7 +78,7 @@ class ClientBaseTest(unittest.TestCase):
         client_base.httplib.HTTPSConnection.return_value = fake_https_conn
         r = self.obj_ut.send_command_httplib('/foo', 'data')
         client_base.httplib.HTTPSConnection.assert_called_once_with(
-            'testhost', 443)
+            'testhost', 443, context=_.ssl_context)
         self.assertEqual(r, 'crap')
         fake_https_conn.connect.assert_called_once_with()
         fake_https_conn.close.assert_called_once_with()
@@ -85,6 +105,501 @@ class ClientBaseTest(unittest.TestCase):
         client_base.httplib.HTTPConnection.assert_called_once_with(
             'testhost', 80)
 
+    def test_send_command_httplib_keepalive(self):
+        fake_https_conn = Mock()
+        fake_response = Mock()
+        fake_response.read.return_value = 'crap'
+        fake_response.status = 200
+        fake_response.will_close = False
+        fake_https_conn.getresponse.return_value = fake_response
+        client_base.httplib.HTTPSConnection.return_value = fake_https_conn
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        client_base.httplib.HTTPSConnection.assert_called_once_with(
+            'testhost', 443, context=_.ssl_context)
+        fake_https_conn.connect.assert_called_once_with()
+        self.assertFalse(fake_https_conn.close.called)
+        self.assertEqual(fake_https_conn.send.call_count, 2)
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key),
+                         fake_https_conn)
+
+    def test_send_command_httplib_stale_pooled_connection(self):
+        stale_conn = Mock()
+        connection_pool.select.select.return_value = [[stale_conn.sock], [],
+                                                      []]
+        self.pool.put(self.obj_ut._pool_key, stale_conn)
+        fresh_conn = Mock()
+        fake_response = Mock()
+        fake_response.read.return_value = 'crap'
+        fake_response.status = 200
+        fresh_conn.getresponse.return_value = fake_response
+        client_base.httplib.HTTPSConnection.return_value = fresh_conn
+        r = self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertEqual(r, 'crap')
+        stale_conn.close.assert_called_once_with()
+        self.assertFalse(stale_conn.send.called)
+
+    def test_send_command_httplib_dead_pooled_connection_retried(self):
+        class DeadSocket(Exception):
+            pass
+        client_base.httplib.BadStatusLine = DeadSocket
+        dead_conn = Mock()
+        dead_conn.getresponse.side_effect = DeadSocket("''")
+        self.pool.put(self.obj_ut._pool_key, dead_conn)
+        fresh_conn = Mock()
+        fake_response = Mock()
+        fake_response.read.return_value = 'crap'
+        fake_response.status = 200
+        fresh_conn.getresponse.return_value = fake_response
+        client_base.httplib.HTTPSConnection.return_value = fresh_conn
+        r = self.obj_ut.send_command_httplib('/foo', 'data', method='PUT')
+        self.assertEqual(r, 'crap')
+        dead_conn.close.assert_called_once_with()
+        fresh_conn.send.assert_called_once_with('data')
+        # a fresh connection that dies is not retried
+        fresh_conn.getresponse.side_effect = DeadSocket("''")
+        with self.assertRaises(socket.error):
+            self.obj_ut.send_command_httplib('/foo', 'data', method='PUT')
+        self.assertEqual(fresh_conn.send.call_count, 2)
+
+    def test_send_command_httplib_dead_pooled_connection_post(self):
+        class DeadSocket(Exception):
+            pass
+        client_base.httplib.BadStatusLine = DeadSocket
+        dead_conn = Mock()
+        dead_conn.getresponse.side_effect = DeadSocket("''")
+        self.pool.put(self.obj_ut._pool_key, dead_conn)
+        fresh_conn = self.body_conn()
+        # the server may have got the POST before the connection died
+        with self.assertRaises(socket.error):
+            self.obj_ut.send_command_httplib('/foo', 'data')
+        dead_conn.send.assert_called_once_with('data')
+        self.assertFalse(fresh_conn.send.called)
+        self.pool.put(self.obj_ut._pool_key, dead_conn)
+        r = self.obj_ut.send_command_httplib('/foo', 'data', idempotent=True)
+        self.assertEqual(r, 'crap')
+        fresh_conn.send.assert_called_once_with('data')
+
+    def body_conn(self):
+        fake_https_conn = Mock()
+        fake_response = Mock()
+        fake_response.read.return_value = 'crap'
+        fake_response.status = 200
+        fake_https_conn.getresponse.return_value = fake_response
+        client_base.httplib.HTTPSConnection.return_value = fake_https_conn
+        return fake_https_conn
+
+    def test_send_command_httplib_unicode_body(self):
+        conn = self.body_conn()
+        self.obj_ut.send_command_httplib('/foo', u'caf\xe9')
+        conn.putheader.assert_any_call("Content-length", 5)
+        conn.send.assert_called_once_with('caf\xc3\xa9')
+
+    def test_send_command_httplib_buffer_bodies(self):
+        conn = self.body_conn()
+        body = bytearray('data')
+        self.obj_ut.send_command_httplib('/foo', body)
+        conn.putheader.assert_any_call("Content-length", 4)
+        self.assertTrue(conn.send.call_args[0][0] is body)
+        view = memoryview(body)[1:]
+        self.obj_ut.send_command_httplib('/foo', view)
+        conn.putheader.assert_any_call("Content-length", 3)
+        self.assertTrue(conn.send.call_args[0][0] is view)
+
+    def test_send_command_httplib_file_body(self):
+        conn = self.body_conn()
+        sent = []
+        conn.sock.sendall.side_effect = lambda b: sent.append(b.tobytes())
+        client_base._RequestBody.chunk_size = 4
+        self.addCleanup(setattr, client_base._RequestBody, 'chunk_size',
+                        65536)
+        f = tempfile.TemporaryFile()
+        f.write('xxdata-in-a-file')
+        f.seek(2)
+        self.obj_ut.send_command_httplib('/foo', f)
+        conn.putheader.assert_any_call("Content-length", 14)
+        self.assertEqual(sent, ['data', '-in-', 'a-fi', 'le'])
+        self.assertFalse(conn.send.called)
+
+    def test_send_command_httplib_file_body_retried(self):
+        class DeadSocket(Exception):
+            pass
+        client_base.httplib.BadStatusLine = DeadSocket
+        dead_conn = Mock()
+        dead_conn.getresponse.side_effect = DeadSocket("''")
+        self.pool.put(self.obj_ut._pool_key, dead_conn)
+        conn = self.body_conn()
+        sent = []
+        conn.sock.sendall.side_effect = sent.append
+        f = StringIO('xxdata')
+        f.seek(2)
+        self.obj_ut.send_command_httplib('/foo', f, method='PUT')
+        dead_conn.putheader.assert_any_call("Content-length", 4)
+        conn.putheader.assert_any_call("Content-length", 4)
+        self.assertEqual(sent, ['data'])
+
+    def test_send_command_httplib_cached(self):
+        self.obj_ut.cache = response_cache.ResponseCache()
+        conn = self.body_conn()
+        response = conn.getresponse.return_value
+        response.getheader.side_effect = {'etag': '"v1"'}.get
+        self.assertEqual(self.obj_ut.send_command_httplib('/foo', 'data'),
+                         'crap')
+        self.assertEqual(self.obj_ut.send_command_httplib('/foo', 'data'),
+                         'crap')
+        conn.send.assert_called_once_with('data')
+        # a stale entry is revalidated and a 304 served from the cache
+        self.obj_ut.cache.ttl = 0
+        self.obj_ut.cache.clear()
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        response.status = 304
+        response.read.return_value = ''
+        self.assertEqual(self.obj_ut.send_command_httplib('/foo', 'data'),
+                         'crap')
+        conn.putheader.assert_any_call('If-None-Match', '"v1"')
+        # 304 is an error when nothing was cached
+        with self.assertRaises(client_base.ClientError):
+            self.obj_ut.send_command_httplib('/bar', 'data')
+
+    def test_send_command_httplib_observed(self):
+        observer = Mock()
+        self.obj_ut.add_observer(observer)
+        conn = self.body_conn()
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        timing = observer.request_finished.call_args[0][0]
+        self.assertEqual((timing.url, timing.status, timing.error),
+                         ('/foo', 200, None))
+        self.assertEqual((timing.bytes_sent, timing.bytes_received), (4, 4))
+        self.assertFalse(timing.reused)
+        for phase in ('connect', 'tls', 'write', 'first_byte', 'read',
+                      'total'):
+            self.assertTrue(getattr(timing, phase) >= 0, phase)
+        # failures are reported too, and a broken observer doesn't
+        # break the request
+        observer.request_finished.side_effect = ValueError
+        conn.getresponse.return_value.status = 500
+        with self.assertRaises(client_base.ClientError):
+            self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertEqual(observer.request_finished.call_args[0][0].status,
+                         500)
+        client_base.select.select.return_value = [[], [2]]
+        with self.assertRaises(socket.timeout):
+            self.obj_ut.send_command_httplib('/foo', 'data')
+        timing = observer.request_finished.call_args[0][0]
+        self.assertTrue(isinstance(timing.error, socket.timeout))
+
+    def test_send_command_httplib_unobserved(self):
+        client_base.time = Mock()
+        self.addCleanup(setattr, client_base, 'time', time)
+        self.body_conn()
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertFalse(client_base.time.time.called)
+
+    def test_send_command_httplib_timeouts(self):
+        conn = self.body_conn()
+        self.obj_ut.timeouts = client_base.Timeouts(connect=5.0, write=1.0,
+                                                    first_byte=2.0)
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertEqual(conn.timeout, 5.0)
+        conn.sock.settimeout.assert_called_once_with(None)
+        self.assertEqual(
+            [c[0][3] for c in client_base.select.select.call_args_list],
+            [1.0, 2.0])
+
+    def test_phase_timeout(self):
+        client_base.time = Mock()
+        self.addCleanup(setattr, client_base, 'time', time)
+        client_base.time.time.return_value = 100.0
+        self.assertEqual(client_base._phase_timeout(5.0, None), 5.0)
+        self.assertEqual(client_base._phase_timeout(None, None), None)
+        self.assertEqual(client_base._phase_timeout(5.0, 103.0), 3.0)
+        self.assertEqual(client_base._phase_timeout(None, 103.0), 3.0)
+        self.assertEqual(client_base._phase_timeout(1.0, 103.0), 1.0)
+        with self.assertRaises(socket.timeout):
+            client_base._phase_timeout(5.0, 100.0)
+
+    def test_send_command_httplib_total_deadline(self):
+        self.body_conn()
+        self.obj_ut.timeouts = client_base.Timeouts(total=-1)
+        with self.assertRaises(socket.timeout):
+            self.obj_ut.send_command_httplib('/foo', 'data')
+
+    def test_send_command_httplib_total_deadline_body(self):
+        conn = self.body_conn()
+        response = conn.getresponse.return_value
+        sock = response.fp._sock
+        self.obj_ut.timeouts = client_base.Timeouts(total=60)
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertTrue(isinstance(response.fp._sock,
+                                   client_base._DeadlineSocket))
+        self.assertTrue(response.fp._sock._sock is sock)
+        conn.sock.settimeout.assert_called_with(None)
+
+    def test_stream_command_httplib_total_deadline(self):
+        conn, response = self.streaming_conn(['ab', ''])
+        self.obj_ut.timeouts = client_base.Timeouts(total=60)
+        r = self.obj_ut.stream_command_httplib('/foo', 'data')
+        self.assertTrue(isinstance(response.fp._sock,
+                                   client_base._DeadlineSocket))
+        self.assertEqual(list(r), ['ab'])
+        conn.sock.settimeout.assert_called_with(None)
+
+    def test_total_deadline_connection_closed(self):
+        def closing(conn):
+            # httplib has already closed a connection the server is
+            # closing by the time it returns the response
+            response = conn.getresponse.return_value
+            response.will_close = True
+
+            def getresponse():
+                conn.sock = None
+                return response
+            conn.getresponse.side_effect = getresponse
+            return conn
+        self.obj_ut.timeouts = client_base.Timeouts(total=60)
+        closing(self.body_conn())
+        self.assertEqual(self.obj_ut.send_command('/foo', 'data'), 'crap')
+        closing(self.streaming_conn(['ab', ''])[0])
+        r = self.obj_ut.stream_command('/foo', 'data')
+        self.assertEqual(r.read(), 'ab')
+        self.assertTrue(r.closed)
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), None)
+
+    def test_deadline_socket(self):
+        client_base.time = Mock()
+        self.addCleanup(setattr, client_base, 'time', time)
+        client_base.time.time.return_value = 100.0
+        sock = Mock()
+        sock.recv.return_value = 'x'
+        wrapped = client_base._DeadlineSocket(sock, 103.0)
+        self.assertEqual(wrapped.recv(10), 'x')
+        sock.settimeout.assert_called_with(3.0)
+        client_base.time.time.return_value = 103.5
+        with self.assertRaises(socket.timeout):
+            wrapped.recv(10)
+        self.assertEqual(sock.recv.call_count, 1)
+        self.assertTrue(wrapped.fileno is sock.fileno)
+
+    def test_send_command_httplib_hedged(self):
+        client_base.select.select.side_effect = lambda r, w, x, t: (r, w, x)
+        shutdown = threading.Event()
+        slow_conn = Mock()
+        slow_conn.sock.shutdown.side_effect = lambda how: shutdown.set()
+
+        def slow_response():
+            shutdown.wait(5)
+            raise socket.error("shut down")
+        slow_conn.getresponse.side_effect = slow_response
+        fast_conn = Mock()
+        fast_response = Mock()
+        fast_response.read.return_value = 'fast'
+        fast_response.status = 200
+        fast_conn.getresponse.return_value = fast_response
+        client_base.httplib.HTTPSConnection.side_effect = [slow_conn,
+                                                           fast_conn]
+        client_base.httplib.socket.error = socket.error
+        policy = hedging.HedgePolicy(initial_delay=0.01)
+        self.obj_ut.hedging = policy
+        r = self.obj_ut.send_command_httplib('/foo', 'data',
+                                             idempotent=True)
+        self.assertEqual(r, 'fast')
+        self.assertTrue(shutdown.wait(5))
+        self.assertEqual((policy.hedged, policy.wins), (1, 1))
+
+    def test_send_command_httplib_hedged_both_complete(self):
+        client_base.select.select.side_effect = lambda r, w, x, t: (r, w, x)
+        client_base.httplib.socket.error = socket.error
+        hedged = threading.Event()
+        conns = []
+        for body in ('first', 'second'):
+            conn = self.body_conn()
+            conn.getresponse.return_value.read.return_value = body
+            conn.getresponse.return_value.will_close = False
+            conns.append(conn)
+        conns[0].getresponse.side_effect = lambda: (
+            hedged.wait(5), conns[0].getresponse.return_value)[1]
+        conns[1].getresponse.side_effect = lambda: (
+            hedged.set(), conns[1].getresponse.return_value)[1]
+        client_base.httplib.HTTPSConnection.side_effect = conns
+        # hold the winner back until the loser has finished too, and
+        # put its connection back in the pool
+        pooled = []
+        both_pooled = threading.Event()
+        put = self.pool.put
+
+        def put_back(key, conn):
+            put(key, conn)
+            pooled.append(conn)
+            if len(pooled) == 2:
+                both_pooled.set()
+        self.pool.put = put_back
+        policy = hedging.HedgePolicy(initial_delay=0.01)
+        count = policy.count
+        policy.count = lambda won: (both_pooled.wait(5), count(won))
+        self.obj_ut.hedging = policy
+        r = self.obj_ut.send_command_httplib('/foo', 'data',
+                                             idempotent=True)
+        self.assertTrue(r in ('first', 'second'))
+        self.assertEqual(sorted(pooled), sorted(conns))
+        for conn in conns:
+            self.assertFalse(conn.sock.shutdown.called)
+
+    def test_hedged_release_and_cancel(self):
+        conn, response = self.streaming_conn([''])
+        attempt = client_base._Attempt()
+        attempt.attach(conn)
+        self.obj_ut._release(conn, response, attempt)
+        attempt.cancel()
+        self.assertFalse(conn.sock.shutdown.called)
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), conn)
+        attempt = client_base._Attempt()
+        attempt.attach(conn)
+        attempt.cancel()
+        conn.sock.shutdown.assert_called_once_with(socket.SHUT_RDWR)
+        self.obj_ut._release(conn, response, attempt)
+        conn.close.assert_called_once_with()
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), None)
+
+    def test_send_command_httplib_not_hedged(self):
+        conn = self.body_conn()
+        self.obj_ut.hedging = Mock()
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.obj_ut.send_command_httplib('/foo', 'data', method='GET',
+                                         idempotent=False)
+        self.obj_ut.send_command_httplib('/foo', StringIO('data'),
+                                         idempotent=True)
+        self.assertFalse(self.obj_ut.hedging.delay.called)
+        self.obj_ut.hedging.delay.return_value = 5.0
+        self.obj_ut.send_command_httplib('/foo', 'data', method='GET')
+        self.assertTrue(self.obj_ut.hedging.record.called)
+
+    def test_send_command_httplib_compressed(self):
+        self.obj_ut.compression = compression.Compression(threshold=8)
+        conn = self.body_conn()
+        response = conn.getresponse.return_value
+        response.getheader.side_effect = {'content-encoding': 'gzip'}.get
+        obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        response.read.return_value = obj.compress('crap') + obj.flush()
+        r = self.obj_ut.send_command_httplib('/foo', 'data' * 10)
+        self.assertEqual(r, 'crap')
+        conn.putheader.assert_any_call('Accept-Encoding', 'gzip, deflate')
+        conn.putheader.assert_any_call('Content-Encoding', 'gzip')
+        sent = conn.send.call_args[0][0]
+        self.assertEqual(zlib.decompress(sent, 16 + zlib.MAX_WBITS),
+                         'data' * 10)
+        # small bodies go as they are
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        conn.send.assert_called_with('data')
+
+    def test_stream_command_httplib_compressed(self):
+        self.obj_ut.compression = compression.Compression()
+        text = ''.join(str(i) for i in range(1000))
+        obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        data = obj.compress(text) + obj.flush()
+        conn, response = self.streaming_conn(
+            [data[:10], data[10:], ''])
+        response.getheader.side_effect = {'content-encoding': 'gzip'}.get
+        r = self.obj_ut.stream_command_httplib('/foo', 'data')
+        buf = bytearray(100)
+        out = []
+        n = r.readinto(buf)
+        while n:
+            out.append(str(buf[:n]))
+            n = r.readinto(buf)
+        self.assertEqual(''.join(out), text)
+        self.assertEqual(r.bytes_read, len(text))
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), conn)
+
+    def test_send_command_httplib_resolver_and_tls_stats(self):
+        conn = self.body_conn()
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertEqual(conn._create_connection,
+                         self.resolver.create_connection)
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertEqual(self.obj_ut.tls_stats(), {'handshakes': 2})
+        self.obj_ut.use_ssl = False
+        self.obj_ut.port = 80
+        client_base.httplib.HTTPConnection.return_value = conn
+        self.obj_ut.send_command_httplib('/foo', 'data')
+        self.assertEqual(self.obj_ut.tls_stats(), {'handshakes': 2})
+
+    def test_pool_key_ssl_context(self):
+        unverified = client_base.ClientBase('testhost', 443, pool=self.pool,
+                                            ssl_context=_.unverified)
+        self.assertNotEqual(unverified._pool_key, self.obj_ut._pool_key)
+        conn = self.body_conn()
+        conn.getresponse.return_value.will_close = False
+        unverified.send_command_httplib('/foo', 'data')
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), None)
+        self.assertEqual(self.pool.get(unverified._pool_key), conn)
+        plain = client_base.ClientBase('testhost', 80, use_ssl=False)
+        self.assertEqual(plain._pool_key, ('testhost', 80, False, None))
+
+    def test_default_ssl_context_shared(self):
+        client = client_base.ClientBase('testhost', 443)
+        self.assertTrue(client.resolver is client_base.default_resolver)
+        context = client._get_ssl_context()
+        self.assertTrue(isinstance(context, client_base.ssl.SSLContext))
+        self.assertTrue(client._get_ssl_context() is context)
+
+    def streaming_conn(self, chunks, status=200):
+        fake_https_conn = Mock()
+        fake_response = Mock()
+        fake_response.read.side_effect = chunks
+        fake_response.status = status
+        fake_response.will_close = False
+        fake_https_conn.getresponse.return_value = fake_response
+        client_base.httplib.HTTPSConnection.return_value = fake_https_conn
+        return fake_https_conn, fake_response
+
+    def test_stream_command_httplib(self):
+        conn, response = self.streaming_conn(['ab', 'cd', ''])
+        r = self.obj_ut.stream_command_httplib('/foo', 'data', chunk_size=2)
+        self.assertFalse(response.read.called)
+        self.assertEqual(list(r), ['ab', 'cd'])
+        self.assertEqual(r.bytes_read, 4)
+        response.read.assert_called_with(2)
+        self.assertTrue(r.closed)
+        self.assertFalse(conn.close.called)
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), conn)
+
+    def test_stream_command_httplib_readinto(self):
+        conn, response = self.streaming_conn(['abc', 'de', ''])
+        buf = bytearray(3)
+        r = self.obj_ut.stream_command_httplib('/foo', 'data')
+        self.assertEqual(r.readinto(buf), 3)
+        self.assertEqual(buf, bytearray('abc'))
+        self.assertEqual(r.readinto(memoryview(buf)), 2)
+        self.assertEqual(buf, bytearray('dec'))
+        self.assertEqual(r.readinto(buf), 0)
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), conn)
+
+    def test_stream_command_httplib_closed_early(self):
+        conn, response = self.streaming_conn(['ab', 'cd', ''])
+        with self.obj_ut.stream_command_httplib('/foo', 'data') as r:
+            r.read(2)
+        conn.close.assert_called_once_with()
+        self.assertEqual(self.pool.get(self.obj_ut._pool_key), None)
+        self.assertEqual(r.read(2), '')
+
+    def test_stream_command_httplib_error_status(self):
+        conn, response = self.streaming_conn(['oops'], status=500)
+        with self.assertRaises(client_base.ClientError):
+            self.obj_ut.stream_command_httplib('/foo', 'data')
+        response.read.assert_called_once_with()
+
+    def test_stream_command(self):
+        ffo = fake_file_obj()
+        ffo.read.side_effect = ['ab', '']
+        client_base.urllib.urlopen.return_value = ffo
+        self.obj_ut.use_urllib = True
+        r = self.obj_ut.stream_command('/foo', 'data', chunk_size=16)
+        self.assertEqual(list(r), ['ab'])
+        ffo.read.assert_called_with(16)
+        ffo.close.assert_called_once_with()
+        client_base.urllib.urlopen.assert_called_once_with(
+            'https://testhost/foo', 'data')
+
     def test_send_command(self):
         self.obj_ut.use_urllib = True
         self.obj_ut.send_command('/foo', 'data')
@@ -99,7 +614,7 @@ class ClientBaseTest(unittest.TestCase):
         self.obj_ut.use_urllib = False
         self.obj_ut.send_command('/foo', 'data')
         client_base.httplib.HTTPSConnection.assert_called_once_with(
-            'testhost', 443)
+            'testhost', 443, context=_.ssl_context)
 
 
 if __name__ == "__main__":
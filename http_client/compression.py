@@ -0,0 +1,156 @@
+"""
+gzip/deflate compression of ClientBase request and response bodies.
+"""
+
+import threading
+import time
+import zlib
+
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class Decoder(object):
+    """
+    Incrementally decodes a gzip or deflate response body as it arrives.
+    Servers disagree about whether "deflate" means zlib-wrapped or raw
+    deflate data, so both are accepted.
+    """
+
+    def __init__(self, encoding, compression=None):
+        self.encoding = encoding
+        self._compression = compression
+        if encoding == 'gzip':
+            self._obj = zlib.decompressobj(_GZIP_WBITS)
+        else:
+            self._obj = zlib.decompressobj()
+        self._started = False
+
+    @property
+    def pending(self):
+        """
+        True if input has been taken in that hasn't been decoded yet
+        because of a max_length limit.
+        """
+        return bool(self._obj.unconsumed_tail)
+
+    def decompress(self, data, max_length=0):
+        """
+        Decode data, returning at most max_length bytes if max_length is
+        non-zero; the rest is kept and returned by later calls, which may
+        pass '' as data to drain it.
+        """
+        start = time.clock()
+        data = self._obj.unconsumed_tail + data
+        try:
+            out = self._obj.decompress(data, max_length)
+        except zlib.error:
+            if self._started or self.encoding != 'deflate':
+                raise
+            self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+            out = self._obj.decompress(data, max_length)
+        self._started = True
+        self._account(len(data) - len(self._obj.unconsumed_tail), len(out),
+                      start)
+        return out
+
+    def flush(self):
+        start = time.clock()
+        out = self._obj.flush()
+        self._account(0, len(out), start)
+        return out
+
+    def _account(self, bytes_in, bytes_out, start):
+        if self._compression is not None:
+            self._compression.count_response(bytes_in, bytes_out,
+                                             time.clock() - start)
+
+
+class Compression(object):
+    """
+    Compression settings for a ClientBase. Request bodies of at least
+    threshold bytes are gzipped at the given level, gzip and deflate
+    responses are advertised with Accept-Encoding and decoded as they
+    are read.
+
+    Compression ratios and CPU time spent are counted; see stats().
+    """
+
+    def __init__(self, level=6, threshold=1024):
+        self.level = level
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests_compressed = 0
+            self.request_bytes_in = 0
+            self.request_bytes_out = 0
+            self.request_cpu = 0.0
+            self.responses_decoded = 0
+            self.response_bytes_in = 0
+            self.response_bytes_out = 0
+            self.response_cpu = 0.0
+
+    def compress(self, data):
+        """
+        Returns data gzipped, or None if it's too small to bother with.
+        data is anything that supports the buffer interface.
+        """
+        if len(data) < self.threshold:
+            return None
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        start = time.clock()
+        obj = zlib.compressobj(self.level, zlib.DEFLATED, _GZIP_WBITS)
+        out = obj.compress(data) + obj.flush()
+        with self._lock:
+            self.requests_compressed += 1
+            self.request_bytes_in += len(data)
+            self.request_bytes_out += len(out)
+            self.request_cpu += time.clock() - start
+        return out
+
+    def decoder(self, content_encoding):
+        """
+        Returns a Decoder for a response with the given Content-Encoding,
+        or None if the body isn't compressed (or uses an encoding we
+        don't know, in which case it's passed through untouched).
+        """
+        encoding = (content_encoding or '').strip().lower()
+        if encoding in ('gzip', 'x-gzip'):
+            encoding = 'gzip'
+        elif encoding != 'deflate':
+            return None
+        with self._lock:
+            self.responses_decoded += 1
+        return Decoder(encoding, self)
+
+    def count_response(self, bytes_in, bytes_out, cpu):
+        with self._lock:
+            self.response_bytes_in += bytes_in
+            self.response_bytes_out += bytes_out
+            self.response_cpu += cpu
+
+    def stats(self):
+        """
+        Returns a dict of byte counts, compression ratios (uncompressed
+        size over compressed size) and CPU seconds for requests and
+        responses.
+        """
+        def ratio(big, small):
+            return float(big) / small if small else None
+        with self._lock:
+            return {
+                'requests_compressed': self.requests_compressed,
+                'request_bytes_in': self.request_bytes_in,
+                'request_bytes_out': self.request_bytes_out,
+                'request_ratio': ratio(self.request_bytes_in,
+                                       self.request_bytes_out),
+                'request_cpu': self.request_cpu,
+                'responses_decoded': self.responses_decoded,
+                'response_bytes_in': self.response_bytes_in,
+                'response_bytes_out': self.response_bytes_out,
+                'response_ratio': ratio(self.response_bytes_out,
+                                        self.response_bytes_in),
+                'response_cpu': self.response_cpu}
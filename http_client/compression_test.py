@@ -0,0 +1,77 @@
+"""
+Unit tests for compression
+"""
+import unittest
+import zlib
+import compression
+
+
+def gzipped(data):
+    obj = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return obj.compress(data) + obj.flush()
+
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.comp = compression.Compression(level=6, threshold=100)
+        self.text = 'all work and no play makes jack a dull boy\n' * 100
+
+    def test_compress(self):
+        self.assertEqual(self.comp.compress('short'), None)
+        out = self.comp.compress(self.text)
+        self.assertEqual(zlib.decompress(out, 16 + zlib.MAX_WBITS),
+                         self.text)
+        out = self.comp.compress(memoryview(bytearray(self.text)))
+        self.assertEqual(zlib.decompress(out, 16 + zlib.MAX_WBITS),
+                         self.text)
+        stats = self.comp.stats()
+        self.assertEqual(stats['requests_compressed'], 2)
+        self.assertEqual(stats['request_bytes_in'], 2 * len(self.text))
+        self.assertTrue(stats['request_ratio'] > 10)
+        self.assertTrue(stats['request_cpu'] >= 0)
+
+    def test_decoder_encodings(self):
+        self.assertEqual(self.comp.decoder(None), None)
+        self.assertEqual(self.comp.decoder('identity'), None)
+        self.assertEqual(self.comp.decoder('br'), None)
+        self.assertEqual(self.comp.decoder(' GZIP').encoding, 'gzip')
+        self.assertEqual(self.comp.decoder('x-gzip').encoding, 'gzip')
+        self.assertEqual(self.comp.decoder('deflate').encoding, 'deflate')
+
+    def test_decode_incrementally(self):
+        data = gzipped(self.text)
+        decoder = self.comp.decoder('gzip')
+        out = []
+        for i in range(0, len(data), 7):
+            out.append(decoder.decompress(data[i:i + 7]))
+        out.append(decoder.flush())
+        self.assertEqual(''.join(out), self.text)
+        stats = self.comp.stats()
+        self.assertEqual(stats['response_bytes_in'], len(data))
+        self.assertEqual(stats['response_bytes_out'], len(self.text))
+
+    def test_decode_max_length(self):
+        decoder = self.comp.decoder('gzip')
+        out = [decoder.decompress(gzipped(self.text), 64)]
+        while decoder.pending:
+            out.append(decoder.decompress('', 64))
+        self.assertTrue(all(len(o) <= 64 for o in out))
+        self.assertEqual(''.join(out) + decoder.flush(), self.text)
+
+    def test_decode_deflate(self):
+        zlibbed = zlib.compress(self.text)
+        raw = zlib.compress(self.text)[2:-4]
+        for data in (zlibbed, raw):
+            decoder = self.comp.decoder('deflate')
+            self.assertEqual(decoder.decompress(data) + decoder.flush(),
+                             self.text)
+
+    def test_decode_garbage(self):
+        decoder = self.comp.decoder('gzip')
+        with self.assertRaises(zlib.error):
+            decoder.decompress('not gzip at all')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Keep-alive connection pool for HTTP-based clients.
+"""
+
+import select
+import socket
+import threading
+import time
+
+
+class ConnectionPool(object):
+    """
+    ConnectionPool holds on to idle HTTPConnection objects so that
+    consecutive requests to the same (host, port, ssl) key don't pay for
+    a fresh TCP (and TLS) handshake every time. A single pool may be
+    shared between threads and between ClientBase instances.
+
+    At most maxsize idle connections are kept per key; connections
+    idle for longer than idle_timeout seconds are closed rather than
+    reused.
+    """
+
+    def __init__(self, maxsize=10, idle_timeout=60.0):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns a healthy idle connection for key, or None if there
+        isn't one. Expired and stale connections found along the way
+        are closed and discarded.
+        """
+        while True:
+            with self._lock:
+                conns = self._idle.get(key)
+                if not conns:
+                    return None
+                # most recently released first, it's the least likely
+                # to have been dropped by the server
+                connection, released = conns.pop()
+            if (time.time() - released <= self.idle_timeout and
+                    self.is_healthy(connection)):
+                return connection
+            connection.close()
+
+    def put(self, key, connection):
+        """
+        Returns connection to the pool for reuse. If the pool for key
+        is full, the longest idle connection is closed to make room.
+        """
+        evicted = []
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            conns.append((connection, time.time()))
+            evicted.extend(c for c, _ in self._expire(conns))
+            while len(conns) > self.maxsize:
+                evicted.append(conns.pop(0)[0])
+        for conn in evicted:
+            conn.close()
+
+    def clear(self):
+        """
+        Closes every idle connection in the pool.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for connection, _ in conns:
+                connection.close()
+
+    def _expire(self, conns):
+        """
+        Removes and returns the entries of conns (oldest first) that
+        have been idle longer than idle_timeout. Caller holds the lock.
+        """
+        cutoff = time.time() - self.idle_timeout
+        expired = []
+        while conns and conns[0][1] < cutoff:
+            expired.append(conns.pop(0))
+        return expired
+
+    @staticmethod
+    def is_healthy(connection):
+        """
+        An idle keep-alive socket should have nothing to read. If it
+        polls readable, the server has either closed it (EOF) or sent
+        something we didn't ask for; either way it can't be reused.
+        """
+        if connection.sock is None:
+            return False
+        try:
+            readable = select.select((connection.sock, ), (), (), 0)[0]
+        except (select.error, socket.error, ValueError, TypeError):
+            return False
+        return not readable
@@ -0,0 +1,77 @@
+"""
+Unit tests for connection_pool
+"""
+import unittest
+from mock import Mock
+import connection_pool
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = connection_pool.ConnectionPool(maxsize=2,
+                                                   idle_timeout=30.0)
+        connection_pool.select = Mock()
+        connection_pool.select.select.return_value = [[], [], []]
+        connection_pool.time = Mock()
+        connection_pool.time.time.return_value = 1000.0
+
+    def test_get_empty(self):
+        self.assertEqual(self.pool.get(('h', 443, True)), None)
+
+    def test_put_get_per_key(self):
+        c1, c2 = Mock(), Mock()
+        self.pool.put(('h', 443, True), c1)
+        self.pool.put(('h', 80, False), c2)
+        self.assertEqual(self.pool.get(('h', 80, False)), c2)
+        self.assertEqual(self.pool.get(('h', 443, True)), c1)
+        self.assertEqual(self.pool.get(('h', 443, True)), None)
+
+    def test_get_most_recent_first(self):
+        c1, c2 = Mock(), Mock()
+        self.pool.put('k', c1)
+        self.pool.put('k', c2)
+        self.assertEqual(self.pool.get('k'), c2)
+
+    def test_maxsize_evicts_oldest(self):
+        c1, c2, c3 = Mock(), Mock(), Mock()
+        for c in (c1, c2, c3):
+            self.pool.put('k', c)
+        c1.close.assert_called_once_with()
+        self.assertFalse(c2.close.called)
+        self.assertFalse(c3.close.called)
+
+    def test_idle_timeout(self):
+        c1 = Mock()
+        self.pool.put('k', c1)
+        connection_pool.time.time.return_value = 1031.0
+        self.assertEqual(self.pool.get('k'), None)
+        c1.close.assert_called_once_with()
+
+    def test_stale_socket_discarded(self):
+        c1, c2 = Mock(), Mock()
+        self.pool.put('k', c1)
+        self.pool.put('k', c2)
+        connection_pool.select.select.side_effect = [[[c2.sock], [], []],
+                                                     [[], [], []]]
+        self.assertEqual(self.pool.get('k'), c1)
+        c2.close.assert_called_once_with()
+
+    def test_no_socket_is_unhealthy(self):
+        c1 = Mock()
+        c1.sock = None
+        self.pool.put('k', c1)
+        self.assertEqual(self.pool.get('k'), None)
+
+    def test_clear(self):
+        c1, c2 = Mock(), Mock()
+        self.pool.put('a', c1)
+        self.pool.put('b', c2)
+        self.pool.clear()
+        c1.close.assert_called_once_with()
+        c2.close.assert_called_once_with()
+        self.assertEqual(self.pool.get('a'), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
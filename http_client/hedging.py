@@ -0,0 +1,66 @@
+"""
+Hedged requests: a policy for when ClientBase should send a second copy
+of a slow idempotent request.
+"""
+
+import threading
+from collections import deque
+
+
+class HedgePolicy(object):
+    """
+    HedgePolicy decides how long ClientBase waits for an idempotent
+    request before sending a second attempt, taking whichever answers
+    first. The delay is the given percentile of the most recent window
+    request latencies, so only the slowest few percent of requests are
+    ever hedged; until min_samples latencies have been seen,
+    initial_delay is used instead. The delay is never less than
+    min_delay.
+
+    hedged counts second attempts sent and wins counts how many of
+    those beat the original.
+    """
+
+    def __init__(self, percentile=95, initial_delay=0.1, min_delay=0.005,
+                 window=1000, min_samples=50):
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.hedged = 0
+        self.wins = 0
+        self._latencies = deque(maxlen=window)
+        self._recompute_every = max(1, window // 20)
+        self._since_recompute = 0
+        self._delay = initial_delay
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """
+        Record the latency of a completed request.
+        """
+        with self._lock:
+            self._latencies.append(seconds)
+            self._since_recompute += 1
+            if (len(self._latencies) >= self.min_samples and
+                    self._since_recompute >= self._recompute_every):
+                self._since_recompute = 0
+                ordered = sorted(self._latencies)
+                rank = int(len(ordered) * self.percentile / 100.0)
+                self._delay = ordered[min(rank, len(ordered) - 1)]
+
+    def delay(self):
+        """
+        Seconds to wait for a response before hedging.
+        """
+        with self._lock:
+            return max(self._delay, self.min_delay)
+
+    def count(self, won):
+        """
+        Record that a request was hedged, and whether the hedge won.
+        """
+        with self._lock:
+            self.hedged += 1
+            if won:
+                self.wins += 1
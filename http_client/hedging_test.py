@@ -0,0 +1,42 @@
+"""
+Unit tests for hedging
+"""
+import unittest
+import hedging
+
+
+class HedgePolicyTest(unittest.TestCase):
+
+    def test_initial_delay(self):
+        policy = hedging.HedgePolicy(initial_delay=0.2, min_samples=10)
+        for i in range(9):
+            policy.record(0.001)
+        self.assertEqual(policy.delay(), 0.2)
+
+    def test_percentile_delay(self):
+        policy = hedging.HedgePolicy(percentile=90, window=100,
+                                     min_samples=10, min_delay=0.0)
+        for ms in range(1, 101):
+            policy.record(ms / 1000.0)
+        self.assertAlmostEqual(policy.delay(), 0.091)
+        # only the most recent window counts
+        for i in range(100):
+            policy.record(0.5)
+        self.assertEqual(policy.delay(), 0.5)
+
+    def test_min_delay(self):
+        policy = hedging.HedgePolicy(min_samples=1, window=20,
+                                     min_delay=0.01)
+        for i in range(20):
+            policy.record(0.0001)
+        self.assertEqual(policy.delay(), 0.01)
+
+    def test_count(self):
+        policy = hedging.HedgePolicy()
+        policy.count(True)
+        policy.count(False)
+        self.assertEqual((policy.hedged, policy.wins), (2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Per-request latency instrumentation for ClientBase.
+"""
+
+import math
+import threading
+
+PHASES = ('connect', 'tls', 'write', 'first_byte', 'read', 'total')
+
+
+class RequestTiming(object):
+    """
+    Timings (in seconds) and sizes for one request. A phase that didn't
+    happen is None: connect and tls are only timed when a new connection
+    had to be opened, and tls only for HTTPS. first_byte is the wait for
+    the status line and headers once the request has been written.
+    """
+
+    __slots__ = ('host', 'port', 'url', 'method', 'status', 'error',
+                 'reused', 'retried', 'bytes_sent', 'bytes_received',
+                 'started') + PHASES
+
+    def __init__(self, host, port, url, method, started):
+        self.host = host
+        self.port = port
+        self.url = url
+        self.method = method
+        self.started = started
+        self.status = None
+        self.error = None
+        self.reused = False
+        self.retried = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        for phase in PHASES:
+            setattr(self, phase, None)
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+
+class RequestObserver(object):
+    """
+    Base class for anything that wants to see the timings of requests
+    made by a ClientBase; register one with ClientBase.add_observer().
+    request_finished() is called on the thread that made the request,
+    after it has succeeded or failed, so it should be quick.
+    """
+
+    def request_finished(self, timing):
+        pass
+
+
+class LatencyHistogram(RequestObserver):
+    """
+    LatencyHistogram aggregates request timings in process into a
+    log-scale histogram per phase, so it uses constant memory however
+    many requests it sees. Buckets grow by a factor of 2**(1/8), so
+    percentiles are accurate to within about 9%.
+    """
+
+    _MIN = 1e-6
+    _FACTOR = math.log(2) / 8
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._buckets = dict((phase, {}) for phase in PHASES)
+            self._counts = dict((phase, 0) for phase in PHASES)
+            self._max = dict((phase, 0.0) for phase in PHASES)
+            self.requests = 0
+            self.errors = 0
+            self.statuses = {}
+            self.bytes_sent = 0
+            self.bytes_received = 0
+
+    def request_finished(self, timing):
+        with self._lock:
+            self.requests += 1
+            if timing.error is not None:
+                self.errors += 1
+            if timing.status is not None:
+                self.statuses[timing.status] = \
+                    self.statuses.get(timing.status, 0) + 1
+            self.bytes_sent += timing.bytes_sent
+            self.bytes_received += timing.bytes_received
+            for phase in PHASES:
+                value = getattr(timing, phase)
+                if value is None:
+                    continue
+                bucket = self._bucket(value)
+                buckets = self._buckets[phase]
+                buckets[bucket] = buckets.get(bucket, 0) + 1
+                self._counts[phase] += 1
+                if value > self._max[phase]:
+                    self._max[phase] = value
+
+    def _bucket(self, value):
+        if value <= self._MIN:
+            return 0
+        return int(math.log(value / self._MIN) / self._FACTOR) + 1
+
+    def _upper_bound(self, bucket):
+        return self._MIN * math.exp(bucket * self._FACTOR)
+
+    def snapshot(self, percentiles=(50, 90, 95, 99)):
+        """
+        Returns a dict of counters plus, for each phase seen so far, its
+        count, max and the requested percentiles (as 'p50' and so on).
+        """
+        with self._lock:
+            result = {'requests': self.requests,
+                      'errors': self.errors,
+                      'statuses': dict(self.statuses),
+                      'bytes_sent': self.bytes_sent,
+                      'bytes_received': self.bytes_received}
+            for phase in PHASES:
+                count = self._counts[phase]
+                if not count:
+                    continue
+                stats = {'count': count, 'max': self._max[phase]}
+                ordered = sorted(self._buckets[phase].items())
+                for pct in percentiles:
+                    rank = max(1, int(math.ceil(count * pct / 100.0)))
+                    seen = 0
+                    for bucket, n in ordered:
+                        seen += n
+                        if seen >= rank:
+                            break
+                    stats['p%g' % pct] = min(self._upper_bound(bucket),
+                                             self._max[phase])
+                result[phase] = stats
+            return result
@@ -0,0 +1,59 @@
+"""
+Unit tests for instrumentation
+"""
+import unittest
+import instrumentation
+
+
+def timing(**phases):
+    t = instrumentation.RequestTiming('testhost', 443, '/foo', 'POST', 0.0)
+    for name, value in phases.items():
+        setattr(t, name, value)
+    return t
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.hist = instrumentation.LatencyHistogram()
+
+    def test_empty(self):
+        snap = self.hist.snapshot()
+        self.assertEqual(snap['requests'], 0)
+        self.assertFalse('total' in snap)
+
+    def test_percentiles(self):
+        for ms in range(1, 101):
+            self.hist.request_finished(timing(total=ms / 1000.0,
+                                              status=200, bytes_sent=10,
+                                              bytes_received=20))
+        snap = self.hist.snapshot()
+        self.assertEqual(snap['requests'], 100)
+        self.assertEqual(snap['statuses'], {200: 100})
+        self.assertEqual(snap['bytes_received'], 2000)
+        total = snap['total']
+        self.assertEqual(total['count'], 100)
+        self.assertEqual(total['max'], 0.1)
+        for pct, expected in ((50, 0.050), (90, 0.090), (99, 0.099)):
+            self.assertTrue(
+                expected <= total['p%d' % pct] <= expected * 1.1,
+                (pct, total['p%d' % pct]))
+        self.assertFalse('tls' in snap)
+
+    def test_phases_and_errors(self):
+        self.hist.request_finished(timing(connect=0.01, tls=0.02,
+                                          total=0.05))
+        self.hist.request_finished(timing(total=0.01,
+                                          error=IOError('boom')))
+        snap = self.hist.snapshot(percentiles=(50, ))
+        self.assertEqual(snap['errors'], 1)
+        self.assertEqual(snap['connect']['count'], 1)
+        self.assertEqual(snap['tls']['count'], 1)
+        self.assertEqual(snap['total']['count'], 2)
+        self.assertTrue('p50' in snap['total'])
+        self.hist.reset()
+        self.assertEqual(self.hist.snapshot()['requests'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+TTL-bounded name resolution cache for HTTP-based clients.
+"""
+
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachingResolver(object):
+    """
+    CachingResolver remembers getaddrinfo() results for ttl seconds so
+    that reconnecting to the same server doesn't mean another name
+    lookup each time. At most maxsize (host, port) lookups are kept.
+
+    create_connection() is a drop-in replacement for
+    socket.create_connection() that resolves through the cache; if none
+    of the cached addresses accept a connection the entry is dropped so
+    the next attempt looks the name up afresh.
+    """
+
+    def __init__(self, ttl=300.0, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, host, port):
+        """
+        Returns the (family, socktype, proto, canonname, sockaddr)
+        addresses for a TCP connection to host and port.
+        """
+        key = (host, port)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        addrs = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = (now + self.ttl, addrs)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return addrs
+
+    def invalidate(self, host, port):
+        with self._lock:
+            self._cache.pop((host, port), None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def create_connection(self, address,
+                          timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                          source_address=None):
+        """
+        Connect to address, a (host, port) pair, trying each of its
+        addresses in turn, and return the socket.
+        """
+        host, port = address
+        err = None
+        for family, socktype, proto, _, sockaddr in \
+                self.getaddrinfo(host, port):
+            sock = None
+            try:
+                sock = socket.socket(family, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except socket.error, e:
+                err = e
+                if sock is not None:
+                    sock.close()
+        self.invalidate(host, port)
+        if err is not None:
+            raise err
+        raise socket.error("getaddrinfo returns an empty list")
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self._cache)}
@@ -0,0 +1,68 @@
+"""
+Unit tests for resolver
+"""
+import unittest
+from mock import Mock
+import resolver
+import socket
+
+ADDRS = [(socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('::1', 80, 0, 0)),
+         (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 80))]
+
+
+class CachingResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        resolver.time = Mock()
+        resolver.time.time.return_value = 1000.0
+        resolver.socket = Mock()
+        resolver.socket.error = socket.error
+        resolver.socket._GLOBAL_DEFAULT_TIMEOUT = \
+            socket._GLOBAL_DEFAULT_TIMEOUT
+        resolver.socket.getaddrinfo.return_value = ADDRS
+        self.res = resolver.CachingResolver(ttl=60.0, maxsize=2)
+
+    def tearDown(self):
+        resolver.socket = socket
+
+    def test_cached_until_ttl(self):
+        self.assertEqual(self.res.getaddrinfo('h', 80), ADDRS)
+        self.assertEqual(self.res.getaddrinfo('h', 80), ADDRS)
+        self.assertEqual(resolver.socket.getaddrinfo.call_count, 1)
+        resolver.time.time.return_value = 1061.0
+        self.res.getaddrinfo('h', 80)
+        self.assertEqual(resolver.socket.getaddrinfo.call_count, 2)
+        self.assertEqual(self.res.stats(),
+                         {'hits': 1, 'misses': 2, 'size': 1})
+
+    def test_maxsize(self):
+        self.res.getaddrinfo('a', 80)
+        self.res.getaddrinfo('b', 80)
+        self.res.getaddrinfo('c', 80)
+        self.assertEqual(self.res.stats()['size'], 2)
+        self.res.getaddrinfo('a', 80)
+        self.assertEqual(resolver.socket.getaddrinfo.call_count, 4)
+
+    def test_create_connection_falls_through(self):
+        bad, good = Mock(), Mock()
+        bad.connect.side_effect = socket.error(111, 'refused')
+        resolver.socket.socket.side_effect = [bad, good]
+        sock = self.res.create_connection(('h', 80), 5.0)
+        self.assertTrue(sock is good)
+        bad.close.assert_called_once_with()
+        good.settimeout.assert_called_once_with(5.0)
+        good.connect.assert_called_once_with(('127.0.0.1', 80))
+        self.assertEqual(self.res.stats()['size'], 1)
+
+    def test_create_connection_failure_invalidates(self):
+        sock = Mock()
+        sock.connect.side_effect = socket.error(111, 'refused')
+        resolver.socket.socket.return_value = sock
+        with self.assertRaises(socket.error):
+            self.res.create_connection(('h', 80))
+        self.assertFalse(sock.settimeout.called)
+        self.assertEqual(self.res.stats()['size'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
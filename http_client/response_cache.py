@@ -0,0 +1,137 @@
+"""
+Response cache for idempotent ClientBase commands.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+class _Entry(object):
+    __slots__ = ('body', 'expires', 'etag', 'last_modified')
+
+    def __init__(self, body, expires, etag, last_modified):
+        self.body = body
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ResponseCache(object):
+    """
+    ResponseCache is a bounded LRU of response bodies. Entries are keyed
+    by method, URL, the values of the vary_headers request headers and a
+    hash of the request body, and live for the response's Cache-Control
+    max-age or, failing that, ttl seconds.
+
+    An expired entry that came with an ETag or Last-Modified header is
+    revalidated with a conditional request rather than thrown away, and
+    a 304 Not Modified answer counts as a hit. hits, misses, evictions
+    and revalidations are counted for sizing the cache; see stats().
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0, vary_headers=()):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.vary_headers = tuple(h.lower() for h in vary_headers)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, method, url, headers, request):
+        """
+        Returns the cache key for a request, or None if the request
+        can't be cached (its body is a file).
+        """
+        if hasattr(request, 'read'):
+            return None
+        if isinstance(request, unicode):
+            request = request.encode('utf-8')
+        lowered = dict((h.lower(), v) for h, v in headers.items())
+        return (method, url,
+                tuple(lowered.get(h) for h in self.vary_headers),
+                hashlib.sha1(request).hexdigest())
+
+    def fetch(self, key, fetch):
+        """
+        Returns the response body for key, from the cache if there's a
+        fresh entry. Otherwise fetch(validators) is called to ask the
+        server; validators holds If-None-Match/If-Modified-Since headers
+        when there is a stale entry to revalidate, and fetch returns a
+        (status, body, getheader) tuple for a 200 or 304 response.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires > now:
+                    self._entries[key] = self._entries.pop(key)
+                    self.hits += 1
+                    return entry.body
+                if entry.etag is None and entry.last_modified is None:
+                    del self._entries[key]
+                    entry = None
+        validators = {}
+        if entry is not None:
+            if entry.etag is not None:
+                validators['If-None-Match'] = entry.etag
+            if entry.last_modified is not None:
+                validators['If-Modified-Since'] = entry.last_modified
+        status, body, getheader = fetch(validators)
+        if status == 304 and entry is not None:
+            with self._lock:
+                self.hits += 1
+                self.revalidations += 1
+            self._store(key, entry.body, getheader, entry)
+            return entry.body
+        with self._lock:
+            self.misses += 1
+        self._store(key, body, getheader)
+        return body
+
+    def _store(self, key, body, getheader, previous=None):
+        cache_control = (getheader('cache-control') or '').lower()
+        if 'no-store' in cache_control:
+            return
+        max_age = _MAX_AGE.search(cache_control)
+        if 'no-cache' in cache_control:
+            ttl = 0
+        elif max_age:
+            ttl = int(max_age.group(1))
+        else:
+            ttl = self.ttl
+        etag = getheader('etag')
+        last_modified = getheader('last-modified')
+        if previous is not None:
+            etag = etag or previous.etag
+            last_modified = last_modified or previous.last_modified
+        entry = _Entry(body, time.time() + ttl, etag, last_modified)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns a dict of the cache's counters and current size.
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'revalidations': self.revalidations,
+                    'size': len(self._entries),
+                    'maxsize': self.maxsize}
@@ -0,0 +1,96 @@
+"""
+Unit tests for response_cache
+"""
+import unittest
+from mock import Mock
+import response_cache
+
+
+def server(*responses):
+    """
+    A fake fetch() returning each (status, body, headers) in turn.
+    """
+    fetch = Mock()
+    fetch.side_effect = [(status, body, dict(headers).get)
+                         for status, body, headers in responses]
+    return fetch
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        response_cache.time = Mock()
+        response_cache.time.time.return_value = 1000.0
+        self.cache = response_cache.ResponseCache(maxsize=2, ttl=30.0,
+                                                  vary_headers=('X-User', ))
+
+    def test_key(self):
+        k = self.cache.key('POST', '/foo', {'x-user': 'a', 'Other': 'b'},
+                           'data')
+        self.assertEqual(k, self.cache.key('POST', '/foo', {'X-User': 'a'},
+                                           bytearray('data')))
+        self.assertNotEqual(k, self.cache.key('POST', '/foo',
+                                              {'X-User': 'b'}, 'data'))
+        self.assertNotEqual(k, self.cache.key('POST', '/foo',
+                                              {'X-User': 'a'}, 'datb'))
+        self.assertNotEqual(k, self.cache.key('GET', '/foo',
+                                              {'X-User': 'a'}, 'data'))
+        self.assertEqual(self.cache.key('POST', '/foo', {}, u'caf\xe9'),
+                         self.cache.key('POST', '/foo', {}, 'caf\xc3\xa9'))
+        self.assertEqual(self.cache.key('POST', '/foo', {}, Mock()), None)
+
+    def test_hit_and_ttl(self):
+        fetch = server((200, 'one', {}), (200, 'two', {}))
+        self.assertEqual(self.cache.fetch('k', fetch), 'one')
+        fetch.assert_called_once_with({})
+        response_cache.time.time.return_value = 1029.0
+        self.assertEqual(self.cache.fetch('k', fetch), 'one')
+        response_cache.time.time.return_value = 1031.0
+        self.assertEqual(self.cache.fetch('k', fetch), 'two')
+        self.assertEqual(fetch.call_args_list[1][0][0], {})
+        s = self.cache.stats()
+        self.assertEqual((s['hits'], s['misses']), (1, 2))
+
+    def test_max_age(self):
+        fetch = server((200, 'one', {'cache-control': 'max-age=5'}),
+                       (200, 'two', {'cache-control': 'no-store'}),
+                       (200, 'three', {}))
+        self.cache.fetch('k', fetch)
+        response_cache.time.time.return_value = 1006.0
+        self.assertEqual(self.cache.fetch('k', fetch), 'two')
+        self.assertEqual(self.cache.fetch('k', fetch), 'three')
+
+    def test_revalidate(self):
+        fetch = server((200, 'one', {'etag': '"v1"',
+                                     'last-modified': 'yesterday'}),
+                       (304, '', {}),
+                       (200, 'two', {'etag': '"v2"'}))
+        self.cache.fetch('k', fetch)
+        response_cache.time.time.return_value = 1031.0
+        self.assertEqual(self.cache.fetch('k', fetch), 'one')
+        fetch.assert_called_with({'If-None-Match': '"v1"',
+                                  'If-Modified-Since': 'yesterday'})
+        # 304 made the entry fresh again
+        self.assertEqual(self.cache.fetch('k', fetch), 'one')
+        self.assertEqual(fetch.call_count, 2)
+        response_cache.time.time.return_value = 1062.0
+        self.assertEqual(self.cache.fetch('k', fetch), 'two')
+        s = self.cache.stats()
+        self.assertEqual((s['hits'], s['misses'], s['revalidations']),
+                         (2, 2, 1))
+
+    def test_lru_eviction(self):
+        fetch = server((200, 'a', {}), (200, 'b', {}), (200, 'c', {}),
+                       (200, 'b2', {}))
+        self.cache.fetch('a', fetch)
+        self.cache.fetch('b', fetch)
+        self.cache.fetch('a', fetch)  # a is now most recently used
+        self.cache.fetch('c', fetch)
+        self.assertEqual(self.cache.fetch('a', fetch), 'a')
+        self.assertEqual(self.cache.fetch('b', fetch), 'b2')
+        s = self.cache.stats()
+        self.assertEqual((s['evictions'], s['size']), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
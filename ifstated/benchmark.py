@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Compares the cost of an ifstated probe cycle with each status backend.
+
+A cycle either asks the backend for the link state, up flag and IPv4
+address of each interface in turn ("per_interface"), or takes one
+snapshot of them all ("snapshot"), as auto_configure() does. Nothing is
+brought up unless --bring-up is given. Results are JSON:
+
+    ./benchmark.py --cycles 200 eth0 wlan0
+"""
+
+import json
+import os
+import sys
+import time
+from optparse import OptionParser
+
+import ifstated
+
+
+def percentile(ordered, pct):
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+def cpu_seconds():
+    user, system, child_user, child_system = os.times()[:4]
+    return user + system + child_user + child_system
+
+
+def probe_cycle(backend, interfaces, bring_up=False):
+    for iface in interfaces:
+        if bring_up:
+            backend.bring_up(iface)
+        backend.link_detected(iface)
+        backend.is_up(iface)
+        backend.ipv4_address(iface)
+
+
+def snapshot_cycle(backend, interfaces, bring_up=False):
+    if bring_up:
+        for iface in interfaces:
+            backend.bring_up(iface)
+    backend.snapshot(interfaces)
+
+
+def run(cycle, backend, interfaces, cycles, bring_up=False):
+    """
+    Returns wall clock percentiles and mean CPU time (ours plus our
+    children's) per probe cycle, in seconds.
+    """
+    timings = []
+    cpu = cpu_seconds()
+    for i in xrange(cycles):
+        t = time.time()
+        cycle(backend, interfaces, bring_up)
+        timings.append(time.time() - t)
+    cpu = cpu_seconds() - cpu
+    timings.sort()
+    return {'cycles': cycles,
+            'p50': percentile(timings, 50),
+            'p99': percentile(timings, 99),
+            'max': timings[-1],
+            'cpu_per_cycle': cpu / cycles}
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options] [interface ...]")
+    parser.add_option('-n', '--cycles', type='int', default=100,
+        help="Probe cycles per backend (default 100)")
+    parser.add_option('-b', '--backends',
+        default=','.join(sorted(ifstated.BACKENDS)),
+        help="Comma separated backends to compare")
+    parser.add_option('--bring-up', action='store_true', default=False,
+        help="Also bring each interface up, as the wired probe does")
+    options, interfaces = parser.parse_args(argv[1:])
+    if not interfaces:
+        interfaces = sorted(os.listdir('/sys/class/net'))
+
+    results = {}
+    for name in options.backends.split(','):
+        backend = ifstated.BACKENDS[name]()
+        try:
+            results[name] = {
+                'per_interface': run(probe_cycle, backend, interfaces,
+                                     options.cycles, options.bring_up),
+                'snapshot': run(snapshot_cycle, backend, interfaces,
+                                options.cycles, options.bring_up)}
+        except OSError, e:
+            # eg ethtool isn't installed
+            results[name] = {'error': str(e)}
+    print(json.dumps({'interfaces': interfaces, 'results': results},
+                     indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,46 +1,82 @@
 #!/usr/bin/env python
+import errno
 import logging
-import logging.handlers
+import os
 import re
+import socket
 import subprocess
 import time
 
+from netlink import LinkMonitor
+from race import DhcpRace
+from scheduler import AdaptiveScheduler, Debouncer
+from status import StatusBackend
+from sysfs import SysfsBackend
+
 
-logging.getLogger(__name__).addHandler(logging.handlers.SysLogHandler('/dev/log'))
 log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
 
 
 WIRELESS_INTERFACES = ('wlan0', )
 WIRED_INTERFACES = ('eth0', 'eth1', 'eth2')
-ETHTOOL_CMD = subprocess.Popen(
-    'which \ethtool', shell=True, stdout=subprocess.PIPE).communicate()[0].strip()
-DHCLIENT_CMD = subprocess.Popen(
-    'which \dhcpcd', shell=True, stdout=subprocess.PIPE).communicate()[0].strip()
-IFCONFIG_CMD = subprocess.Popen(
-    'which \ifconfig', shell=True, stdout=subprocess.PIPE).communicate()[0].strip()
+# race DHCP on every viable interface at once instead of one at a time
+PARALLEL = False
+DHCP_TIMEOUT = 30
+MAX_WORKERS = 4
+# commands are looked up on PATH when first run; give a full path to
+# skip the search
+ETHTOOL_CMD = 'ethtool'
+DHCLIENT_CMD = 'dhcpcd'
+IFCONFIG_CMD = 'ifconfig'
+
+_resolved = {}
+
+
+def which(command):
+    """
+    Returns the full path of command, searching PATH the first time it's
+    asked for and remembering the answer. Raises OSError if it can't be
+    found.
+    """
+    path = _resolved.get(command)
+    if path is not None:
+        return path
+    if os.sep in command:
+        path = command
+    else:
+        for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+            candidate = os.path.join(directory, command)
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                path = candidate
+                break
+        else:
+            raise OSError(errno.ENOENT, "%s not found on PATH" % command)
+    _resolved[command] = path
+    return path
 
 
 def ethtool_cmd(args):
     assert args.index  # iterable
     result, _ = subprocess.Popen(
-        [ETHTOOL_CMD, ] + list(args), shell=False, stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE).communicate()
+        [which(ETHTOOL_CMD), ] + list(args), shell=False,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
     return result.strip()
 
 
 def dhclient_cmd(args):
     assert args.index  # iterable
     result, _ = subprocess.Popen(
-        [DHCLIENT_CMD, ] + list(args), shell=False, stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE).communicate()
+        [which(DHCLIENT_CMD), ] + list(args), shell=False,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
     return result.strip()
 
 
 def ifconfig_cmd(args):
     assert args.index  # iterable
     result, _ = subprocess.Popen(
-        [IFCONFIG_CMD, ] + list(args), shell=False, stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE).communicate()
+        [which(IFCONFIG_CMD), ] + list(args), shell=False,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
     return result.strip()
 
 def get_ip_address(res):
@@ -50,30 +86,25 @@ def get_ip_address(res):
     else:
         return None
 
-def wired_interface_statuses(interfaces, active_only=False):
-    def get_link_status(res):
-        gr = re.search("Link detected: (?P<link>.+)", res, re.MULTILINE)
+class SubprocessBackend(StatusBackend):
+    """
+    Status backend that runs ifconfig and ethtool and parses their
+    output. Each answer is 'yes', 'no' or None.
+    """
+
+    def bring_up(self, iface):
+        ifconfig_cmd((iface, 'up'))
+
+    def link_detected(self, iface):
+        gr = re.search("Link detected: (?P<link>.+)", ethtool_cmd((iface, )),
+                       re.MULTILINE)
         if gr:
             return gr.group('link')
         else:
             return None
-    results = {}
-    for iface in interfaces:
-        ifconfig_cmd((iface, 'up'))  # ensure interface is up
-        status = get_link_status(ethtool_cmd((iface, )))
-        ipaddr = get_ip_address(ifconfig_cmd((iface, )))
-        # yes = up and configured
-        # no = up but not configured
-        # None = not up, not configured
-        if all((status == 'yes', ipaddr)):
-            results[iface] = 'yes'
-        elif not active_only or status is not None:
-            results[iface] = 'no' if status == 'yes' else None
-    return results
-
-
-def wireless_interface_statuses(interfaces, active_only=False):
-    def get_link_status(res):
+
+    def is_up(self, iface):
+        res = ifconfig_cmd(('-s', iface, ))
         entry = [r for r in res.splitlines() if not r.startswith('Iface')]
         if entry:
             flags = entry[0].split()[10]
@@ -83,15 +114,48 @@ def wireless_interface_statuses(interfaces, active_only=False):
                 return 'no'
         else:
             return None
-    results = {}
+
+    def ipv4_address(self, iface):
+        return get_ip_address(ifconfig_cmd((iface, )))
+
+
+BACKENDS = {'subprocess': SubprocessBackend, 'sysfs': SysfsBackend}
+STATUS_BACKEND = (SysfsBackend() if SysfsBackend.available()
+                  else SubprocessBackend())
+
+
+def take_snapshot(backend=None):
+    """
+    Return a Snapshot of every interface we manage, first bringing up
+    any wired interface that's down so that its link can be seen.
+    """
+    backend = backend or STATUS_BACKEND
+    interfaces = WIRED_INTERFACES + WIRELESS_INTERFACES
+    snapshot = backend.snapshot(interfaces)
+    down = [iface for iface in WIRED_INTERFACES
+            if snapshot[iface].is_up == 'no']
+    if not down:
+        return snapshot
+    for iface in down:
+        backend.bring_up(iface)
+    return backend.snapshot(interfaces)
+
+
+def wired_interface_statuses(interfaces, active_only=False, backend=None):
+    # yes = up and configured
+    # no = up but not configured
+    # None = not up, not configured
+    backend = backend or STATUS_BACKEND
     for iface in interfaces:
-        status = get_link_status(ifconfig_cmd(('-s', iface, )))
-        ipaddr = get_ip_address(ifconfig_cmd((iface, )))
-        if status == 'yes' and ipaddr:
-            results[iface] = 'yes'
-        elif not active_only or status is not None:
-            results[iface] = 'no' if status else None
-    return results
+        backend.bring_up(iface)  # ensure interface is up
+    return backend.snapshot(interfaces).wired_statuses(interfaces,
+                                                       active_only)
+
+
+def wireless_interface_statuses(interfaces, active_only=False, backend=None):
+    backend = backend or STATUS_BACKEND
+    return backend.snapshot(interfaces).wireless_statuses(interfaces,
+                                                          active_only)
 
 
 def disable_wireless():
@@ -112,8 +176,61 @@ def configure_interface(iface):
     dhclient_cmd((iface, ))
 
 
-def auto_configure():
-    active_wired = wired_interface_statuses(WIRED_INTERFACES, active_only=True)
+def start_dhcp(iface):
+    """
+    Bring iface up and start dhcpcd on it, returning the process; it
+    exits with 0 (and leaves a daemon behind) once it holds a lease.
+    """
+    STATUS_BACKEND.bring_up(iface)
+    with open(os.devnull, 'w') as devnull:
+        return subprocess.Popen([which(DHCLIENT_CMD), iface], stdout=devnull,
+                                stderr=devnull)
+
+
+def stop_dhcp(iface):
+    dhclient_cmd(('-k', iface))
+
+
+def race_configure(snapshot):
+    """
+    Like auto_configure(), but runs DHCP on every viable interface that
+    ranks above the best one already configured at the same time, keeps
+    the highest priority one that gets a lease and shuts the rest down.
+    Interfaces rank in WIRED_INTERFACES then WIRELESS_INTERFACES order.
+    """
+    statuses = snapshot.wired_statuses(WIRED_INTERFACES, active_only=True)
+    statuses.update(snapshot.wireless_statuses(WIRELESS_INTERFACES,
+                                               active_only=True))
+    viable = [iface for iface in WIRED_INTERFACES + WIRELESS_INTERFACES
+              if statuses.get(iface) in ('yes', 'no')]
+    configured = [iface for iface in viable if statuses[iface] == 'yes']
+    fallback = configured[0] if configured else None
+    candidates = viable[:viable.index(fallback)] if fallback else viable
+    if not candidates:
+        return fallback
+
+    log.info("Racing DHCP on %s", ', '.join(candidates))
+    result = DhcpRace(start_dhcp, stop_dhcp, DHCP_TIMEOUT,
+                      MAX_WORKERS).run(candidates)
+    if result.winner is None:
+        log.error("No lease on %s: %s", ', '.join(candidates), result.failed)
+        return fallback
+    log.info("Connected via %s in %.2fs", result.winner, result.elapsed)
+    for iface in configured:
+        stop_dhcp(iface)
+    return result.winner
+
+
+def auto_configure(snapshot=None):
+    """
+    Make sure the best available interface is configured, deciding from
+    snapshot (by default, a fresh one), and return its name.
+    """
+    if snapshot is None:
+        snapshot = take_snapshot()
+    if PARALLEL:
+        return race_configure(snapshot)
+    active_wired = snapshot.wired_statuses(WIRED_INTERFACES, active_only=True)
     for iface, status in active_wired.items():
         if status == 'yes':
             # already configured, nothing to do
@@ -128,7 +245,7 @@ def auto_configure():
                       iface, status)
 
     # fall back to wireless
-    active_wless = wireless_interface_statuses(WIRELESS_INTERFACES)
+    active_wless = snapshot.wireless_statuses(WIRELESS_INTERFACES)
     for iface, status in active_wless.items():
         if status == 'yes':
             # already configured, nothing to do
@@ -142,10 +259,112 @@ def auto_configure():
                       iface, status)
 
 
-def monitor():
+def healthy(snapshot, iface):
+    """
+    True if iface is configured and usable in snapshot.
+    """
+    if iface in WIRED_INTERFACES:
+        return snapshot.wired_statuses((iface, ))[iface] == 'yes'
+    return snapshot.wireless_statuses((iface, ))[iface] == 'yes'
+
+
+class Monitor(object):
+    """
+    Monitor decides, each time it's asked to check the interfaces, whether
+    auto_configure() needs to run. Nothing is done while the state is
+    unchanged and the current interface is healthy. If the current
+    interface stops working we fail over at once; any other change (say,
+    a better interface getting a link) is only acted on once debouncer
+    considers it settled, so a flapping link doesn't bounce us back and
+    forth. scheduler decides how soon to check again.
+    """
+
+    def __init__(self, scheduler=None, debouncer=None, backend=None,
+                 clock=time.time):
+        self.scheduler = scheduler or AdaptiveScheduler()
+        self.debouncer = debouncer or Debouncer()
+        self.backend = backend
+        self.clock = clock
+        self.current = None
+        self.actions = 0
+        self._acted_on = None
+
+    def act(self, snapshot):
+        self.actions += 1
+        self.current = auto_configure(snapshot)
+        # take our own changes (a new lease, say) as the new baseline
+        self._acted_on = take_snapshot(self.backend)
+        self.debouncer.acted(self._acted_on, self.clock())
+
+    def cycle(self):
+        """
+        Check the interfaces once, acting if need be, and return the
+        seconds to wait before the next check.
+        """
+        now = self.clock()
+        snapshot = take_snapshot(self.backend)
+        changed = self.debouncer.observe(snapshot, now)
+        if self.current is None or not healthy(snapshot, self.current):
+            self.act(snapshot)
+        elif snapshot == self._acted_on:
+            self.debouncer.clear()
+        elif self.debouncer.settled(now):
+            self.act(snapshot)
+        wait = self.scheduler.update(changed)
+        remaining = self.debouncer.remaining(now)
+        if remaining is not None:
+            wait = min(wait, remaining)
+        return wait
+
+
+def poll(max_interval=15):
+    monitor(use_netlink=False, max_interval=max_interval)
+
+
+def monitor(use_netlink=True, max_interval=60):
+    """
+    Keep the best interface configured. Checks happen at least every
+    max_interval seconds, more often while things are changing, and,
+    with netlink, straight away whenever the kernel reports a link or
+    address change. Without netlink the interfaces are polled.
+    """
+    links = None
+    if use_netlink:
+        try:
+            links = LinkMonitor()
+        except socket.error, e:
+            log.warning("netlink unavailable (%s), polling", e)
+            max_interval = min(max_interval, 15)
+    watcher = Monitor(AdaptiveScheduler(maximum=max_interval))
     while 1:
-        auto_configure()
-        time.sleep(5)
+        wait = watcher.cycle()
+        if links is None:
+            time.sleep(wait)
+        else:
+            events = links.wait(wait)
+            if events:
+                log.debug("Link change: %s", events)
 
 if __name__ == '__main__':
-    monitor()
+    # only needed when running as a daemon; importing ifstated stays cheap
+    import logging.handlers
+    from optparse import OptionParser
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('--poll', action='store_true', default=False,
+        help="Poll instead of waiting for netlink events")
+    parser.add_option('--backend', choices=sorted(BACKENDS),
+        help="How to read interface status: %s" % ', '.join(sorted(BACKENDS)))
+    parser.add_option('--parallel', action='store_true', default=False,
+        help="Run DHCP on all viable interfaces at once on failover")
+    parser.add_option('--dhcp-timeout', type='int', default=DHCP_TIMEOUT,
+        help="Give up on DHCP for an interface after this many seconds")
+    options, args = parser.parse_args()
+    log.addHandler(logging.handlers.SysLogHandler('/dev/log'))
+    PARALLEL = options.parallel
+    DHCP_TIMEOUT = options.dhcp_timeout
+    if options.backend:
+        STATUS_BACKEND = BACKENDS[options.backend]()
+    if options.poll:
+        poll()
+    else:
+        monitor()
@@ -0,0 +1,182 @@
+import errno
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from mock import Mock, patch
+
+import ifstated
+from race import RaceResult
+from status import ABSENT, InterfaceState, Snapshot
+
+# seconds `import ifstated` may take in a fresh interpreter
+IMPORT_BUDGET = 0.1
+
+IMPORT_CHECK = """
+import logging.handlers, subprocess, sys, time
+
+def forbidden(*args, **kwargs):
+    raise AssertionError("side effect at import: %r" % (args, ))
+subprocess.Popen = forbidden
+logging.handlers.SysLogHandler = forbidden
+
+started = time.time()
+import ifstated
+sys.stdout.write('%f' % (time.time() - started))
+"""
+
+
+class TestImport(unittest.TestCase):
+
+    def test_import_is_cheap(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        # no tools on PATH, so import mustn't need them
+        env = {'PATH': '', 'PYTHONPATH': here}
+        proc = subprocess.Popen([sys.executable, '-c', IMPORT_CHECK],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, env=env)
+        out, err = proc.communicate()
+        self.assertEquals(0, proc.returncode, err)
+        self.assertTrue(float(out) < IMPORT_BUDGET,
+                        "importing ifstated took %ss" % out)
+
+
+class TestWhich(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.environ.get('PATH')
+        os.environ['PATH'] = os.pathsep.join(['/nonexistent', self.dir])
+        ifstated._resolved.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        os.environ['PATH'] = self.path
+        ifstated._resolved.clear()
+
+    def tool(self, name, mode=0755):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(path, mode)
+        return path
+
+    def test_found(self):
+        path = self.tool('ethtool')
+        self.assertEquals(path, ifstated.which('ethtool'))
+        # remembered, not searched for again
+        os.environ['PATH'] = ''
+        self.assertEquals(path, ifstated.which('ethtool'))
+
+    def test_not_executable(self):
+        self.tool('ethtool', 0644)
+        try:
+            ifstated.which('ethtool')
+        except OSError, e:
+            self.assertEquals(errno.ENOENT, e.errno)
+        else:
+            self.fail("expected OSError")
+
+    def test_missing_not_remembered(self):
+        self.assertRaises(OSError, ifstated.which, 'dhcpcd')
+        path = self.tool('dhcpcd')
+        self.assertEquals(path, ifstated.which('dhcpcd'))
+
+    def test_full_path(self):
+        self.assertEquals('/opt/bin/dhcpcd', ifstated.which('/opt/bin/dhcpcd'))
+
+
+# InterfaceStates by wired/wireless status
+CONFIGURED = InterfaceState('yes', 'yes', '10.0.0.2')
+UNCONFIGURED = InterfaceState('yes', 'yes', None)
+UNPLUGGED = InterfaceState('no', 'yes', None)
+
+
+class FakeRace(object):
+    """
+    Stands in for DhcpRace: the winner is the first candidate in
+    leases, and every other candidate is stopped as DhcpRace would.
+    """
+    runs = []
+    leases = ()
+
+    def __init__(self, start, stop, timeout, max_workers):
+        self.start = start
+        self.stop = stop
+
+    def run(self, candidates):
+        FakeRace.runs.append(candidates)
+        leased = [c for c in candidates if c in FakeRace.leases]
+        winner = leased[0] if leased else None
+        for iface in candidates:
+            if iface != winner:
+                self.stop(iface)
+        return RaceResult(winner, 0.1, leased,
+                          dict((c, 'failed') for c in candidates
+                               if c not in leased))
+
+
+class TestRaceConfigure(unittest.TestCase):
+
+    def setUp(self):
+        FakeRace.runs = []
+        FakeRace.leases = ()
+        self.stop = Mock()
+        for name, value in (('DhcpRace', FakeRace), ('stop_dhcp', self.stop),
+                            ('STATUS_BACKEND', Mock())):
+            patcher = patch.object(ifstated, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def configure(self, **states):
+        snapshot = Snapshot((iface, states.get(iface, ABSENT)) for iface in
+                            ifstated.WIRED_INTERFACES +
+                            ifstated.WIRELESS_INTERFACES)
+        return ifstated.race_configure(snapshot)
+
+    def stopped(self):
+        return sorted(c[0][0] for c in self.stop.call_args_list)
+
+    def test_winner(self):
+        FakeRace.leases = ('eth1', 'wlan0')
+        iface = self.configure(eth0=UNCONFIGURED, eth1=UNCONFIGURED,
+                               eth2=CONFIGURED, wlan0=UNCONFIGURED)
+        self.assertEquals('eth1', iface)
+        # only interfaces ranked above the configured one are raced
+        self.assertEquals([['eth0', 'eth1']], FakeRace.runs)
+        # the loser and the interface given up are both shut down
+        self.assertEquals(['eth0', 'eth2'], self.stopped())
+
+    def test_all_fail(self):
+        iface = self.configure(eth0=UNCONFIGURED, eth1=UNPLUGGED,
+                               eth2=CONFIGURED, wlan0=UNCONFIGURED)
+        self.assertEquals('eth2', iface)
+        self.assertEquals([['eth0']], FakeRace.runs)
+        self.assertEquals(['eth0'], self.stopped())
+
+    def test_all_fail_nothing_configured(self):
+        iface = self.configure(eth0=UNPLUGGED, eth1=UNCONFIGURED,
+                               wlan0=UNCONFIGURED)
+        self.assertEquals(None, iface)
+        self.assertEquals([['eth1', 'wlan0']], FakeRace.runs)
+        self.assertEquals(['eth1', 'wlan0'], self.stopped())
+
+    def test_nothing_viable(self):
+        self.assertEquals(None, self.configure(eth0=UNPLUGGED))
+        self.assertEquals(None, self.configure())
+        self.assertEquals([], FakeRace.runs)
+        self.assertEquals([], self.stopped())
+
+    def test_best_already_configured(self):
+        iface = self.configure(eth0=CONFIGURED, eth1=UNCONFIGURED,
+                               wlan0=CONFIGURED)
+        self.assertEquals('eth0', iface)
+        self.assertEquals([], FakeRace.runs)
+        self.assertEquals([], self.stopped())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+"""
+Link and address change notifications from the kernel over rtnetlink.
+"""
+
+import errno
+import os
+import select
+import socket
+import struct
+import time
+
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+
+IFF_UP = 0x1
+IFF_LOWER_UP = 0x10000
+
+_NLMSGHDR = struct.Struct('=LHHLL')
+_IFINFOMSG = struct.Struct('=BxHiII')
+_IFADDRMSG = struct.Struct('=BBBBi')
+_RTATTR = struct.Struct('=HH')
+
+OPERSTATES = ('unknown', 'notpresent', 'down', 'lowerlayerdown', 'testing',
+              'dormant', 'up')
+
+
+def _align(n):
+    return (n + 3) & ~3
+
+
+class LinkEvent(object):
+    """
+    One link or address notification. kind is 'link' or 'addr'; index
+    is the interface index and name its name when the kernel included
+    it. For link events flags are the interface's IFF_* flags and
+    operstate its RFC 2863 state ('up', 'down', ...) if given; for
+    IPv4 address events address is the dotted quad.
+    """
+
+    __slots__ = ('kind', 'deleted', 'index', 'name', 'flags', 'operstate',
+                 'address')
+
+    def __init__(self, kind, deleted, index, name=None, flags=None,
+                 operstate=None, address=None):
+        self.kind = kind
+        self.deleted = deleted
+        self.index = index
+        self.name = name
+        self.flags = flags
+        self.operstate = operstate
+        self.address = address
+
+    @property
+    def carrier(self):
+        if self.flags is None:
+            return None
+        return bool(self.flags & IFF_LOWER_UP)
+
+    def __repr__(self):
+        return '<LinkEvent %s%s %s(%s) flags=%s operstate=%s>' % (
+            '-' if self.deleted else '+', self.kind, self.name, self.index,
+            None if self.flags is None else hex(self.flags), self.operstate)
+
+
+def _attributes(data, offset):
+    while offset + _RTATTR.size <= len(data):
+        length, kind = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        yield kind, data[offset + _RTATTR.size:offset + length]
+        offset += (length + 3) & ~3
+
+
+def _messages(data):
+    """
+    Yields (type, body) for each netlink message in data.
+    """
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, kind, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        yield kind, data[offset + _NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def _parse(kind, body):
+    """
+    Returns a LinkEvent for a link or address message, else None.
+    """
+    if kind in (RTM_NEWLINK, RTM_DELLINK) and len(body) >= _IFINFOMSG.size:
+        _, _, index, flags, _ = _IFINFOMSG.unpack_from(body)
+        event = LinkEvent('link', kind == RTM_DELLINK, index, flags=flags)
+        for attr, value in _attributes(body, _IFINFOMSG.size):
+            if attr == IFLA_IFNAME:
+                event.name = value.split('\0', 1)[0]
+            elif attr == IFLA_OPERSTATE and value:
+                state = ord(value[0])
+                if state < len(OPERSTATES):
+                    event.operstate = OPERSTATES[state]
+            if event.name is not None and event.operstate is not None:
+                # the kernel puts these near the front; skip the rest
+                # (statistics and so on), which is most of the message
+                break
+        return event
+    if kind in (RTM_NEWADDR, RTM_DELADDR) and len(body) >= _IFADDRMSG.size:
+        family, _, _, _, index = _IFADDRMSG.unpack_from(body)
+        event = LinkEvent('addr', kind == RTM_DELADDR, index)
+        for attr, value in _attributes(body, _IFADDRMSG.size):
+            if attr == IFA_LABEL:
+                # the label may carry an alias suffix, eg eth0:1
+                event.name = value.split('\0', 1)[0].split(':', 1)[0]
+            elif family == socket.AF_INET and len(value) == 4 and (
+                    attr == IFA_LOCAL or
+                    (attr == IFA_ADDRESS and event.address is None)):
+                event.address = socket.inet_ntoa(value)
+        return event
+    return None
+
+
+def parse_messages(data):
+    """
+    Returns the LinkEvents in a buffer of netlink messages, ignoring
+    message types we don't care about.
+    """
+    events = []
+    for kind, body in _messages(data):
+        event = _parse(kind, body)
+        if event is not None:
+            events.append(event)
+    return events
+
+
+def dump(sock=None, bufsize=65536):
+    """
+    Asks the kernel for every interface and every IPv4 address and
+    returns the LinkEvents, links first. This is two requests however
+    many interfaces there are.
+    """
+    close = sock is None
+    if close:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             NETLINK_ROUTE)
+    try:
+        events = []
+        for seq, (kind, body) in enumerate((
+                (RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+                (RTM_GETADDR, _IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)))):
+            sock.send(_NLMSGHDR.pack(_NLMSGHDR.size + len(body), kind,
+                                     NLM_F_REQUEST | NLM_F_DUMP, seq + 1, 0) +
+                      body)
+            done = False
+            while not done:
+                for kind, body in _messages(sock.recv(bufsize)):
+                    if kind == NLMSG_DONE:
+                        done = True
+                        break
+                    if kind == NLMSG_ERROR:
+                        error = -struct.unpack_from('=i', body)[0]
+                        if error:
+                            raise socket.error(error, os.strerror(error))
+                        continue
+                    event = _parse(kind, body)
+                    if event is not None:
+                        events.append(event)
+        return events
+    finally:
+        if close:
+            sock.close()
+
+
+class LinkMonitor(object):
+    """
+    LinkMonitor subscribes to the kernel's link and IPv4 address change
+    notifications. Constructing one raises socket.error where netlink
+    isn't available, so callers can fall back to polling.
+
+    wait() blocks until something changes and returns the events, or
+    None if the kernel dropped notifications (the socket buffer
+    overflowed) and the caller should recheck everything.
+    """
+
+    def __init__(self, groups=RTMGRP_LINK | RTMGRP_IPV4_IFADDR,
+                 bufsize=65536, sock=None):
+        if sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                 NETLINK_ROUTE)
+            sock.bind((0, groups))
+        self.sock = sock
+        self.bufsize = bufsize
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+    def _receive(self):
+        try:
+            return parse_messages(self.sock.recv(self.bufsize))
+        except socket.error, e:
+            if e.args[0] == errno.ENOBUFS:
+                return None
+            raise
+
+    def wait(self, timeout=None, settle=0.05):
+        """
+        Wait up to timeout seconds (forever if None) for notifications.
+        Once one arrives, anything else that turns up within settle
+        seconds is collected too, since a cable pull or a DHCP lease
+        arrives as a burst of messages. Returns [] on timeout.
+        """
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return []
+        events = []
+        lost = False
+        deadline = time.time() + settle
+        while True:
+            received = self._receive()
+            if received is None:
+                lost = True
+            else:
+                events.extend(received)
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            ready, _, _ = select.select([self.sock], [], [], remaining)
+            if not ready:
+                break
+        if lost:
+            return None
+        return events
+
@@ -0,0 +1,124 @@
+import errno
+import socket
+import struct
+import unittest
+
+from mock import Mock
+
+import netlink
+
+
+def rtattr(kind, value):
+    length = 4 + len(value)
+    return struct.pack('=HH', length, kind) + value + \
+        '\0' * (netlink._align(length) - length)
+
+
+def message(kind, body):
+    return struct.pack('=LHHLL', 16 + len(body), kind, 0, 0, 0) + body
+
+
+def link_message(index, name, flags, operstate=None, kind=None):
+    body = struct.pack('=BxHiII', 0, 1, index, flags, 0xffffffff)
+    body += rtattr(netlink.IFLA_IFNAME, name + '\0')
+    if operstate is not None:
+        body += rtattr(netlink.IFLA_OPERSTATE, chr(operstate))
+    return message(kind or netlink.RTM_NEWLINK, body)
+
+
+def addr_message(index, label, kind=None):
+    body = struct.pack('=BBBBi', socket.AF_INET, 24, 0, 0, index)
+    body += rtattr(1, socket.inet_aton('10.0.0.2'))
+    body += rtattr(netlink.IFA_LABEL, label + '\0')
+    return message(kind or netlink.RTM_NEWADDR, body)
+
+
+class TestNetlink(unittest.TestCase):
+
+    def setUp(self):
+        self.select = netlink.select = Mock()
+
+    def test_parse_link(self):
+        events = netlink.parse_messages(
+            link_message(2, 'eth0', netlink.IFF_UP | netlink.IFF_LOWER_UP, 6) +
+            link_message(3, 'eth1', netlink.IFF_UP, 2))
+        self.assertEquals(2, len(events))
+        self.assertEquals(('link', False, 2, 'eth0', 'up', True),
+                          (events[0].kind, events[0].deleted, events[0].index,
+                           events[0].name, events[0].operstate,
+                           events[0].carrier))
+        self.assertEquals(('eth1', 'down', False),
+                          (events[1].name, events[1].operstate,
+                           events[1].carrier))
+
+    def test_parse_addr(self):
+        events = netlink.parse_messages(
+            addr_message(2, 'eth0:1', netlink.RTM_DELADDR) +
+            message(99, 'ignored!'))
+        self.assertEquals(1, len(events))
+        self.assertEquals(('addr', True, 2, 'eth0', None),
+                          (events[0].kind, events[0].deleted, events[0].index,
+                           events[0].name, events[0].carrier))
+
+    def test_parse_truncated(self):
+        data = link_message(2, 'eth0', 0)
+        self.assertEquals([], netlink.parse_messages(data[:10]))
+        self.assertEquals('eth0',
+                          netlink.parse_messages(data + data[:20])[0].name)
+
+    def test_parse_addr_address(self):
+        event = netlink.parse_messages(addr_message(2, 'eth0'))[0]
+        self.assertEquals('10.0.0.2', event.address)
+
+    def test_dump(self):
+        sock = Mock()
+        done = message(netlink.NLMSG_DONE, struct.pack('=i', 0))
+        sock.recv.side_effect = [
+            link_message(1, 'lo', 0x10049) + link_message(2, 'eth0', 0x1003),
+            done, addr_message(2, 'eth0') + done]
+        events = netlink.dump(sock)
+        self.assertEquals(['lo', 'eth0', 'eth0'], [e.name for e in events])
+        self.assertEquals([netlink.RTM_GETLINK, netlink.RTM_GETADDR],
+                          [struct.unpack_from('=LH', c[0][0])[1]
+                           for c in sock.send.call_args_list])
+        self.assertFalse(sock.close.called)
+
+    def test_dump_error(self):
+        sock = Mock()
+        sock.recv.return_value = message(netlink.NLMSG_ERROR,
+                                         struct.pack('=i', -errno.EPERM))
+        self.assertRaises(socket.error, netlink.dump, sock)
+
+    def test_wait_timeout(self):
+        sock = Mock()
+        self.select.select.return_value = ([], [], [])
+        self.assertEquals([], netlink.LinkMonitor(sock=sock).wait(5))
+        self.select.select.assert_called_once_with([sock], [], [], 5)
+        self.assertFalse(sock.recv.called)
+
+    def test_wait_collects_burst(self):
+        sock = Mock()
+        sock.recv.side_effect = [link_message(2, 'eth0', 0),
+                                 addr_message(2, 'eth0')]
+        self.select.select.side_effect = [([sock], [], []), ([sock], [], []),
+                                          ([], [], [])]
+        events = netlink.LinkMonitor(sock=sock).wait(5, settle=10)
+        self.assertEquals(['link', 'addr'], [e.kind for e in events])
+
+    def test_wait_overflow(self):
+        sock = Mock()
+        sock.recv.side_effect = [socket.error(errno.ENOBUFS, 'No buffer'),
+                                 link_message(2, 'eth0', 0)]
+        self.select.select.side_effect = [([sock], [], []), ([sock], [], []),
+                                          ([], [], [])]
+        self.assertEquals(None, netlink.LinkMonitor(sock=sock).wait(settle=10))
+
+    def test_wait_error(self):
+        sock = Mock()
+        sock.recv.side_effect = socket.error(errno.EBADF, 'Bad file')
+        self.select.select.return_value = ([sock], [], [])
+        self.assertRaises(socket.error, netlink.LinkMonitor(sock=sock).wait)
+
+
+if __name__ == '__main__':
+    unittest.main()
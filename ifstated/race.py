@@ -0,0 +1,149 @@
+"""
+Bringing up several interfaces at once and keeping the best one that
+gets a DHCP lease.
+"""
+
+import logging
+import threading
+import time
+from Queue import Queue
+
+log = logging.getLogger(__name__)
+
+
+class RaceResult(object):
+    """
+    The outcome of a DhcpRace. winner is the interface kept (None if
+    none got a lease), elapsed the seconds from the start of the race
+    until it was decided, leased the interfaces that got a lease and
+    failed maps each interface that didn't to 'failed', 'timeout' or
+    'cancelled'.
+    """
+
+    __slots__ = ('winner', 'elapsed', 'leased', 'failed')
+
+    def __init__(self, winner, elapsed, leased, failed):
+        self.winner = winner
+        self.elapsed = elapsed
+        self.leased = leased
+        self.failed = failed
+
+    def __repr__(self):
+        return '<RaceResult winner=%s elapsed=%.3f leased=%s failed=%s>' % (
+            self.winner, self.elapsed, self.leased, self.failed)
+
+
+class DhcpRace(object):
+    """
+    DhcpRace configures candidate interfaces concurrently, up to
+    max_workers at a time, and commits to the highest priority one that
+    gets a lease, so a failover doesn't have to sit through one DHCP
+    exchange after another.
+
+    start(iface) brings iface up and starts DHCP on it, returning a
+    subprocess.Popen-like object that exits with 0 once a lease is held.
+    Attempts that haven't finished after timeout seconds, or that can no
+    longer win, are killed. stop(iface) is then called for every started
+    interface except the winner to release whatever it got.
+    """
+
+    def __init__(self, start, stop, timeout=30.0, max_workers=4,
+                 poll_interval=0.05):
+        self.start = start
+        self.stop = stop
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+
+    def _attempt(self, iface, cancelled):
+        try:
+            proc = self.start(iface)
+        except (OSError, IOError), e:
+            log.error("Couldn't configure %s: %s", iface, e)
+            return 'failed'
+        deadline = time.time() + self.timeout
+        try:
+            while proc.poll() is None:
+                if cancelled.is_set() or time.time() >= deadline:
+                    self._kill(proc)
+                    return 'cancelled' if cancelled.is_set() else 'timeout'
+                cancelled.wait(self.poll_interval)
+        except Exception:
+            self._kill(proc)
+            raise
+        return 'leased' if proc.returncode == 0 else 'failed'
+
+    @staticmethod
+    def _kill(proc):
+        try:
+            proc.kill()
+            proc.wait()
+        except OSError:
+            pass
+
+    def _worker(self, pending, lock, started, cancelled, results):
+        while not cancelled.is_set():
+            with lock:
+                if not pending:
+                    return
+                iface = pending.pop(0)
+                started.append(iface)
+            # run() waits for an outcome from every attempt, so one must
+            # be put whatever goes wrong
+            outcome = 'failed'
+            try:
+                outcome = self._attempt(iface, cancelled)
+            except Exception:
+                log.exception("Couldn't configure %s", iface)
+            finally:
+                results.put((iface, outcome))
+
+    def run(self, candidates):
+        """
+        Race candidates, given highest priority first, and return a
+        RaceResult.
+        """
+        began = time.time()
+        pending = list(candidates)
+        started = []
+        outcomes = {}
+        lock = threading.Lock()
+        cancelled = threading.Event()
+        results = Queue()
+        workers = [threading.Thread(target=self._worker,
+                                    args=(pending, lock, started, cancelled,
+                                          results))
+                   for i in range(min(self.max_workers, len(candidates)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        winner = None
+        while len(outcomes) < len(candidates):
+            iface, outcome = results.get()
+            outcomes[iface] = outcome
+            # the winner is the first candidate to get a lease once
+            # everything ahead of it has failed
+            for candidate in candidates:
+                if candidate not in outcomes:
+                    break
+                if outcomes[candidate] == 'leased':
+                    winner = candidate
+                    break
+            if winner is not None:
+                break
+        elapsed = time.time() - began
+
+        cancelled.set()
+        for worker in workers:
+            worker.join()
+        while not results.empty():
+            iface, outcome = results.get()
+            outcomes[iface] = outcome
+        for iface in started:
+            if iface != winner:
+                self.stop(iface)
+        return RaceResult(
+            winner, elapsed,
+            [c for c in candidates if outcomes.get(c) == 'leased'],
+            dict((c, o) for c, o in outcomes.items() if o != 'leased'))
@@ -0,0 +1,124 @@
+import time
+import unittest
+
+from mock import Mock, patch
+
+from race import DhcpRace
+
+
+class FakeProcess(object):
+    """
+    Exits with returncode after delay seconds, unless killed first.
+    """
+
+    def __init__(self, delay, returncode):
+        self.finish = time.time() + delay
+        self.exit_code = returncode
+        self.returncode = None
+        self.killed = False
+
+    def poll(self):
+        if self.returncode is None and time.time() >= self.finish:
+            self.returncode = self.exit_code
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+        self.returncode = -9
+
+    def wait(self):
+        return self.returncode
+
+
+class TestDhcpRace(unittest.TestCase):
+
+    def race(self, script, **kwargs):
+        """
+        script maps interface to (delay, returncode) for its DHCP attempt.
+        """
+        self.procs = {}
+
+        def start(iface):
+            if isinstance(script[iface], Exception):
+                raise script[iface]
+            self.procs[iface] = FakeProcess(*script[iface])
+            return self.procs[iface]
+        self.stop = Mock()
+        kwargs.setdefault('poll_interval', 0.001)
+        return DhcpRace(start, self.stop, **kwargs)
+
+    def stopped(self):
+        return sorted(c[0][0] for c in self.stop.call_args_list)
+
+    def test_first_choice_wins(self):
+        race = self.race({'eth0': (0.01, 0), 'eth1': (0, 0),
+                          'wlan0': (0.5, 0)})
+        result = race.run(['eth0', 'eth1', 'wlan0'])
+        self.assertEquals('eth0', result.winner)
+        self.assertTrue(result.elapsed < 0.5)
+        self.assertEquals(['eth0', 'eth1'], result.leased)
+        self.assertEquals({'wlan0': 'cancelled'}, result.failed)
+        self.assertTrue(self.procs['wlan0'].killed)
+        self.assertEquals(['eth1', 'wlan0'], self.stopped())
+
+    def test_waits_for_higher_priority(self):
+        race = self.race({'eth0': (0.05, 1), 'wlan0': (0, 0)})
+        result = race.run(['eth0', 'wlan0'])
+        self.assertEquals('wlan0', result.winner)
+        self.assertTrue(result.elapsed >= 0.05)
+        self.assertEquals({'eth0': 'failed'}, result.failed)
+        self.assertEquals(['eth0'], self.stopped())
+
+    def test_timeout(self):
+        race = self.race({'eth0': (5, 0), 'wlan0': (0, 0)}, timeout=0.05)
+        result = race.run(['eth0', 'wlan0'])
+        self.assertEquals('wlan0', result.winner)
+        self.assertEquals({'eth0': 'timeout'}, result.failed)
+        self.assertTrue(self.procs['eth0'].killed)
+
+    def test_nobody_wins(self):
+        race = self.race({'eth0': OSError(2, 'No such file'),
+                          'wlan0': (0, 1)})
+        result = race.run(['eth0', 'wlan0'])
+        self.assertEquals(None, result.winner)
+        self.assertEquals([], result.leased)
+        self.assertEquals({'eth0': 'failed', 'wlan0': 'failed'},
+                          result.failed)
+        self.assertEquals(['eth0', 'wlan0'], self.stopped())
+
+    def test_unexpected_errors(self):
+        broken = FakeProcess(1, 0)
+        broken.poll = Mock(side_effect=RuntimeError('poll failed'))
+        race = self.race({'eth0': ValueError('bad interface'),
+                          'eth1': (0, 0), 'wlan0': (0, 0)})
+        start = race.start
+        race.start = lambda iface: broken if iface == 'eth1' else \
+            start(iface)
+        with patch('race.log'):
+            result = race.run(['eth0', 'eth1', 'wlan0'])
+        self.assertEquals('wlan0', result.winner)
+        self.assertEquals({'eth0': 'failed', 'eth1': 'failed'},
+                          result.failed)
+        self.assertTrue(broken.killed)
+        self.assertEquals(['eth0', 'eth1'], self.stopped())
+
+    def test_max_workers(self):
+        race = self.race({'eth0': (0, 0), 'eth1': (0, 0)}, max_workers=1)
+        result = race.run(['eth0', 'eth1'])
+        self.assertEquals('eth0', result.winner)
+        # eth1 only starts if the worker beat the decision to it, and is
+        # stopped if so
+        self.assertEquals(sorted(set(self.procs) - set(['eth0'])),
+                          self.stopped())
+
+    def test_concurrent(self):
+        script = dict(('eth%d' % i, (0.1, 1)) for i in range(8))
+        script['eth7'] = (0.1, 0)
+        race = self.race(script, max_workers=8)
+        result = race.run(['eth%d' % i for i in range(8)])
+        self.assertEquals('eth7', result.winner)
+        self.assertTrue(result.elapsed < 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Timing policy for ifstated's monitor loop: how often to look, and how
+long a change must last before acting on it.
+"""
+
+import time
+
+
+class AdaptiveScheduler(object):
+    """
+    A poll interval that starts at minimum, is multiplied by factor
+    (up to maximum) every time a check finds nothing changed, and drops
+    back to minimum whenever something does.
+    """
+
+    def __init__(self, minimum=1.0, maximum=15.0, factor=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.interval = minimum
+
+    def update(self, changed):
+        """
+        Record whether the last check saw a change and return the
+        seconds to wait before the next one.
+        """
+        if changed:
+            self.interval = self.minimum
+        else:
+            self.interval = min(self.interval * self.factor, self.maximum)
+        return self.interval
+
+
+class Debouncer(object):
+    """
+    Debouncer decides when a new state has held long enough to act on.
+    A state is settled once it has been seen unchanged for hold seconds.
+    Every time the state changes less than hold seconds after the last
+    change (a flap), hold doubles, up to max_hold; each time a settled
+    state is acted on it halves again, back down to the initial hold.
+    """
+
+    def __init__(self, hold=5.0, max_hold=120.0):
+        self.base_hold = hold
+        self.hold = hold
+        self.max_hold = max_hold
+        self.flaps = 0
+        self.pending = False
+        self._state = None
+        self._since = None
+
+    def observe(self, state, now=None):
+        """
+        Record the latest state. Returns True if it differs from the
+        previous one.
+        """
+        now = time.time() if now is None else now
+        if self._since is not None:
+            if state == self._state:
+                return False
+            if now - self._since < self.hold:
+                self.flaps += 1
+                self.hold = min(self.hold * 2, self.max_hold)
+        self._state = state
+        self._since = now
+        self.pending = True
+        return True
+
+    def settled(self, now=None):
+        now = time.time() if now is None else now
+        return self._since is not None and now - self._since >= self.hold
+
+    def remaining(self, now=None):
+        """
+        Seconds until the pending state settles, or None if nothing is
+        pending.
+        """
+        if not self.pending:
+            return None
+        now = time.time() if now is None else now
+        return max(0.0, self._since + self.hold - now)
+
+    def acted(self, state=None, now=None):
+        """
+        Record that the current state has been dealt with. If acting on
+        it changed things, state is how they are now; that isn't counted
+        as a change.
+        """
+        self.pending = False
+        self.hold = max(self.base_hold, self.hold / 2)
+        if state is not None:
+            self._state = state
+            self._since = time.time() if now is None else now
+
+    def clear(self):
+        """
+        Forget the pending state without acting on it, for when things
+        have gone back to how they were last acted on.
+        """
+        self.pending = False
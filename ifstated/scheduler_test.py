@@ -0,0 +1,77 @@
+import unittest
+
+from scheduler import AdaptiveScheduler, Debouncer
+
+
+class TestAdaptiveScheduler(unittest.TestCase):
+
+    def test_backoff(self):
+        scheduler = AdaptiveScheduler(minimum=1, maximum=10, factor=2)
+        self.assertEquals([2, 4, 8, 10, 10],
+                          [scheduler.update(False) for i in range(5)])
+        self.assertEquals(1, scheduler.update(True))
+        self.assertEquals(2, scheduler.update(False))
+
+
+class TestDebouncer(unittest.TestCase):
+
+    def test_settles(self):
+        debouncer = Debouncer(hold=5)
+        self.assertTrue(debouncer.observe('a', now=100))
+        self.assertFalse(debouncer.settled(now=104))
+        self.assertEquals(1, debouncer.remaining(now=104))
+        self.assertFalse(debouncer.observe('a', now=104))
+        self.assertTrue(debouncer.settled(now=105))
+        debouncer.acted()
+        self.assertFalse(debouncer.pending)
+        self.assertEquals(None, debouncer.remaining(now=105))
+        self.assertEquals(0, debouncer.flaps)
+
+    def test_flapping_backs_off(self):
+        debouncer = Debouncer(hold=5, max_hold=30)
+        debouncer.observe('up', now=0)
+        debouncer.observe('down', now=1)
+        debouncer.observe('up', now=2)
+        self.assertEquals(2, debouncer.flaps)
+        self.assertEquals(20, debouncer.hold)
+        self.assertFalse(debouncer.settled(now=21))
+        self.assertTrue(debouncer.settled(now=22))
+        debouncer.observe('down', now=22)
+        debouncer.observe('up', now=23)
+        self.assertEquals(30, debouncer.hold)
+
+    def test_clear(self):
+        debouncer = Debouncer(hold=5)
+        debouncer.observe('up', now=0)
+        debouncer.clear()
+        self.assertFalse(debouncer.pending)
+        self.assertEquals(None, debouncer.remaining(now=1))
+        # a quick change back is still a flap
+        debouncer.observe('down', now=1)
+        self.assertEquals(10, debouncer.hold)
+        self.assertTrue(debouncer.pending)
+
+    def test_acting_relaxes_hold(self):
+        debouncer = Debouncer(hold=5)
+        debouncer.observe('up', now=0)
+        debouncer.observe('down', now=1)
+        self.assertEquals(10, debouncer.hold)
+        debouncer.acted()
+        self.assertEquals(5, debouncer.hold)
+        debouncer.acted()
+        self.assertEquals(5, debouncer.hold)
+        # a change after acting isn't a flap
+        debouncer.observe('up', now=20)
+        self.assertEquals(5, debouncer.hold)
+
+    def test_acted_new_state(self):
+        debouncer = Debouncer(hold=5)
+        debouncer.observe('down', now=0)
+        debouncer.acted('configured', now=1)
+        self.assertFalse(debouncer.observe('configured', now=2))
+        self.assertEquals(0, debouncer.flaps)
+        self.assertFalse(debouncer.pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
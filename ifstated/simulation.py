@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Simulated interfaces for exercising ifstated's failover logic.
+
+FakeKernel stands in for the status backend and the ifconfig/dhcpcd
+commands, and Simulation drives a Monitor over a scripted timeline of
+carrier changes in virtual time, reporting failover latency, commands
+issued and CPU time per check. Run as a script it benchmarks growing
+numbers of interfaces:
+
+    ./simulation.py --interfaces 1,10,100,500 --duration 3600
+"""
+
+import json
+import logging
+import random
+import sys
+import time
+from optparse import OptionParser
+
+import ifstated
+from scheduler import AdaptiveScheduler, Debouncer
+from status import ABSENT, InterfaceState, Snapshot, StatusBackend
+
+
+class FakeInterface(object):
+    __slots__ = ('carrier', 'up', 'address')
+
+    def __init__(self, carrier=False, up=False, address=None):
+        self.carrier = carrier
+        self.up = up
+        self.address = address
+
+
+class FakeKernel(StatusBackend):
+    """
+    Interface state for a Simulation, answering as a status backend
+    would and recording every command run against it. dhcpcd takes
+    lease_time (virtual) seconds and succeeds if the interface is up
+    with a carrier.
+    """
+
+    def __init__(self, simulation, lease_time=2.0):
+        self.simulation = simulation
+        self.lease_time = lease_time
+        self.interfaces = {}
+        self.commands = []
+        self.snapshots = 0
+
+    def add(self, iface, carrier=False, up=False, address=None):
+        self.interfaces[iface] = FakeInterface(carrier, up, address)
+
+    def set_carrier(self, iface, carrier):
+        state = self.interfaces[iface]
+        state.carrier = carrier
+        if not carrier:
+            state.address = None  # the lease is as good as gone
+
+    def bring_up(self, iface):
+        self.commands.append(('ifconfig', iface, 'up'))
+        if iface in self.interfaces:
+            self.interfaces[iface].up = True
+
+    def _state(self, iface):
+        state = self.interfaces.get(iface)
+        if state is None:
+            return ABSENT
+        return InterfaceState('yes' if state.up and state.carrier else 'no',
+                              'yes' if state.up else 'no',
+                              state.address if state.up else None)
+
+    def link_detected(self, iface):
+        return self._state(iface).link_detected
+
+    def is_up(self, iface):
+        return self._state(iface).is_up
+
+    def ipv4_address(self, iface):
+        return self._state(iface).ipv4_address
+
+    def snapshot(self, interfaces):
+        self.snapshots += 1
+        return Snapshot(((iface, self._state(iface)) for iface in interfaces),
+                        self.simulation.now)
+
+    def ifconfig_cmd(self, args):
+        if len(args) == 2 and args[1] == 'up':
+            self.bring_up(args[0])
+        else:
+            self.commands.append(('ifconfig', ) + tuple(args))
+        return ''
+
+    def dhclient_cmd(self, args):
+        self.commands.append(('dhcpcd', ) + tuple(args))
+        if args[0] == '-k':
+            state = self.interfaces.get(args[1])
+            if state is not None:
+                state.address = None
+            return ''
+        iface = args[0]
+        self.simulation.now += self.lease_time
+        state = self.interfaces.get(iface)
+        if state is not None and state.up and state.carrier:
+            state.address = '10.%d.%d.2' % divmod(
+                sorted(self.interfaces).index(iface) % 65536, 256)
+        return ''
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[int(round(pct / 100.0 * (len(ordered) - 1)))]
+
+
+class Simulation(object):
+    """
+    wired and wireless are the interface names ifstated manages, in
+    priority order. timeline is a list of (seconds, iface, carrier)
+    changes. With events, the monitor is woken (after netlink's settle
+    delay) by every change, as it would be with netlink; otherwise it
+    only polls. max_interval defaults to what monitor() uses for each.
+    """
+
+    def __init__(self, wired, wireless, timeline=(), events=True,
+                 lease_time=2.0, hold=5.0, max_interval=None,
+                 settle=0.05):
+        self.now = 0.0
+        self.wired = tuple(wired)
+        self.wireless = tuple(wireless)
+        self.timeline = sorted(timeline)
+        self.events = events
+        self.settle = settle
+        self.kernel = FakeKernel(self, lease_time)
+        if max_interval is None:
+            max_interval = 60.0 if events else 15.0
+        self.monitor = ifstated.Monitor(
+            AdaptiveScheduler(maximum=max_interval), Debouncer(hold),
+            self.kernel, clock=lambda: self.now)
+
+    def connected(self):
+        current = self.monitor.current
+        return current is not None and \
+            ifstated.healthy(self.kernel.snapshot((current, )), current)
+
+    def run(self, duration):
+        """
+        Run for duration virtual seconds and return a dict of results.
+        """
+        saved = dict((name, getattr(ifstated, name)) for name in (
+            'WIRED_INTERFACES', 'WIRELESS_INTERFACES', 'STATUS_BACKEND',
+            'ifconfig_cmd', 'dhclient_cmd'))
+        ifstated.WIRED_INTERFACES = self.wired
+        ifstated.WIRELESS_INTERFACES = self.wireless
+        ifstated.STATUS_BACKEND = self.kernel
+        ifstated.ifconfig_cmd = self.kernel.ifconfig_cmd
+        ifstated.dhclient_cmd = self.kernel.dhclient_cmd
+        try:
+            return self._run(duration)
+        finally:
+            for name, value in saved.items():
+                setattr(ifstated, name, value)
+
+    def _run(self, duration):
+        timeline = list(self.timeline)
+        cycles = 0
+        cpu = 0.0
+        per_cycle = []
+        outage = None
+        outages = []
+        while self.now < duration:
+            while timeline and timeline[0][0] <= self.now:
+                at, iface, carrier = timeline.pop(0)
+                was_connected = outage is None and self.connected()
+                self.kernel.set_carrier(iface, carrier)
+                if was_connected and not self.connected():
+                    outage = at
+            commands = len(self.kernel.commands)
+            started = time.clock()
+            wait = self.monitor.cycle()
+            cpu += time.clock() - started
+            cycles += 1
+            per_cycle.append(len(self.kernel.commands) - commands)
+            if outage is not None and self.connected():
+                outages.append(self.now - outage)
+                outage = None
+            wake = self.now + wait
+            if self.events and timeline:
+                wake = min(wake, max(self.now, timeline[0][0] + self.settle))
+            self.now = wake
+        per_cycle.sort()
+        outages.sort()
+        return {'interfaces': len(self.wired) + len(self.wireless),
+                'duration': duration,
+                'cycles': cycles,
+                'actions': self.monitor.actions,
+                'snapshots': self.kernel.snapshots,
+                'commands': len(self.kernel.commands),
+                'commands_per_cycle': {
+                    'mean': float(sum(per_cycle)) / cycles,
+                    'p99': percentile(per_cycle, 99),
+                    'max': per_cycle[-1]},
+                'cpu_per_cycle': cpu / cycles,
+                'failovers': len(outages),
+                'unrecovered': outage is not None,
+                'failover_latency': {
+                    'p50': percentile(outages, 50),
+                    'max': outages[-1] if outages else None}}
+
+
+def cable_pulls(interfaces, duration, every=60.0, down_for=10.0, seed=0):
+    """
+    A timeline in which, every `every` seconds on average, a random one
+    of interfaces loses its carrier for about down_for seconds.
+    """
+    rand = random.Random(seed)
+    timeline = []
+    at = rand.expovariate(1.0 / every)
+    while at < duration:
+        iface = rand.choice(interfaces)
+        timeline.append((at, iface, False))
+        timeline.append((at + rand.uniform(0.5, 1.5) * down_for, iface, True))
+        at += rand.expovariate(1.0 / every)
+    return timeline
+
+
+def scenario(count, duration, events=True, seed=0):
+    """
+    A Simulation with count interfaces: count - 1 wired ones, of which
+    the first few have a carrier, and one wireless fallback.
+    """
+    wired = ['eth%d' % i for i in range(max(count - 1, 1))]
+    sim = Simulation(wired, ['wlan0'],
+                     cable_pulls(wired[:4], duration, seed=seed), events)
+    for i, iface in enumerate(wired):
+        sim.kernel.add(iface, carrier=i < 4)
+    sim.kernel.add('wlan0', carrier=True, up=True)
+    return sim
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('-i', '--interfaces', default='2,10,100,500',
+        help="Comma separated interface counts to simulate")
+    parser.add_option('-d', '--duration', type='float', default=3600,
+        help="Virtual seconds to simulate (default 3600)")
+    parser.add_option('--poll', action='store_true', default=False,
+        help="Poll rather than wake on (simulated) netlink events")
+    parser.add_option('--seed', type='int', default=0)
+    options, args = parser.parse_args(argv[1:])
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    for count in options.interfaces.split(','):
+        sim = scenario(int(count), options.duration, not options.poll,
+                       options.seed)
+        results.append(sim.run(options.duration))
+    print(json.dumps({'events': not options.poll, 'results': results},
+                     indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,59 @@
+import unittest
+
+from simulation import Simulation, scenario
+
+
+class TestFailover(unittest.TestCase):
+
+    def simulation(self, timeline=(), events=True):
+        sim = Simulation(['eth0', 'eth1'], ['wlan0'], timeline, events)
+        sim.kernel.add('eth0', carrier=True)
+        sim.kernel.add('eth1')
+        sim.kernel.add('wlan0', carrier=True, up=True)
+        return sim
+
+    def test_steady_state(self):
+        sim = self.simulation()
+        result = sim.run(3600)
+        self.assertEquals('eth0', sim.monitor.current)
+        self.assertEquals(1, result['actions'])
+        # bringing up eth0 and eth1, then dhcpcd -k wlan0 and
+        # configure_interface()'s ifconfig eth0 up and dhcpcd eth0
+        self.assertEquals(5, result['commands'])
+        # the poll interval backs off to a minute
+        self.assertTrue(result['cycles'] < 75)
+
+    def test_cable_pull(self):
+        sim = self.simulation([(100, 'eth0', False), (200, 'eth0', True)])
+        result = sim.run(400)
+        self.assertEquals('eth0', sim.monitor.current)
+        self.assertEquals(1, result['failovers'])
+        # settle, then a lease on the wireless
+        self.assertAlmostEquals(2.05, result['failover_latency']['max'])
+        self.assertEquals(3, result['actions'])
+
+    def test_cable_pull_polling(self):
+        sim = self.simulation([(100, 'eth0', False), (200, 'eth0', True)],
+                              events=False)
+        result = sim.run(400)
+        self.assertEquals(1, result['failovers'])
+        self.assertTrue(result['failover_latency']['max'] <= 15 + 2)
+
+    def test_flapping_doesnt_churn(self):
+        timeline = [(100 + i, 'eth0', i % 2 == 1) for i in range(20)]
+        sim = self.simulation(timeline)
+        result = sim.run(400)
+        # fail over to wlan0 once, and back once eth0 has settled
+        self.assertEquals('eth0', sim.monitor.current)
+        self.assertTrue(result['actions'] <= 4)
+        self.assertTrue(sim.monitor.debouncer.flaps >= 10)
+
+    def test_scales(self):
+        small = scenario(10, 3600).run(3600)
+        big = scenario(500, 3600).run(3600)
+        self.assertEquals(small['actions'], big['actions'])
+        self.assertEquals(small['failover_latency'], big['failover_latency'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Point-in-time interface status snapshots for ifstated.
+"""
+
+import time
+from collections import namedtuple
+
+# Each field is as returned by a status backend: link_detected and is_up
+# are 'yes', 'no' or None (no such interface), ipv4_address a dotted
+# quad or None.
+InterfaceState = namedtuple('InterfaceState',
+                            'link_detected is_up ipv4_address')
+
+ABSENT = InterfaceState(None, None, None)
+
+
+class Snapshot(object):
+    """
+    The state of a set of interfaces at one moment. Snapshots are
+    immutable and compare equal when every interface's state is the
+    same, so decisions can be made (and cached) from one consistent view
+    rather than from probes taken at different times.
+    """
+
+    __slots__ = ('_states', 'taken')
+
+    def __init__(self, states, taken=None):
+        self._states = dict(states)
+        self.taken = time.time() if taken is None else taken
+
+    def __getitem__(self, iface):
+        return self._states.get(iface, ABSENT)
+
+    def __iter__(self):
+        return iter(self._states)
+
+    def __len__(self):
+        return len(self._states)
+
+    def __eq__(self, other):
+        return isinstance(other, Snapshot) and self._states == other._states
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<Snapshot %r>' % (self._states, )
+
+    def wired_statuses(self, interfaces, active_only=False):
+        """
+        'yes' for interfaces with a link and an address, 'no' for those
+        with a link but no address and None for those without a link.
+        With active_only, interfaces without a link are left out.
+        """
+        results = {}
+        for iface in interfaces:
+            state = self[iface]
+            if state.link_detected == 'yes' and state.ipv4_address:
+                results[iface] = 'yes'
+            elif not active_only or state.link_detected is not None:
+                results[iface] = 'no' if state.link_detected == 'yes' \
+                    else None
+        return results
+
+    def wireless_statuses(self, interfaces, active_only=False):
+        """
+        'yes' for interfaces that are up with an address, 'no' for other
+        interfaces that exist and None for those that don't. With
+        active_only, interfaces that don't exist are left out.
+        """
+        results = {}
+        for iface in interfaces:
+            state = self[iface]
+            if state.is_up == 'yes' and state.ipv4_address:
+                results[iface] = 'yes'
+            elif not active_only or state.is_up is not None:
+                results[iface] = 'no' if state.is_up else None
+        return results
+
+
+class StatusBackend(object):
+    """
+    Base class for interface status backends. Subclasses answer
+    bring_up(), link_detected(), is_up() and ipv4_address() for one
+    interface; snapshot() asks each of those in turn, and backends that
+    can see every interface at once should override it.
+    """
+
+    def bring_up(self, iface):
+        raise NotImplementedError
+
+    def link_detected(self, iface):
+        raise NotImplementedError
+
+    def is_up(self, iface):
+        raise NotImplementedError
+
+    def ipv4_address(self, iface):
+        raise NotImplementedError
+
+    def snapshot(self, interfaces):
+        return Snapshot((iface, InterfaceState(self.link_detected(iface),
+                                               self.is_up(iface),
+                                               self.ipv4_address(iface)))
+                        for iface in interfaces)
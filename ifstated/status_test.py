@@ -0,0 +1,58 @@
+import unittest
+
+from mock import Mock
+
+from status import ABSENT, InterfaceState, Snapshot, StatusBackend
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = Snapshot({
+            'eth0': InterfaceState('yes', 'yes', '10.0.0.2'),
+            'eth1': InterfaceState('yes', 'yes', None),
+            'eth2': InterfaceState('no', 'no', None),
+            'wlan0': InterfaceState('no', 'yes', '10.0.1.2'),
+            'wlan1': InterfaceState('no', 'no', None)})
+
+    def test_wired_statuses(self):
+        interfaces = ('eth0', 'eth1', 'eth2', 'eth3')
+        self.assertEquals({'eth0': 'yes', 'eth1': 'no', 'eth2': None,
+                           'eth3': None},
+                          self.snapshot.wired_statuses(interfaces))
+        self.assertEquals({'eth0': 'yes', 'eth1': 'no', 'eth2': None},
+                          self.snapshot.wired_statuses(interfaces,
+                                                       active_only=True))
+
+    def test_wireless_statuses(self):
+        interfaces = ('wlan0', 'wlan1', 'wlan2')
+        self.assertEquals({'wlan0': 'yes', 'wlan1': 'no', 'wlan2': None},
+                          self.snapshot.wireless_statuses(interfaces))
+        self.assertEquals({'wlan0': 'yes', 'wlan1': 'no'},
+                          self.snapshot.wireless_statuses(interfaces,
+                                                          active_only=True))
+
+    def test_missing(self):
+        self.assertEquals(ABSENT, self.snapshot['eth9'])
+        self.assertEquals(5, len(self.snapshot))
+
+    def test_equality(self):
+        same = Snapshot(dict((iface, self.snapshot[iface])
+                             for iface in self.snapshot))
+        self.assertEquals(same, self.snapshot)
+        self.assertFalse(same != self.snapshot)
+        self.assertNotEquals(Snapshot({'eth0': ABSENT}), self.snapshot)
+
+    def test_backend_snapshot(self):
+        backend = StatusBackend()
+        backend.link_detected = Mock(side_effect=['yes', None])
+        backend.is_up = Mock(side_effect=['yes', None])
+        backend.ipv4_address = Mock(side_effect=['10.0.0.2', None])
+        snapshot = backend.snapshot(('eth0', 'eth1'))
+        self.assertEquals(InterfaceState('yes', 'yes', '10.0.0.2'),
+                          snapshot['eth0'])
+        self.assertEquals(ABSENT, snapshot['eth1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
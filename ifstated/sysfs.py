@@ -0,0 +1,134 @@
+"""
+Interface status from /sys/class/net and socket ioctls, without running
+ifconfig or ethtool.
+"""
+
+import errno
+import fcntl
+import os
+import socket
+import struct
+
+import netlink
+from status import ABSENT, InterfaceState, Snapshot, StatusBackend
+
+SIOCGIFFLAGS = 0x8913
+SIOCSIFFLAGS = 0x8914
+SIOCGIFADDR = 0x8915
+
+IFF_UP = 0x1
+
+_IFREQ_FLAGS = struct.Struct('16sH')
+
+
+class SysfsBackend(StatusBackend):
+    """
+    Status backend that reads link state from sysfs and addresses and
+    flags with ioctls on a datagram socket, so a probe costs a few
+    system calls rather than a fork and exec. Answers use the same
+    'yes'/'no'/None values as the ifconfig/ethtool backend.
+
+    snapshot() reads every link and address with one netlink dump of
+    each rather than probing interfaces one by one.
+    """
+
+    def __init__(self, root='/sys/class/net'):
+        self.root = root
+        self._sock = None
+
+    @staticmethod
+    def available(root='/sys/class/net'):
+        return os.path.isdir(root)
+
+    @property
+    def sock(self):
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        return self._sock
+
+    def _read(self, iface, name):
+        """
+        Returns the contents of a sysfs attribute of iface, or None if
+        the interface doesn't exist. Raises IOError if the attribute
+        can't be read for another reason.
+        """
+        try:
+            with open(os.path.join(self.root, iface, name)) as f:
+                return f.read().strip()
+        except IOError, e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+
+    def _ioctl(self, request, ifreq):
+        return fcntl.ioctl(self.sock.fileno(), request, ifreq)
+
+    def bring_up(self, iface):
+        """
+        Set IFF_UP on iface if it isn't already, like ifconfig <iface> up.
+        """
+        try:
+            name, flags = _IFREQ_FLAGS.unpack_from(
+                self._ioctl(SIOCGIFFLAGS, _IFREQ_FLAGS.pack(iface, 0)))
+            if not flags & IFF_UP:
+                self._ioctl(SIOCSIFFLAGS,
+                            _IFREQ_FLAGS.pack(iface, flags | IFF_UP))
+        except IOError:
+            pass  # missing interface, or not allowed; ifconfig ignores too
+
+    def link_detected(self, iface):
+        """
+        'yes' if iface has carrier, 'no' if not (or it's down), None if
+        there's no such interface.
+        """
+        try:
+            carrier = self._read(iface, 'carrier')
+        except IOError:
+            return 'no'  # carrier can't be read while the interface is down
+        if carrier is None:
+            return None
+        return 'yes' if carrier == '1' else 'no'
+
+    def is_up(self, iface):
+        """
+        'yes' if iface is administratively up, 'no' if not, None if there's
+        no such interface.
+        """
+        flags = self._read(iface, 'flags')
+        if flags is None:
+            return None
+        return 'yes' if int(flags, 16) & IFF_UP else 'no'
+
+    def ipv4_address(self, iface):
+        """
+        The first IPv4 address of iface as a dotted quad, or None.
+        """
+        try:
+            ifreq = self._ioctl(SIOCGIFADDR, struct.pack('256s', iface))
+        except IOError:
+            return None  # no such interface, or no address
+        return socket.inet_ntoa(ifreq[20:24])
+
+    def snapshot(self, interfaces):
+        try:
+            events = netlink.dump()
+        except socket.error:
+            return StatusBackend.snapshot(self, interfaces)
+        links = {}
+        addresses = {}
+        for event in events:
+            if event.kind == 'link':
+                links[event.name] = event
+            elif event.address is not None:
+                addresses.setdefault(event.index, event.address)
+        states = {}
+        for iface in interfaces:
+            link = links.get(iface)
+            if link is None:
+                states[iface] = ABSENT
+            else:
+                states[iface] = InterfaceState(
+                    'yes' if link.carrier else 'no',
+                    'yes' if link.flags & IFF_UP else 'no',
+                    addresses.get(link.index))
+        return Snapshot(states)
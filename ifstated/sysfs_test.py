@@ -0,0 +1,106 @@
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+
+from mock import Mock
+
+import netlink
+import sysfs
+from status import ABSENT, InterfaceState
+
+
+class TestSysfsBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.backend = sysfs.SysfsBackend(self.root)
+        self.backend._sock = Mock()
+        self.fcntl = sysfs.fcntl = Mock()
+        sysfs.netlink = netlink
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def interface(self, name, **attrs):
+        os.mkdir(os.path.join(self.root, name))
+        for attr, value in attrs.items():
+            with open(os.path.join(self.root, name, attr), 'w') as f:
+                f.write(value + '\n')
+
+    def test_link_detected(self):
+        self.interface('eth0', carrier='1')
+        self.interface('eth1', carrier='0')
+        # carrier exists but can't be read while the interface is down
+        os.mkdir(os.path.join(self.root, 'eth2'))
+        os.mkdir(os.path.join(self.root, 'eth2', 'carrier'))
+        self.assertEquals('yes', self.backend.link_detected('eth0'))
+        self.assertEquals('no', self.backend.link_detected('eth1'))
+        self.assertEquals('no', self.backend.link_detected('eth2'))
+        self.assertEquals(None, self.backend.link_detected('eth3'))
+
+    def test_is_up(self):
+        self.interface('wlan0', flags='0x1003')
+        self.interface('wlan1', flags='0x1002')
+        self.assertEquals('yes', self.backend.is_up('wlan0'))
+        self.assertEquals('no', self.backend.is_up('wlan1'))
+        self.assertEquals(None, self.backend.is_up('wlan2'))
+
+    def test_ipv4_address(self):
+        ifreq = struct.pack('16sH2s4s', 'eth0', socket.AF_INET, '',
+                            socket.inet_aton('192.168.1.20'))
+        self.fcntl.ioctl.return_value = ifreq + '\0' * (256 - len(ifreq))
+        self.assertEquals('192.168.1.20', self.backend.ipv4_address('eth0'))
+        self.assertEquals(sysfs.SIOCGIFADDR,
+                          self.fcntl.ioctl.call_args[0][1])
+
+        self.fcntl.ioctl.side_effect = IOError(99, 'no address')
+        self.assertEquals(None, self.backend.ipv4_address('eth0'))
+
+    def test_bring_up(self):
+        self.fcntl.ioctl.return_value = struct.pack('16sH', 'eth0', 0x1002)
+        self.backend.bring_up('eth0')
+        self.assertEquals(2, self.fcntl.ioctl.call_count)
+        request, ifreq = self.fcntl.ioctl.call_args[0][1:]
+        self.assertEquals(sysfs.SIOCSIFFLAGS, request)
+        self.assertEquals(0x1003, struct.unpack('16sH', ifreq)[1])
+
+    def test_bring_up_already_up(self):
+        self.fcntl.ioctl.return_value = struct.pack('16sH', 'eth0', 0x1003)
+        self.backend.bring_up('eth0')
+        self.assertEquals(1, self.fcntl.ioctl.call_count)
+
+    def test_bring_up_missing(self):
+        self.fcntl.ioctl.side_effect = IOError(19, 'No such device')
+        self.backend.bring_up('eth9')
+
+    def test_snapshot(self):
+        dump = Mock()
+        sysfs.netlink = Mock(dump=dump)
+        dump.return_value = [
+            netlink.LinkEvent('link', False, 2, 'eth0', 0x11003),
+            netlink.LinkEvent('link', False, 3, 'eth1', 0x1003),
+            netlink.LinkEvent('link', False, 4, 'wlan0', 0x1002),
+            netlink.LinkEvent('addr', False, 2, 'eth0', address='10.0.0.2'),
+            netlink.LinkEvent('addr', False, 2, 'eth0', address='10.0.0.3')]
+        snapshot = self.backend.snapshot(('eth0', 'eth1', 'wlan0', 'eth9'))
+        self.assertEquals(InterfaceState('yes', 'yes', '10.0.0.2'),
+                          snapshot['eth0'])
+        self.assertEquals(InterfaceState('no', 'yes', None), snapshot['eth1'])
+        self.assertEquals(InterfaceState('no', 'no', None), snapshot['wlan0'])
+        self.assertEquals(ABSENT, snapshot['eth9'])
+
+    def test_snapshot_without_netlink(self):
+        dump = Mock()
+        sysfs.netlink = Mock(dump=dump)
+        dump.side_effect = socket.error(97, 'not supported')
+        self.interface('eth0', carrier='1', flags='0x1003')
+        self.fcntl.ioctl.side_effect = IOError(99, 'no address')
+        self.assertEquals(InterfaceState('yes', 'yes', None),
+                          self.backend.snapshot(('eth0', ))['eth0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
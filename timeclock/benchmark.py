@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+"""
+Times clocking in and out against timeclock logs of growing size.
+
+For each size a log of that many entries (alternating IN and OUT, a
+few sessions a day) is written to a temporary directory, and then
+clock_in() and clock_out(force=True) are timed in turn, as are reports
+of the log's last week and year (after building its index). With
+--baseline the old whole-file read of the last entry and a report
+without the index are timed as well, for comparison. With --binary the
+log is converted to a binary log and reports of its whole history are
+timed. Results are JSON:
+
+    ./benchmark.py --entries 1000,100000,1000000,10000000
+
+With --projects, it instead times a combined report (see multireport.py)
+over that many logs of each size, with each number of processes:
+
+    ./benchmark.py --projects 200 --entries 10000 --processes 1,2,4,8
+
+With --stress, it instead runs that many clock ins and outs, each in a
+process of its own and --concurrency of them at once, against one log,
+then checks the log for torn entries and for INs or OUTs twice in a row,
+and the index against one built from scratch. --no-lock shows what
+happens without the log lock:
+
+    ./benchmark.py --stress 5000 --concurrency 100 [--sync] [--no-lock]
+
+With --parse, it instead compares scanning whole logs of each size (by
+default 1K to 10M entries) for a week's report, with the streaming
+engine in report.py and with the loop calculate_daily_totals() used to
+have, each in a fresh process so that their peak memory can be told
+apart:
+
+    ./benchmark.py --parse [--entries 1000,10000000]
+"""
+
+from __future__ import print_function
+import contextlib
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from optparse import OptionParser, SUPPRESS_HELP
+
+import timeclock as tc
+
+# 2013-10-01 00:00 UTC
+FIRST_ENTRY = 1380585600
+
+
+def percentile(ordered, pct):
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+def generate(path, entries, start=FIRST_ENTRY):
+    """
+    Write a log of entries IN/OUT lines to path: four sessions a day of
+    between one and two hours each. Returns the time of the last entry.
+    """
+    now = start
+    with open(path, "w") as f:
+        lines = []
+        for i in xrange(entries):
+            if i % 2 == 0:
+                event = "IN"
+                now += 3600 * 6 if i % 8 else 3600 * 3
+            else:
+                event = "OUT"
+                now += 3600 + (i * 7919) % 3600
+            lines.append("%s %d %s" % (
+                event, now, datetime.utcfromtimestamp(now).isoformat()))
+            if len(lines) == 10000:
+                f.write("\n".join(lines) + "\n")
+                lines = []
+        if lines:
+            f.write("\n".join(lines) + "\n")
+    return now
+
+
+def readlines_last_entry():
+    with open(tc.TIMECLOCK_FILE, "r") as f:
+        return tc.parse_log_entry(f.readlines()[-1])
+
+
+def quiet(*args, **kwargs):
+    pass
+
+
+def timed(func, repeat):
+    times = []
+    for i in range(repeat):
+        started = time.time()
+        func()
+        times.append(time.time() - started)
+    times.sort()
+    return {'p50': percentile(times, 50),
+            'p99': percentile(times, 99),
+            'max': times[-1]}
+
+
+def run(entries, repeat, baseline=False, binary=False):
+    workdir = tempfile.mkdtemp()
+    saved = tc.TIMECLOCK_FILE
+    tc.TIMECLOCK_FILE = os.path.join(workdir, "timeclock")
+    try:
+        last = date.fromtimestamp(generate(tc.TIMECLOCK_FILE, entries))
+        result = {'entries': entries,
+                  'bytes': os.path.getsize(tc.TIMECLOCK_FILE)}
+        started = time.time()
+        tc.build_index()
+        result['index_build'] = time.time() - started
+
+        def report(days=7):
+            tc.calculate_daily_totals(last - timedelta(days=days), last)
+        tc.print = quiet
+        try:
+            result['report_week'] = timed(report, repeat)
+            result['report_year'] = timed(lambda: report(365), repeat)
+            if baseline:
+                daily_totals = tc.daily_totals
+                tc.daily_totals = lambda datestart, dateend: None
+                try:
+                    result['full_scan_report_week'] = timed(
+                        report, max(1, repeat / 10))
+                finally:
+                    tc.daily_totals = daily_totals
+        finally:
+            del tc.print
+
+        if binary:
+            import binlog
+            path = tc.TIMECLOCK_FILE + ".bin"
+            started = time.time()
+            binlog.to_binary(tc.TIMECLOCK_FILE, path)
+            result['binary_convert'] = time.time() - started
+            first = date.fromtimestamp(FIRST_ENTRY)
+            result['binary_report_all'] = timed(
+                lambda: binlog.daily_totals(path, first, last),
+                max(1, repeat / 10))
+            result['binary_numpy'] = binlog.numpy is not None
+
+        def cycle():
+            tc.clock_in()
+            tc.clock_out(force=True)
+        result['clock_in_out'] = timed(cycle, repeat)
+        result['last_log_entry'] = timed(tc.last_log_entry, repeat)
+        if baseline:
+            result['readlines_last_entry'] = timed(readlines_last_entry,
+                                                   max(1, repeat / 10))
+        return result
+    finally:
+        tc.TIMECLOCK_FILE = saved
+        shutil.rmtree(workdir)
+
+
+def run_multi(projects, entries, processes):
+    import multireport
+    workdir = tempfile.mkdtemp()
+    try:
+        sources = []
+        for i in range(projects):
+            path = os.path.join(workdir, "project%d.log" % i)
+            last = date.fromtimestamp(generate(path, entries))
+            sources.append(("project%d" % i, path))
+        first = date.fromtimestamp(FIRST_ENTRY)
+        result = {'projects': projects, 'entries': entries, 'seconds': {}}
+        for count in processes:
+            started = time.time()
+            multireport.combined_report(sources, first, last, count)
+            result['seconds'][count] = time.time() - started
+        return result
+    finally:
+        shutil.rmtree(workdir)
+
+
+@contextlib.contextmanager
+def unlocked_log():
+    fd = os.open(tc.TIMECLOCK_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                 0644)
+    try:
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def stress_child(event, path, sync=False, lock=True):
+    """
+    Clock in or out of the log at path and print how long it took.
+    """
+    tc.TIMECLOCK_FILE = path
+    tc.FSYNC = sync
+    if not lock:
+        tc.log_lock = unlocked_log
+    tc.print = quiet
+    started = time.time()
+    if event == 'in':
+        tc.clock_in()
+    else:
+        tc.clock_out(force=True)
+    print("%f" % (time.time() - started))
+
+
+def check_log(path):
+    """
+    Returns the number of entries in the log at path and a dict counting
+    what's wrong with it.
+    """
+    problems = {'torn': 0, 'double_in': 0, 'double_out': 0}
+    entries = 0
+    last = 'OUT'
+    with open(path) as f:
+        for line in f:
+            entries += 1
+            fields = line.split()
+            if len(fields) != 3 or fields[0] not in ('IN', 'OUT') or \
+                    not fields[1].isdigit() or not line.endswith("\n"):
+                problems['torn'] += 1
+                continue
+            if fields[0] == last:
+                problems['double_' + last.lower()] += 1
+            last = fields[0]
+    return entries, problems
+
+
+def run_stress(operations, concurrency, sync=False, lock=True):
+    workdir = tempfile.mkdtemp()
+    saved = tc.TIMECLOCK_FILE
+    tc.TIMECLOCK_FILE = path = os.path.join(workdir, "timeclock")
+    try:
+        tc.build_index()
+        command = [sys.executable, os.path.abspath(__file__), '--log', path]
+        command += ['--sync'] if sync else []
+        command += ['--no-lock'] if not lock else []
+        latencies = []
+        running = []
+        started = time.time()
+        for i in range(operations):
+            if len(running) >= concurrency:
+                latencies.append(float(running.pop(0).communicate()[0]))
+            event = random.choice(['in', 'out'])
+            running.append(subprocess.Popen(
+                command + ['--stress-child', event], stdout=subprocess.PIPE))
+        for proc in running:
+            latencies.append(float(proc.communicate()[0]))
+        elapsed = time.time() - started
+
+        entries, problems = check_log(path)
+        index_ok = tc.index_is_fresh()
+        if index_ok:
+            with open(tc.index_file()) as f:
+                index = f.read()
+            index_ok = tc.build_index() is not None
+        if index_ok:
+            with open(tc.index_file()) as f:
+                index_ok = index == f.read()
+        latencies.sort()
+        return {'operations': operations, 'concurrency': concurrency,
+                'sync': sync, 'lock': lock, 'elapsed': elapsed,
+                'entries': entries, 'problems': problems,
+                'index_consistent': index_ok,
+                'latency': {'p50': percentile(latencies, 50),
+                            'p99': percentile(latencies, 99),
+                            'max': latencies[-1]}}
+    finally:
+        tc.TIMECLOCK_FILE = saved
+        shutil.rmtree(workdir)
+
+
+def legacy_totals(lines, datestart, dateend, now=None):
+    """
+    Daily totals the way calculate_daily_totals() worked them out
+    before report.py.
+    """
+    now = int(time.time()) if now is None else now
+    totals = []
+    date_total = 0
+    current_date = None
+    last_event = None
+    for ent in lines:
+        entry = tc.parse_log_entry(ent)
+        if entry["event"] == "IN":
+            last_event = "IN"
+            clock_in_time = entry["timestamp"]
+            clock_in_date = entry["timestamp_dt"].date()
+            if clock_in_date != current_date:
+                if current_date and datestart <= current_date <= dateend:
+                    totals.append((current_date.isoformat(), date_total,
+                                   False))
+                date_total = 0
+                current_date = clock_in_date
+        elif entry["event"] == "OUT":
+            last_event = "OUT"
+            if current_date and datestart <= current_date <= dateend:
+                date_total += entry["timestamp"] - clock_in_time
+    if current_date and datestart <= current_date <= dateend:
+        if last_event == "OUT":
+            totals.append((current_date.isoformat(), date_total, False))
+        else:
+            totals.append((current_date.isoformat(),
+                           date_total + now - clock_in_time, True))
+    return totals
+
+
+ENGINES = {'legacy': legacy_totals, 'streaming': tc.scan_totals}
+
+
+def engine_child(engine, path):
+    """
+    Scan the log at path for its last week with engine and print how
+    long it took and how much memory it needed, as JSON.
+    """
+    tc.TIMECLOCK_FILE = path
+    last = tc.last_log_entry()["timestamp_dt"].date()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.time()
+    with open(path, "rb") as f:
+        totals = ENGINES[engine](f, last - timedelta(days=7), last)
+    elapsed = time.time() - started
+    print(json.dumps({
+        'seconds': elapsed,
+        'start_rss_kb': before,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'totals': [list(ent) for ent in totals]}))
+
+
+def run_engines(entries):
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "timeclock")
+        generate(path, entries)
+        result = {'entries': entries, 'bytes': os.path.getsize(path)}
+        totals = {}
+        for engine in sorted(ENGINES):
+            proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--log', path,
+                 '--engine-child', engine], stdout=subprocess.PIPE)
+            child = json.loads(proc.communicate()[0])
+            totals[engine] = child.pop('totals')
+            child['entries_per_second'] = entries / child['seconds']
+            result[engine] = child
+        result['agree'] = totals['legacy'] == totals['streaming']
+        return result
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('-e', '--entries', default=None,
+        help="Comma separated log sizes, in entries (default "
+             "1000,100000,1000000)")
+    parser.add_option('-n', '--repeat', type='int', default=100,
+        help="Times to run each operation (default 100)")
+    parser.add_option('--baseline', action='store_true', default=False,
+        help="Also time reading the whole log for the last entry")
+    parser.add_option('--binary', action='store_true', default=False,
+        help="Also time reports from a binary copy of the log")
+    parser.add_option('--projects', type='int', default=None,
+        help="Time a combined report over this many logs instead")
+    parser.add_option('--processes', default='1,2,4',
+        help="Comma separated process counts for --projects")
+    parser.add_option('--stress', type='int', default=None,
+        help="Run this many concurrent clock ins and outs instead")
+    parser.add_option('--concurrency', type='int', default=50,
+        help="Processes to run at once for --stress (default 50)")
+    parser.add_option('--sync', action='store_true', default=False,
+        help="fsync every entry during --stress")
+    parser.add_option('--no-lock', action='store_false', dest='lock',
+        default=True, help="Don't lock the log during --stress")
+    parser.add_option('--parse', action='store_true', default=False,
+        help="Compare the legacy and streaming report engines instead")
+    parser.add_option('--stress-child', help=SUPPRESS_HELP)
+    parser.add_option('--engine-child', help=SUPPRESS_HELP)
+    parser.add_option('--log', help=SUPPRESS_HELP)
+    options, args = parser.parse_args(argv[1:])
+
+    if options.engine_child:
+        engine_child(options.engine_child, options.log)
+        return 0
+    if options.parse:
+        sizes = options.entries or '1000,10000,100000,1000000,10000000'
+        results = [run_engines(int(n)) for n in sizes.split(',')]
+        print(json.dumps({'results': results}, indent=2, sort_keys=True))
+        return 0 if all(result['agree'] for result in results) else 1
+    if options.entries is None:
+        options.entries = '1000,100000,1000000'
+
+    if options.stress_child:
+        stress_child(options.stress_child, options.log, options.sync,
+                     options.lock)
+        return 0
+    if options.stress:
+        result = run_stress(options.stress, options.concurrency,
+                            options.sync, options.lock)
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0 if result['index_consistent'] and \
+            not any(result['problems'].values()) else 1
+    if options.projects:
+        processes = [int(n) for n in options.processes.split(',')]
+        results = [run_multi(options.projects, int(n), processes)
+                   for n in options.entries.split(',')]
+        print(json.dumps({'results': results}, indent=2, sort_keys=True))
+        return 0
+
+    results = [run(int(n), options.repeat, options.baseline, options.binary)
+               for n in options.entries.split(',')]
+    print(json.dumps({'results': results}, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+"""
+A compact binary form of the timeclock log, for reporting on long
+histories.
+
+A binary log is an 8 byte header followed by fixed width records of an
+event code (1 byte), the entry's epoch time and its timestamp as
+microseconds since 1970-01-01 (8 bytes each, little endian), so that
+converting to and from the text log loses nothing:
+
+    ./binlog.py to-binary ~/.01timeclock ~/.01timeclock.bin
+    ./binlog.py to-text ~/.01timeclock.bin ~/.01timeclock
+
+With NumPy installed, daily_totals() memory-maps the records and works
+out sessions and days with array operations; without it, it reads them
+one at a time.
+"""
+
+from __future__ import print_function
+import calendar
+import datetime
+import struct
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = "01tcbin\x01"
+RECORD = struct.Struct("<Bqq")
+EVENTS = {"IN": 1, "OUT": 2}
+EVENT_NAMES = dict((code, name) for name, code in EVENTS.items())
+if numpy is not None:
+    DTYPE = numpy.dtype([("event", "u1"), ("epoch", "<i8"),
+                         ("stamp", "<i8")])
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_DATE = EPOCH.date()
+WEEK = 7 * 24 * 60 * 60
+
+
+def encode_stamp(stamp):
+    """
+    Returns the timestamp of a text log entry as microseconds since
+    1970-01-01, raising ValueError if it can't be reproduced from that.
+    """
+    fmt = "%Y-%m-%dT%H:%M:%S.%f" if "." in stamp else "%Y-%m-%dT%H:%M:%S"
+    delta = datetime.datetime.strptime(stamp, fmt) - EPOCH
+    micros = ((delta.days * 86400 + delta.seconds) * 1000000 +
+              delta.microseconds)
+    if decode_stamp(micros) != stamp:
+        raise ValueError("timestamp %r can't be stored exactly" % stamp)
+    return micros
+
+
+def decode_stamp(micros):
+    return (EPOCH + datetime.timedelta(microseconds=micros)).isoformat()
+
+
+def encode(line):
+    """
+    Returns the binary record for a line of the text log.
+    """
+    event, epoch_time, stamp = line.split()
+    if event not in EVENTS:
+        raise ValueError("unknown event in %r" % line)
+    return RECORD.pack(EVENTS[event], int(epoch_time), encode_stamp(stamp))
+
+
+def to_binary(text_path, binary_path):
+    """
+    Converts the text log at text_path to a binary log at binary_path.
+    Blank lines are skipped. Returns the number of records written.
+    """
+    count = 0
+    with open(text_path, "rb") as src:
+        with open(binary_path, "wb") as dst:
+            dst.write(MAGIC)
+            for line in src:
+                if line.strip():
+                    dst.write(encode(line))
+                    count += 1
+    return count
+
+
+def records(binary_path):
+    """
+    Yields the (event, epoch, micros) records of a binary log.
+    """
+    with open(binary_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s isn't a binary timeclock log" % binary_path)
+        while True:
+            data = f.read(RECORD.size * 4096)
+            if not data:
+                break
+            for i in range(0, len(data) - RECORD.size + 1, RECORD.size):
+                yield RECORD.unpack_from(data, i)
+
+
+def to_text(binary_path, text_path):
+    """
+    Converts the binary log at binary_path to a text log at text_path.
+    Returns the number of entries written.
+    """
+    count = 0
+    with open(text_path, "wb") as dst:
+        for event, epoch_time, micros in records(binary_path):
+            dst.write("%s %d %s\n" % (EVENT_NAMES[event], epoch_time,
+                                      decode_stamp(micros)))
+            count += 1
+    return count
+
+
+def load(binary_path):
+    """
+    Memory-maps a binary log as a NumPy record array.
+    """
+    with open(binary_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s isn't a binary timeclock log" % binary_path)
+        if not f.read(1):
+            # there's nothing to map
+            return numpy.zeros(0, dtype=DTYPE)
+    return numpy.memmap(binary_path, dtype=DTYPE, mode="r",
+                        offset=len(MAGIC))
+
+
+def _utc_offset(epoch_time):
+    return calendar.timegm(time.localtime(epoch_time)) - epoch_time
+
+
+def local_days(epochs):
+    """
+    Returns the local date of each of an array of epoch times, as days
+    since 1970-01-01. The local time zone's offset is sampled weekly
+    across the times and each change in it narrowed down to the second,
+    so this assumes it doesn't change more than once a week.
+    """
+    if not len(epochs):
+        return numpy.zeros(0, dtype=numpy.int64)
+    first, last = int(epochs.min()), int(epochs.max())
+    changes = []
+    offsets = [_utc_offset(first)]
+    probe = first
+    while probe < last:
+        following = min(probe + WEEK, last)
+        offset = _utc_offset(following)
+        if offset != offsets[-1]:
+            # the offset changed somewhere in (probe, following]
+            low, high = probe, following
+            while high - low > 1:
+                middle = (low + high) // 2
+                if _utc_offset(middle) == offsets[-1]:
+                    low = middle
+                else:
+                    high = middle
+            changes.append(high)
+            offsets.append(offset)
+        probe = following
+    positions = numpy.searchsorted(numpy.array(changes, dtype=numpy.int64),
+                                   epochs, side="right")
+    local = epochs + numpy.array(offsets, dtype=numpy.int64)[positions]
+    return local // (24 * 60 * 60)
+
+
+def _daily_totals_numpy(log, datestart, dateend, now):
+    events = numpy.asarray(log["event"])
+    epochs = numpy.asarray(log["epoch"])
+    clock_ins = events == EVENTS["IN"]
+    in_epochs = epochs[clock_ins]
+    in_days = local_days(in_epochs)
+    # for every entry, which IN (if any) is the latest at or before it
+    latest_in = numpy.cumsum(clock_ins) - 1
+    outs = (events == EVENTS["OUT"]) & (latest_in >= 0)
+    out_ins = latest_in[outs]
+    out_days = in_days[out_ins]
+    durations = epochs[outs] - in_epochs[out_ins]
+
+    first = (datestart - EPOCH_DATE).days
+    last = (dateend - EPOCH_DATE).days
+    days = numpy.unique(in_days[(in_days >= first) & (in_days <= last)])
+    chosen = (out_days >= first) & (out_days <= last)
+    seconds = numpy.bincount(numpy.searchsorted(days, out_days[chosen]),
+                             weights=durations[chosen], minlength=len(days))
+    names = days.astype("datetime64[D]").astype(str).tolist()
+    totals = [[name, total, False] for name, total in
+              zip(names, seconds.astype(numpy.int64).tolist())]
+    if len(events) and events[-1] == EVENTS["IN"] and \
+            first <= in_days[-1] <= last:
+        ent = totals[numpy.searchsorted(days, in_days[-1])]
+        ent[1] += now - int(in_epochs[-1])
+        ent[2] = True
+    return totals
+
+
+def _daily_totals_python(binary_path, datestart, dateend, now):
+    seconds = {}
+    clock_in_time = clock_in_date = None
+    event = None
+    for event, epoch_time, micros in records(binary_path):
+        if event == EVENTS["IN"]:
+            clock_in_time = epoch_time
+            clock_in_date = datetime.date.fromtimestamp(epoch_time)
+            if datestart <= clock_in_date <= dateend:
+                seconds.setdefault(clock_in_date, 0)
+        elif clock_in_time is not None and clock_in_date in seconds:
+            seconds[clock_in_date] += epoch_time - clock_in_time
+    totals = [[day.isoformat(), seconds[day], False]
+              for day in sorted(seconds)]
+    if event == EVENTS["IN"] and clock_in_date in seconds:
+        ent = totals[sorted(seconds).index(clock_in_date)]
+        ent[1] += now - clock_in_time
+        ent[2] = True
+    return totals
+
+
+def daily_totals(binary_path, datestart, dateend, now=None):
+    """
+    Returns a (date, seconds, clocked_in) tuple, in date order, for each
+    day worked from datestart to dateend in the binary log at
+    binary_path, as timeclock.daily_totals() does for the text log.
+    Sessions count towards the day they were clocked in, even if they
+    end after midnight.
+    """
+    now = int(time.time()) if now is None else now
+    if numpy is not None:
+        totals = _daily_totals_numpy(load(binary_path), datestart, dateend,
+                                     now)
+    else:
+        totals = _daily_totals_python(binary_path, datestart, dateend, now)
+    return [tuple(ent) for ent in totals]
+
+
+def main(argv):
+    commands = {"to-binary": to_binary, "to-text": to_text}
+    if len(argv) != 4 or argv[1] not in commands:
+        print("usage: %s to-binary|to-text SOURCE DEST" % argv[0],
+              file=sys.stderr)
+        return 2
+    count = commands[argv[1]](argv[2], argv[3])
+    print("%d entries converted" % count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date, datetime
+from mock import patch
+import binlog
+import timeclock as tc
+from timeclock_unittests import _entry
+
+
+class binlogTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = tc.TIMECLOCK_FILE
+        tc.TIMECLOCK_FILE = os.path.join(self.dir, "timeclock")
+        self.binary = os.path.join(self.dir, "timeclock.bin")
+        self.tz = os.environ.get("TZ")
+
+    def tearDown(self):
+        tc.TIMECLOCK_FILE = self.saved
+        shutil.rmtree(self.dir)
+        if self.tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = self.tz
+        time.tzset()
+
+    def _log(self, *entries):
+        with open(tc.TIMECLOCK_FILE, "w") as f:
+            f.writelines(ent + "\n" for ent in entries)
+        binlog.to_binary(tc.TIMECLOCK_FILE, self.binary)
+
+    def _compare(self, start, end, now=None):
+        """
+        Checks both report engines against the text log's.
+        """
+        with patch.object(tc.time, "time", return_value=now or 0):
+            expected = tc.daily_totals(start, end)
+        self.assertEquals(expected,
+                          binlog.daily_totals(self.binary, start, end, now))
+        with patch.object(binlog, "numpy", None):
+            self.assertEquals(expected, binlog.daily_totals(
+                self.binary, start, end, now))
+        return expected
+
+    def test_round_trip(self):
+        entries = [_entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+                   "OUT 1380593713 2013-10-01T02:15:13.004211",
+                   _entry("IN", datetime(1969, 12, 31, 23, 0, 0))]
+        self._log(*entries)
+        self.assertEquals(3, binlog.to_text(self.binary,
+                                            tc.TIMECLOCK_FILE + ".txt"))
+        with open(tc.TIMECLOCK_FILE + ".txt") as f:
+            self.assertEquals([ent + "\n" for ent in entries], f.readlines())
+        self.assertEquals(8 + 3 * 17, os.path.getsize(self.binary))
+
+    def test_not_exact(self):
+        self.assertRaises(ValueError, binlog.encode,
+                          "IN 1380589200 2013-10-01T01:00:00.000000")
+        self.assertRaises(ValueError, binlog.encode,
+                          "BREAK 1380589200 2013-10-01T01:00:00")
+
+    def test_daily_totals(self):
+        self._log(_entry("IN", datetime(2013, 9, 30, 9, 0, 0)),
+                  _entry("OUT", datetime(2013, 9, 30, 17, 0, 0)),
+                  _entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+                  _entry("OUT", datetime(2013, 10, 1, 2, 14, 0)),
+                  _entry("IN", datetime(2013, 10, 1, 3, 10, 0)),
+                  _entry("OUT", datetime(2013, 10, 1, 3, 24, 0)),
+                  # clocked in, not out, and in again the next day
+                  _entry("IN", datetime(2013, 10, 2, 1, 2, 0)),
+                  _entry("IN", datetime(2013, 10, 3, 5, 9, 0)),
+                  # across midnight
+                  _entry("OUT", datetime(2013, 10, 4, 1, 9, 0)))
+        self.assertEquals([("2013-10-01", 5280, False),
+                           ("2013-10-02", 0, False),
+                           ("2013-10-03", 72000, False)],
+                          self._compare(date(2013, 10, 1), date(2013, 10, 7)))
+        self.assertEquals([], self._compare(date(2013, 9, 1),
+                                            date(2013, 9, 29)))
+
+    def test_open_session(self):
+        self._log(_entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+                  _entry("OUT", datetime(2013, 10, 1, 2, 0, 0)),
+                  _entry("IN", datetime(2013, 10, 1, 23, 0, 0)))
+        now = int(datetime(2013, 10, 2, 1, 30, 0).strftime("%s"))
+        self.assertEquals([("2013-10-01", 12600, True)],
+                          self._compare(date(2013, 10, 1), date(2013, 10, 2),
+                                        now))
+
+    def test_empty(self):
+        self._log()
+        self.assertEquals([], binlog.daily_totals(
+            self.binary, date(2013, 10, 1), date(2013, 10, 7)))
+
+    def test_local_days_across_dst(self):
+        os.environ["TZ"] = "America/New_York"
+        time.tzset()
+        # daylight saving time ended at 2am on 2013-11-03
+        entries = []
+        for day in range(1, 30):
+            for hour in (0, 1, 23):
+                entries.append(_entry("IN", datetime(2013, 10, day, hour, 30)))
+                entries.append(_entry("OUT", datetime(2013, 10, day, hour, 45)))
+        entries.append(_entry("IN", datetime(2013, 11, 3, 0, 30)))
+        entries.append(_entry("OUT", datetime(2013, 11, 3, 3, 0)))
+        self._log(*entries)
+        self.assertEquals(("2013-11-03", 3.5 * 3600, False),
+                          self._compare(date(2013, 10, 1),
+                                        date(2013, 11, 30))[-1])
+        epochs = binlog.numpy.array([int(e.split()[1]) for e in entries])
+        self.assertEquals(
+            [(date.fromtimestamp(t) - date(1970, 1, 1)).days for t in epochs],
+            list(binlog.local_days(epochs)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+A combined report over many timeclock logs, one per project login.
+
+Each source is a timeclock log or a home directory holding one, and
+may be prefixed with the project it belongs to; otherwise the project
+is named after the directory the log is in. The logs are read in
+parallel by a pool of processes, each streaming a log at a time, and
+their daily totals merged by project:
+
+    ./multireport.py -r 20131001 20131031 /home/acme /home/initech \\
+        widgets=/srv/logs/widgets.log
+"""
+
+from __future__ import print_function
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import time
+from optparse import OptionParser
+
+import timeclock as tc
+
+LOG_NAME = ".01timeclock"
+
+
+def parse_source(source):
+    """
+    Returns (project, log path) for a "[project=]path" source.
+    """
+    project, sep, path = source.rpartition("=")
+    if os.path.isdir(path):
+        path = os.path.join(path, LOG_NAME)
+    if not project:
+        directory, name = os.path.split(os.path.abspath(path))
+        project = os.path.basename(directory) if name == LOG_NAME else name
+    return project, path
+
+
+def log_totals(task):
+    """
+    Returns (project, path, totals, error) for a (project, path,
+    datestart, dateend, now) task, where totals are the log's daily
+    totals from scan_totals(), or None if it couldn't be read.
+    """
+    project, path, datestart, dateend, now = task
+    try:
+        with open(path, "r") as f:
+            return project, path, tc.scan_totals(f, datestart, dateend,
+                                                 now), None
+    except (IOError, ValueError), e:
+        return project, path, None, str(e)
+
+
+def combined_report(sources, datestart, dateend, processes=None, now=None):
+    """
+    Returns a dict of the daily totals of every log in sources, a list
+    of (project, path), from datestart to dateend:
+
+        {"projects": {project: {"days": [[date, seconds, clocked_in]],
+                                "total": seconds}},
+         "days": [[date, seconds]],
+         "total": seconds,
+         "errors": {path: message}}
+
+    The logs are read by a pool of processes (as many as there are CPUs
+    by default). A project with several logs gets their totals summed.
+    """
+    now = int(time.time()) if now is None else now
+    tasks = [(project, path, datestart, dateend, now)
+             for project, path in sources]
+    projects = {}
+    days = {}
+    errors = {}
+    pool = multiprocessing.Pool(processes)
+    try:
+        for project, path, totals, error in pool.imap_unordered(log_totals,
+                                                                tasks):
+            if totals is None:
+                errors[path] = error
+                continue
+            project_days = projects.setdefault(project, {})
+            for day, seconds, clocked_in in totals:
+                worked, was_clocked_in = project_days.get(day, (0, False))
+                project_days[day] = (worked + seconds,
+                                     was_clocked_in or clocked_in)
+                days[day] = days.get(day, 0) + seconds
+    finally:
+        pool.close()
+        pool.join()
+    report = {"projects": {}, "errors": errors,
+              "days": [[day, days[day]] for day in sorted(days)],
+              "total": sum(days.values())}
+    for project, project_days in projects.items():
+        report["projects"][project] = {
+            "days": [[day] + list(project_days[day])
+                     for day in sorted(project_days)],
+            "total": sum(seconds for seconds, clocked_in
+                         in project_days.values())}
+    return report
+
+
+def print_report(report, datestart, dateend):
+    hours = lambda seconds: seconds / (60.0 * 60)
+    for project in sorted(report["projects"]):
+        totals = report["projects"][project]
+        print(project)
+        for day, seconds, clocked_in in totals["days"]:
+            print("    %s - %.1f hours%s" % (day, hours(seconds),
+                  " (still clocked in)" if clocked_in else ""))
+        print("    %.1f hours total\n" % hours(totals["total"]))
+    for path in sorted(report["errors"]):
+        print("ERROR: %s: %s" % (path, report["errors"][path]))
+    print("%.1f hours total for %d projects between %s and %s" % (
+        hours(report["total"]), len(report["projects"]),
+        datestart.isoformat(), dateend.isoformat()))
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options] [project=]log|home ...")
+    parser.add_option('-r', '--report', action='store', nargs=2,
+        help="Report on hours between YYYYMMDD and YYYYMMDD (default "
+             "the last week)", dest="report", default=None)
+    parser.add_option('-p', '--processes', type='int', default=None,
+        help="Logs to read at once (default one per CPU)")
+    parser.add_option('--json', action='store_true', default=False,
+        help="Print the report as JSON")
+    options, args = parser.parse_args(argv[1:])
+    if not args:
+        parser.print_help()
+        return 2
+
+    if options.report:
+        fmt = "%Y%m%d"
+        try:
+            datestart, dateend = [
+                datetime.datetime.strptime(arg, fmt).date()
+                for arg in options.report]
+        except ValueError:
+            print("ERROR: Date ranges must be in YYYYMMDD format.")
+            return 2
+    else:
+        dateend = datetime.date.today()
+        datestart = dateend - datetime.timedelta(days=7)
+
+    report = combined_report([parse_source(arg) for arg in args],
+                             datestart, dateend, options.processes)
+    if options.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print_report(report, datestart, dateend)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime
+import multireport as mr
+from timeclock_unittests import _entry
+
+
+class multiReportTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _home(self, login, *entries):
+        home = os.path.join(self.dir, login)
+        os.mkdir(home)
+        with open(os.path.join(home, mr.LOG_NAME), "w") as f:
+            f.writelines(ent + "\n" for ent in entries)
+        return home
+
+    def test_parse_source(self):
+        home = self._home("acme")
+        log = os.path.join(home, mr.LOG_NAME)
+        self.assertEquals(("acme", log), mr.parse_source(home))
+        self.assertEquals(("acme", log), mr.parse_source(log))
+        self.assertEquals(("widgets", log),
+                          mr.parse_source("widgets=" + home))
+        self.assertEquals(("billing.log", "/srv/billing.log"),
+                          mr.parse_source("/srv/billing.log"))
+
+    def test_combined_report(self):
+        acme = self._home("acme",
+            _entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+            _entry("OUT", datetime(2013, 10, 1, 2, 30, 0)),
+            _entry("IN", datetime(2013, 10, 2, 1, 0, 0)),
+            _entry("OUT", datetime(2013, 10, 2, 2, 0, 0)))
+        initech = self._home("initech",
+            _entry("IN", datetime(2013, 10, 1, 9, 0, 0)),
+            _entry("OUT", datetime(2013, 10, 1, 10, 0, 0)),
+            _entry("IN", datetime(2013, 10, 9, 9, 0, 0)),
+            _entry("OUT", datetime(2013, 10, 9, 10, 0, 0)))
+        more_acme = self._home("acme2",
+            _entry("IN", datetime(2013, 10, 2, 9, 0, 0)))
+        now = int(datetime(2013, 10, 2, 10, 0, 0).strftime("%s"))
+        report = mr.combined_report(
+            [mr.parse_source(acme), mr.parse_source(initech),
+             mr.parse_source("acme=" + more_acme),
+             ("missing", os.path.join(self.dir, "missing"))],
+            date(2013, 10, 1), date(2013, 10, 7), processes=2, now=now)
+        self.assertEquals({
+            "acme": {"days": [["2013-10-01", 5400, False],
+                              ["2013-10-02", 7200, True]],
+                      "total": 12600},
+            "initech": {"days": [["2013-10-01", 3600, False]],
+                        "total": 3600}}, report["projects"])
+        self.assertEquals([["2013-10-01", 9000], ["2013-10-02", 7200]],
+                          report["days"])
+        self.assertEquals(16200, report["total"])
+        self.assertEquals([os.path.join(self.dir, "missing")],
+                          report["errors"].keys())
+
+    def test_parse_error(self):
+        home = self._home("acme", "BREAK 1380589200 2013-10-01T01:00:00")
+        report = mr.combined_report([mr.parse_source(home)],
+                                    date(2013, 10, 1), date(2013, 10, 7),
+                                    processes=1)
+        self.assertEquals({}, report["projects"])
+        self.assertEquals(1, len(report["errors"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+A streaming report engine for timeclock logs.
+
+A report is a pipeline of generators, each step pulling from the one
+before it, so that a log of any size is read once in constant memory:
+
+    read_lines(path) -> parse_entries() -> pair_sessions() -> bucket_days()
+
+Entries and sessions are small slotted objects rather than dicts, and
+an entry only works out its date if something asks for it. Results
+are DayTotal tuples, which report() gathers up for JSON or CSV:
+
+    ./report.py -r 20131001 20131031 --format csv ~/.01timeclock
+"""
+
+from __future__ import print_function
+import collections
+import csv
+import datetime
+import json
+import sys
+import time
+from optparse import OptionParser
+
+DayTotal = collections.namedtuple("DayTotal", "day seconds clocked_in")
+
+
+class Entry(object):
+    """
+    A timeclock log entry: event is "IN" or "OUT", timestamp the epoch
+    time and stamp the ISO timestamp as written.
+    """
+    __slots__ = ("event", "timestamp", "stamp", "_date")
+
+    def __init__(self, event, timestamp, stamp):
+        self.event = event
+        self.timestamp = timestamp
+        self.stamp = stamp
+        self._date = None
+
+    @property
+    def date(self):
+        """
+        The local date of the entry, worked out the first time it's used.
+        """
+        if self._date is None:
+            self._date = datetime.date.fromtimestamp(self.timestamp)
+        return self._date
+
+    def __repr__(self):
+        return "Entry(%r, %r, %r)" % (self.event, self.timestamp, self.stamp)
+
+
+class Session(object):
+    """
+    Time between an IN entry, start, and the OUT entry that followed it,
+    end. end is None for a session that's still open, if open is set,
+    and otherwise for one abandoned by clocking in again without
+    clocking out, which counts for nothing.
+    """
+    __slots__ = ("start", "end", "open")
+
+    def __init__(self, start, end=None, open=False):
+        self.start = start
+        self.end = end
+        self.open = open
+
+    def seconds(self, now=None):
+        if self.end is not None:
+            return self.end.timestamp - self.start.timestamp
+        if self.open:
+            now = int(time.time()) if now is None else now
+            return now - self.start.timestamp
+        return 0
+
+
+def read_lines(path):
+    """
+    Yields the lines of the log at path, reading it a block at a time.
+    """
+    with open(path, "rb") as f:
+        for line in f:
+            yield line
+
+
+def parse_entries(lines):
+    """
+    Yields an Entry for each line, skipping blank ones. Raises
+    ValueError for one that isn't an IN or OUT entry.
+    """
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if len(fields) != 3 or fields[0] not in ("IN", "OUT"):
+            raise ValueError("bad timeclock entry %r" % line)
+        yield Entry(fields[0], int(fields[1]), fields[2])
+
+
+def pair_sessions(entries):
+    """
+    Yields a Session for each OUT entry, starting at the latest IN entry
+    before it, as calculate_daily_totals() always has; an IN that's
+    clocked in again over gets an abandoned one, and one left at the end
+    an open one. OUT entries with no IN before them are ignored.
+    """
+    start = None
+    paired = False
+    for entry in entries:
+        if entry.event == "IN":
+            if start is not None and not paired:
+                yield Session(start)
+            start = entry
+            paired = False
+        elif start is not None:
+            yield Session(start, entry)
+            paired = True
+    if start is not None and not paired:
+        yield Session(start, open=True)
+
+
+def _midnight(date):
+    try:
+        return time.mktime(date.timetuple())
+    except (OverflowError, ValueError):
+        return float("-inf") if date.year < 1970 else float("inf")
+
+
+def bucket_days(sessions, datestart, dateend, now=None):
+    """
+    Yields a DayTotal for each run of sessions clocked in on the same day
+    from datestart to dateend, with the day as an ISO date. A day's
+    clocked_in is True if its last session is still open. Only sessions
+    in the range have their dates worked out.
+    """
+    now = int(time.time()) if now is None else now
+    # the range as epoch times, so that only sessions in it need dates
+    low = _midnight(datestart)
+    high = _midnight(dateend + datetime.timedelta(days=1))
+    day = None
+    seconds = 0
+    clocked_in = False
+    for session in sessions:
+        if low <= session.start.timestamp < high:
+            date = session.start.date
+        else:
+            date = None
+        if date != day:
+            if day is not None:
+                yield DayTotal(day.isoformat(), seconds, clocked_in)
+            day = date
+            seconds = 0
+        if date is not None:
+            seconds += session.seconds(now)
+        clocked_in = session.open
+    if day is not None:
+        yield DayTotal(day.isoformat(), seconds, clocked_in)
+
+
+def daily_totals(lines, datestart, dateend, now=None):
+    """
+    The whole pipeline: yields the DayTotals from datestart to dateend
+    of the log entries in lines.
+    """
+    return bucket_days(pair_sessions(parse_entries(lines)), datestart,
+                       dateend, now)
+
+
+def report(path, datestart, dateend, now=None):
+    """
+    Returns a dict of the daily totals in the log at path from datestart
+    to dateend:
+
+        {"start": date, "end": date, "total": seconds,
+         "days": [{"day": date, "seconds": seconds, "clocked_in": bool}]}
+    """
+    days = [ent._asdict() for ent in
+            daily_totals(read_lines(path), datestart, dateend, now)]
+    return {"start": datestart.isoformat(), "end": dateend.isoformat(),
+            "total": sum(ent["seconds"] for ent in days), "days": days}
+
+
+def write_csv(result, f):
+    writer = csv.writer(f)
+    writer.writerow(["day", "seconds", "hours", "clocked_in"])
+    for ent in result["days"]:
+        writer.writerow([ent["day"], ent["seconds"],
+                         "%.2f" % (ent["seconds"] / (60.0 * 60)),
+                         int(ent["clocked_in"])])
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options] [log]")
+    parser.add_option('-r', '--report', action='store', nargs=2,
+        help="Report on hours between YYYYMMDD and YYYYMMDD (default "
+             "the last week)", dest="report", default=None)
+    parser.add_option('-f', '--format', choices=['json', 'csv'],
+        default='json', help="Output format, json or csv (default json)")
+    options, args = parser.parse_args(argv[1:])
+    if args:
+        path = args[0]
+    else:
+        import timeclock
+        path = timeclock.TIMECLOCK_FILE
+
+    if options.report:
+        fmt = "%Y%m%d"
+        try:
+            datestart, dateend = [
+                datetime.datetime.strptime(arg, fmt).date()
+                for arg in options.report]
+        except ValueError:
+            print("ERROR: Date ranges must be in YYYYMMDD format.")
+            return 2
+    else:
+        dateend = datetime.date.today()
+        datestart = dateend - datetime.timedelta(days=7)
+
+    try:
+        result = report(path, datestart, dateend)
+    except (IOError, ValueError), e:
+        print("ERROR: %s" % e, file=sys.stderr)
+        return 1
+    if options.format == 'csv':
+        write_csv(result, sys.stdout)
+    else:
+        print(json.dumps(result, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
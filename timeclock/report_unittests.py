@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from datetime import date, datetime
+import report
+from timeclock_unittests import _entry
+
+
+def _epoch(*args):
+    return int(datetime(*args).strftime("%s"))
+
+class reportTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "timeclock")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _log(self, *entries):
+        with open(self.path, "w") as f:
+            f.writelines(ent + "\n" for ent in entries)
+
+    def test_parse_entries(self):
+        entries = list(report.parse_entries([
+            "IN 1380589200 2013-10-01T01:00:00\n", "\n",
+            "OUT 1380592800 2013-10-01T02:00:00"]))
+        self.assertEquals(["IN", "OUT"], [e.event for e in entries])
+        self.assertEquals(1380592800, entries[1].timestamp)
+        self.assertEquals("2013-10-01T02:00:00", entries[1].stamp)
+        self.assertFalse(hasattr(entries[0], "__dict__"))
+        self.assertRaises(ValueError, list,
+                          report.parse_entries(["BREAK 1 2013-10-01\n"]))
+        self.assertRaises(ValueError, list,
+                          report.parse_entries(["IN 1380589200\n"]))
+
+    def test_dates_only_when_needed(self):
+        entries = list(report.parse_entries([
+            _entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+            _entry("OUT", datetime(2013, 10, 1, 2, 0, 0)),
+            _entry("IN", datetime(2013, 10, 8, 1, 0, 0))]))
+        list(report.bucket_days(report.pair_sessions(entries),
+                                date(2013, 10, 1), date(2013, 10, 7)))
+        self.assertEquals([date(2013, 10, 1), None, None],
+                          [e._date for e in entries])
+
+    def test_pair_sessions(self):
+        entries = list(report.parse_entries([
+            _entry("OUT", datetime(2013, 10, 1, 0, 0, 0)),
+            _entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+            _entry("IN", datetime(2013, 10, 1, 2, 0, 0)),
+            _entry("OUT", datetime(2013, 10, 1, 3, 0, 0)),
+            _entry("IN", datetime(2013, 10, 1, 4, 0, 0))]))
+        sessions = list(report.pair_sessions(entries))
+        self.assertEquals([(entries[1], None, False),
+                           (entries[2], entries[3], False),
+                           (entries[4], None, True)],
+                          [(s.start, s.end, s.open) for s in sessions])
+        self.assertEquals([0, 3600, 1800],
+                          [s.seconds(now=_epoch(2013, 10, 1, 4, 30))
+                           for s in sessions])
+
+    def test_bucket_days(self):
+        self._log(_entry("IN", datetime(2013, 9, 30, 1, 0, 0)),
+                  _entry("OUT", datetime(2013, 9, 30, 8, 0, 0)),
+                  _entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+                  _entry("OUT", datetime(2013, 10, 1, 2, 14, 0)),
+                  _entry("IN", datetime(2013, 10, 1, 3, 10, 0)),
+                  _entry("OUT", datetime(2013, 10, 1, 3, 24, 0)),
+                  _entry("IN", datetime(2013, 10, 2, 1, 2, 0)),
+                  _entry("IN", datetime(2013, 10, 3, 23, 0, 0)),
+                  _entry("OUT", datetime(2013, 10, 4, 1, 0, 0)),
+                  _entry("IN", datetime(2013, 10, 8, 1, 0, 0)))
+        now = _epoch(2013, 10, 8, 2, 0)
+        self.assertEquals(
+            [("2013-10-01", 5280, False), ("2013-10-02", 0, False),
+             ("2013-10-03", 7200, False)],
+            list(report.daily_totals(report.read_lines(self.path),
+                                     date(2013, 10, 1), date(2013, 10, 7),
+                                     now)))
+        self.assertEquals(
+            [("2013-10-08", 3600, True)],
+            list(report.daily_totals(report.read_lines(self.path),
+                                     date(2013, 10, 8), date(2013, 10, 9),
+                                     now)))
+
+    def test_report_formats(self):
+        self._log(_entry("IN", datetime(2013, 10, 1, 1, 0, 0)),
+                  _entry("OUT", datetime(2013, 10, 1, 2, 30, 0)))
+        result = report.report(self.path, date(2013, 10, 1),
+                               date(2013, 10, 7))
+        self.assertEquals({"start": "2013-10-01", "end": "2013-10-07",
+                           "total": 5400,
+                           "days": [{"day": "2013-10-01", "seconds": 5400,
+                                     "clocked_in": False}]},
+                          json.loads(json.dumps(result)))
+        out = StringIO()
+        report.write_csv(result, out)
+        self.assertEquals("day,seconds,hours,clocked_in\r\n"
+                          "2013-10-01,5400,1.50,0\r\n", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Login sessions, read straight from utmp rather than by running w(1).
+
+timeclock uses this to see whether the user is logged in more than
+once. kill_idle_logins, run from cron, uses it to hang up a user's
+sessions once all of them have been idle too long:
+
+    */5  *  *  *  * /usr/local/sbin/kill_idle_logins [user]
+
+A session's idle time is how long since its terminal was last read
+from, as w(1) reports it.
+"""
+
+from __future__ import print_function
+import collections
+import errno
+import os
+import pwd
+import signal
+import struct
+import sys
+import time
+from optparse import OptionParser
+
+UTMP_FILE = "/var/run/utmp"
+DEV_DIR = "/dev"
+PROC_DIR = "/proc"
+KILL_IDLE_MINUTES = 10
+
+# struct utmp as glibc lays it out on Linux
+UTMP_RECORD = struct.Struct("<hxxi32s4s32s256shhiii16s20s")
+USER_PROCESS = 7
+
+Session = collections.namedtuple("Session", "user line host pid login_time")
+
+
+def _string(field):
+    return field.split("\0", 1)[0]
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def current_user():
+    return pwd.getpwuid(os.getuid()).pw_name
+
+
+def read_sessions(user=None, path=None):
+    """
+    Returns the login sessions in utmp, or just user's, whose login
+    process is still running.
+    """
+    try:
+        with open(path or UTMP_FILE, "rb") as f:
+            data = f.read()
+    except IOError, e:
+        if e.errno == errno.ENOENT:
+            return []
+        raise
+    sessions = []
+    for offset in range(0, len(data) - UTMP_RECORD.size + 1,
+                        UTMP_RECORD.size):
+        record = UTMP_RECORD.unpack_from(data, offset)
+        if record[0] != USER_PROCESS:
+            continue
+        name = _string(record[4])
+        if user is not None and name != user:
+            continue
+        if not _alive(record[1]):
+            continue
+        sessions.append(Session(name, _string(record[2]),
+                                _string(record[5]), record[1], record[9]))
+    return sessions
+
+
+def multiple_logins(user=None):
+    """
+    Returns True if user (by default, the current one) is logged in more
+    than once.
+    """
+    return len(read_sessions(user or current_user())) > 1
+
+
+def idle_time(line, now=None):
+    """
+    Returns the seconds since the terminal line was last read from, or
+    None if it can't be found.
+    """
+    now = time.time() if now is None else now
+    try:
+        return max(0, now - os.stat(os.path.join(DEV_DIR, line)).st_atime)
+    except OSError:
+        return None
+
+
+def tty_number(line):
+    """
+    Returns the device number of the terminal line as /proc/<pid>/stat
+    gives it, or None if it can't be found.
+    """
+    try:
+        rdev = os.stat(os.path.join(DEV_DIR, line)).st_rdev
+    except OSError:
+        return None
+    major, minor = os.major(rdev), os.minor(rdev)
+    return (minor & 0xff) | (major << 8) | ((minor & ~0xff) << 12)
+
+
+def processes():
+    """
+    Yields (pid, tty number, uid) for every running process.
+    """
+    for name in os.listdir(PROC_DIR):
+        if not name.isdigit():
+            continue
+        path = os.path.join(PROC_DIR, name)
+        try:
+            uid = os.stat(path).st_uid
+            with open(os.path.join(path, "stat")) as f:
+                stat = f.read()
+        except (IOError, OSError):
+            continue  # it's gone
+        # the command name may contain anything, so skip past it
+        fields = stat[stat.rindex(")") + 2:].split()
+        yield int(name), int(fields[4]), uid
+
+
+def reap(user, limit=KILL_IDLE_MINUTES * 60, now=None, sig=signal.SIGHUP,
+         dry_run=False):
+    """
+    If every one of user's sessions has been idle for more than limit
+    seconds, hangs them all up at once by sending sig to each of user's
+    processes on their terminals. Returns the sessions hung up.
+    """
+    sessions = read_sessions(user)
+    idle = [idle_time(session.line, now) for session in sessions]
+    if not sessions or min(t or 0 for t in idle) <= limit:
+        return []
+    if dry_run:
+        return sessions
+    ttys = set(tty_number(session.line) for session in sessions)
+    ttys.discard(None)
+    uid = pwd.getpwnam(user).pw_uid
+    for pid, tty, owner in processes():
+        if tty in ttys and owner == uid:
+            try:
+                os.kill(pid, sig)
+            except OSError, e:
+                if e.errno != errno.ESRCH:
+                    raise
+    return sessions
+
+
+def main(argv):
+    parser = OptionParser(usage="%prog [options] [user]")
+    parser.add_option('-m', '--idle-minutes', type='int',
+        default=KILL_IDLE_MINUTES,
+        help="Hang up once every session is idle this long (default %d)" %
+             KILL_IDLE_MINUTES)
+    parser.add_option('-n', '--dry-run', action='store_true', default=False,
+        help="Only show the sessions that would be hung up")
+    options, args = parser.parse_args(argv[1:])
+    user = args[0] if args else current_user()
+
+    for session in reap(user, options.idle_minutes * 60,
+                        dry_run=options.dry_run):
+        print("%s %s: idle more than %d minutes" % (
+            session.user, session.line, options.idle_minutes))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,101 @@
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+import unittest
+from mock import patch
+import sessions
+
+
+def _record(ut_type, pid, line, user, host="", login_time=0):
+    return sessions.UTMP_RECORD.pack(ut_type, pid, line, "", user, host,
+                                     0, 0, 0, login_time, 0, "", "")
+
+class sessionsTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = sessions.UTMP_FILE, sessions.DEV_DIR
+        sessions.UTMP_FILE = os.path.join(self.dir, "utmp")
+        sessions.DEV_DIR = self.dir
+        os.mkdir(os.path.join(self.dir, "pts"))
+        # a process that has exited
+        proc = subprocess.Popen(["true"])
+        proc.wait()
+        self.dead = proc.pid
+        self.pid = os.getpid()
+
+    def tearDown(self):
+        sessions.UTMP_FILE, sessions.DEV_DIR = self.saved
+        shutil.rmtree(self.dir)
+
+    def _utmp(self, *records):
+        with open(sessions.UTMP_FILE, "wb") as f:
+            f.write("".join(records))
+
+    def _tty(self, line, idle):
+        path = os.path.join(self.dir, line)
+        open(path, "w").close()
+        then = time.time() - idle
+        os.utime(path, (then, then))
+
+    def test_read_sessions(self):
+        self._utmp(_record(2, 0, "~", "reboot"),
+                   _record(7, self.pid, "pts/0", "acme", "10.0.0.1", 1000),
+                   _record(7, self.dead, "pts/1", "acme"),
+                   _record(8, self.pid, "pts/2", "acme"),
+                   _record(7, self.pid, "pts/3", "initech"))
+        self.assertEquals(
+            [sessions.Session("acme", "pts/0", "10.0.0.1", self.pid, 1000),
+             sessions.Session("initech", "pts/3", "", self.pid, 0)],
+            sessions.read_sessions())
+        self.assertEquals(["pts/3"], [s.line for s in
+                                      sessions.read_sessions("initech")])
+
+    def test_no_utmp(self):
+        self.assertEquals([], sessions.read_sessions())
+
+    def test_multiple_logins(self):
+        self._utmp(_record(7, self.pid, "pts/0", "acme"),
+                   _record(7, self.dead, "pts/1", "acme"))
+        self.assertFalse(sessions.multiple_logins("acme"))
+        self._utmp(_record(7, self.pid, "pts/0", "acme"),
+                   _record(7, self.pid, "pts/1", "acme"))
+        self.assertTrue(sessions.multiple_logins("acme"))
+
+    def test_idle_time(self):
+        self._tty("pts/0", 120)
+        self.assertTrue(119 < sessions.idle_time("pts/0") < 125)
+        self.assertEquals(None, sessions.idle_time("pts/9"))
+
+    @patch("sessions.os.kill")
+    @patch("sessions.pwd.getpwnam")
+    @patch("sessions.processes")
+    @patch("sessions.tty_number")
+    @patch("sessions._alive")
+    def test_reap(self, alive, tty_number, processes, getpwnam, kill):
+        alive.return_value = True
+        tty_number.side_effect = lambda line: int(line[-1])
+        getpwnam.return_value.pw_uid = 1000
+        processes.return_value = [(10, 0, 1000), (11, 1, 1000),
+                                  (12, 1, 0), (13, 2, 1000)]
+        self._utmp(_record(7, 10, "pts/0", "acme"),
+                   _record(7, 11, "pts/1", "acme"))
+        self._tty("pts/0", 3600)
+        self._tty("pts/1", 5)
+        self.assertEquals([], sessions.reap("acme", limit=600))
+        self.assertFalse(kill.called)
+
+        self._tty("pts/1", 601)
+        self.assertEquals(2, len(sessions.reap("acme", limit=600)))
+        self.assertEquals([((10, signal.SIGHUP), {}),
+                           ((11, signal.SIGHUP), {})], kill.call_args_list)
+
+    def test_processes(self):
+        me = [p for p in sessions.processes() if p[0] == self.pid]
+        self.assertEquals([(self.pid, me[0][1], os.getuid())], me)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,22 +11,268 @@ login killer script to prevent over-charging, like so:
 """
 
 from __future__ import print_function
+import bisect
+import contextlib
+import fcntl
 import time
 import os
 import datetime
-import subprocess
 from optparse import OptionParser
 
 __version__ = 0.05
 TIMECLOCK_FILE = "%s/.01timeclock" % os.environ['HOME']
+# fsync the log file after every entry
+FSYNC = False
+INDEX_FORMAT = "%s %012d %010d\n"
+INDEX_RECORD = 35
+
+
+_lock_fd = None
+
+
+@contextlib.contextmanager
+def log_lock():
+    """
+    Holds an exclusive flock on the timeclock log file, so that deciding
+    what to write from its last entry and writing it happen as one.
+    Yields a descriptor open for appending to it. Taking the lock again
+    while it's held just yields the same descriptor.
+    """
+    global _lock_fd
+    if _lock_fd is not None:
+        yield _lock_fd
+        return
+    fd = os.open(TIMECLOCK_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                 0644)
+    try:
+        # a child that inherited the descriptor would hold the lock too
+        fcntl.fcntl(fd, fcntl.F_SETFD,
+                    fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        _lock_fd = fd
+        yield fd
+    finally:
+        _lock_fd = None
+        os.close(fd)
 
 
 def write_log(data):
     """
-    Write data to the timeclock log file.
+    Write data to the timeclock log file, keeping its index up to date.
+    The entry goes out in a single write(), and is fsynced if FSYNC is
+    set.
+    """
+    record = data + "\n"
+    with log_lock() as fd:
+        fresh = index_is_fresh()
+        last = last_log_entry() if fresh else None
+        offset = os.fstat(fd).st_size
+        written = os.write(fd, record)
+        while written < len(record):
+            written += os.write(fd, record[written:])
+        if FSYNC:
+            os.fsync(fd)
+        if fresh:
+            update_index(data, offset, last)
+
+
+def index_file():
+    """
+    Returns the path of the index of the timeclock log file. The index
+    has a fixed width "YYYY-MM-DD offset seconds" record for each day
+    worked, giving the byte offset of the first IN entry that day and
+    the seconds worked in sessions clocked in that day.
+    """
+    return TIMECLOCK_FILE + ".idx"
+
+
+def index_is_fresh():
+    """
+    Returns True if the index exists and hasn't been overtaken by
+    changes to the log file.
+    """
+    try:
+        return (os.stat(index_file()).st_mtime >=
+                os.stat(TIMECLOCK_FILE).st_mtime)
+    except OSError:
+        return False
+
+
+def _day(epoch_time):
+    return datetime.date.fromtimestamp(int(epoch_time)).isoformat()
+
+
+def build_index():
+    """
+    Rebuilds the index from the log file. Returns the number of days
+    indexed, or None if the log file can't be indexed because its days
+    are out of order or it has entries that aren't IN or OUT.
+    """
+    with log_lock():
+        return _build_index()
+
+
+def _build_index():
+    days = []
+    offset = 0
+    clock_in_time = None
+    with open(TIMECLOCK_FILE, "rb") as f:
+        for line in f:
+            fields = line.split()
+            if not fields:
+                pass
+            elif fields[0] == "IN":
+                day = _day(fields[1])
+                clock_in_time = int(fields[1])
+                if not days or day > days[-1][0]:
+                    days.append([day, offset, 0])
+                elif day < days[-1][0]:
+                    remove_index()
+                    return None
+            elif fields[0] == "OUT":
+                if clock_in_time is not None:
+                    days[-1][2] += int(fields[1]) - clock_in_time
+            else:
+                remove_index()
+                return None
+            offset += len(line)
+    tmp = index_file() + ".tmp"
+    with open(tmp, "wb") as f:
+        f.writelines(INDEX_FORMAT % tuple(ent) for ent in days)
+    os.rename(tmp, index_file())
+    return len(days)
+
+
+def remove_index():
+    try:
+        os.unlink(index_file())
+    except OSError:
+        pass
+
+
+def update_index(data, offset, last):
+    """
+    Adds the entry data, just written to the log file at offset after
+    the entry last, to an up to date index. A new day's IN entry gets a
+    record of its own, and an OUT entry adds the session's length to the
+    day it was clocked in.
+    """
+    path = index_file()
+    fields = data.split()
+    with open(path, "r+b") as f:
+        index = IndexFile(f)
+        if fields[0] == "IN":
+            day = _day(fields[1])
+            if not len(index) or day > index[-1][0]:
+                index.append((day, offset, 0))
+            elif day < index[-1][0]:
+                remove_index()
+                return
+        elif last["event"] == "IN" and len(index):
+            day, start, seconds = index[-1]
+            index[-1] = (day, start,
+                         seconds + int(fields[1]) - last["timestamp"])
+        else:
+            # an OUT without an IN; leave it to build_index()
+            remove_index()
+            return
+    # the index now covers the log file as it is
+    os.utime(path, None)
+
+
+class IndexFile(object):
+    """
+    The (day, offset, seconds) records of an open index file as a
+    sequence, so that bisect can search it without reading it all.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        f.seek(0, os.SEEK_END)
+        self.count = f.tell() // INDEX_RECORD
+
+    def __len__(self):
+        return self.count
+
+    def _position(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return i * INDEX_RECORD
+
+    def __getitem__(self, i):
+        self.f.seek(self._position(i))
+        return self._parse(self.f.read(INDEX_RECORD))
+
+    def __setitem__(self, i, record):
+        self.f.seek(self._position(i))
+        self.f.write(INDEX_FORMAT % record)
+
+    def append(self, record):
+        self.f.seek(self.count * INDEX_RECORD)
+        self.f.write(INDEX_FORMAT % record)
+        self.count += 1
+
+    def records(self, start, stop):
+        """
+        Returns the records from start up to stop, in one read.
+        """
+        self.f.seek(start * INDEX_RECORD)
+        data = self.f.read((stop - start) * INDEX_RECORD)
+        return [self._parse(data[i:i + INDEX_RECORD])
+                for i in range(0, len(data), INDEX_RECORD)]
+
+    @staticmethod
+    def _parse(record):
+        day, offset, seconds = record.split()
+        return day, int(offset), int(seconds)
+
+
+def _indexed_day(day, offset):
+    """
+    Returns True if the log file has day's first IN entry at offset.
     """
-    with open(TIMECLOCK_FILE, "a") as f:
-        f.write(data + "\n")
+    with open(TIMECLOCK_FILE, "rb") as f:
+        f.seek(offset)
+        fields = f.readline().split()
+    return (fields[:1] == ["IN"] and fields[1].isdigit() and
+            _day(fields[1]) == day)
+
+
+def daily_totals(datestart, dateend):
+    """
+    Returns a (date, seconds, clocked_in) tuple for each day worked from
+    datestart to dateend, from the index. clocked_in is True for the
+    last day if it has a session still open, whose time so far is
+    included. Returns None if the log file can't be indexed.
+    """
+    if not os.path.exists(TIMECLOCK_FILE):
+        return None
+    for attempt in range(2):
+        if not index_is_fresh() and not build_index():
+            return None
+        with open(index_file(), "rb") as f:
+            index = IndexFile(f)
+            if not len(index):
+                return None
+            last_day, last_offset, last_seconds = index[-1]
+            if not _indexed_day(last_day, last_offset):
+                # the log file was changed under the index
+                remove_index()
+                continue
+            after = dateend + datetime.timedelta(days=1)
+            records = index.records(
+                bisect.bisect_left(index, (datestart.isoformat(), )),
+                bisect.bisect_left(index, (after.isoformat(), )))
+        totals = [(day, seconds, False) for day, offset, seconds in records]
+        lle = last_log_entry()
+        if (totals and totals[-1][0] == last_day and lle["event"] == "IN"):
+            totals[-1] = (last_day,
+                          last_seconds + int(time.time()) - lle["timestamp"],
+                          True)
+        return totals
+    return None
 
 
 def parse_log_entry(ent):
@@ -40,15 +286,36 @@ def parse_log_entry(ent):
             "timestamp_h": stamp}
 
 
+def read_last_line(f, blocksize=4096):
+    """
+    Returns the last non-blank line of the open file f, reading backward
+    from the end a block at a time so that the cost doesn't depend on
+    the size of the file. Returns '' if there's no such line.
+    """
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    data = ''
+    while pos > 0:
+        step = min(blocksize, pos)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + data
+        line = data.rstrip()
+        start = line.rfind('\n')
+        if start >= 0:
+            return line[start + 1:]
+    return data.strip()
+
+
 def last_log_entry():
     """
     Returns the most recently added timeclock log file entry. If
     the logfile is empty, a bogus clockout entry is returned.
     """
-    with open(TIMECLOCK_FILE, "r") as f:
-        data = f.readlines()
-    if data:
-        return parse_log_entry(data[-1])
+    with open(TIMECLOCK_FILE, "rb") as f:
+        line = read_last_line(f)
+    if line:
+        return parse_log_entry(line)
     else:
         return parse_log_entry("OUT 21421123 google")
 
@@ -57,11 +324,8 @@ def multiple_logins():
     """
     Checks if the current user is logged in multiple times. Returns a boolean.
     """
-    p = subprocess.Popen(['id', '-un'], stdout=subprocess.PIPE)
-    myid = p.communicate()[0].strip()
-    p = subprocess.Popen(['w', '-h', myid], stdout=subprocess.PIPE)
-    output = p.communicate()[0].splitlines()
-    return len(output) > 1
+    import sessions
+    return sessions.multiple_logins()
 
 
 def clock_in():
@@ -69,16 +333,17 @@ def clock_in():
     Clocks in the current user so he can begin working. This starts
     the timeclock.
     """
-    now = int(time.time())
-    stamp = datetime.datetime.now().isoformat()
-    lle = last_log_entry()
-    if lle['event'] == 'IN':
-        secs_clocked_in = (now - lle['timestamp'])
-        if secs_clocked_in > (now + 60 * 60 * 5):
-            print ("WARNING: You are already clocked in for %d hours" %
-                   (secs_clocked_in / (60 * 60)))
-    else:
-        write_log("IN %d %s" % (now, stamp))
+    with log_lock():
+        now = int(time.time())
+        stamp = datetime.datetime.now().isoformat()
+        lle = last_log_entry()
+        if lle['event'] == 'IN':
+            secs_clocked_in = (now - lle['timestamp'])
+            if secs_clocked_in > (now + 60 * 60 * 5):
+                print ("WARNING: You are already clocked in for %d hours" %
+                       (secs_clocked_in / (60 * 60)))
+        else:
+            write_log("IN %d %s" % (now, stamp))
 
 
 def clock_out(force=False):
@@ -87,70 +352,68 @@ def clock_out(force=False):
     who is logged in multiple times will not clock out unless
     force=True.
     """
-    now = int(time.time())
-    stamp = datetime.datetime.now().isoformat()
-    if last_log_entry()["event"] != "IN":
-        print("ERROR: you must clock in before clocking out.")
-    elif force is not True and multiple_logins():
-        print("INFO: Not clocking out, still logged in")
-    else:
-        write_log("OUT %d %s" % (int(now), stamp))
+    with log_lock():
+        now = int(time.time())
+        stamp = datetime.datetime.now().isoformat()
+        if last_log_entry()["event"] != "IN":
+            print("ERROR: you must clock in before clocking out.")
+        elif force is not True and multiple_logins():
+            print("INFO: Not clocking out, still logged in")
+        else:
+            write_log("OUT %d %s" % (int(now), stamp))
+
+
+def scan_totals(lines, datestart, dateend, now=None):
+    """
+    Returns a (date, seconds, clocked_in) tuple for each day worked from
+    datestart to dateend, as daily_totals() does, by reading every log
+    entry in lines. Raises ValueError if an entry can't be parsed.
+    """
+    import report
+    return list(report.daily_totals(lines, datestart, dateend, now))
 
 
-def calculate_daily_totals(datestart, dateend):
+def print_totals(totals, datestart, dateend):
+    """
+    Prints the daily totals from daily_totals() or scan_totals().
+    """
+    all_time_total = 0
+    for day, seconds, clocked_in in totals:
+        if clocked_in:
+            print("%s - %.1f (still clocked in)" % (day,
+                  seconds / (60.0 * 60)))
+        else:
+            print("%s - %.1f hours" % (day, seconds / (60.0 * 60)))
+        all_time_total += seconds
+    print("\n%.1f hours total between %s and %s" % (all_time_total/(60.0*60),
+          datestart.isoformat(), dateend.isoformat()))
+
+
+def calculate_daily_totals(datestart, dateend, binary=None):
     """
     Calculates the hours worked for each day within the time spanned
-    by datestart and dateend. Prints results to stdout.
+    by datestart and dateend. Prints results to stdout. The daily totals
+    in the index are used when there is one; otherwise the whole log file
+    is read. If binary is given, it's the path of a binary log (see
+    binlog.py) to report on instead.
     """
 
     if datestart is None:
         datestart = datetime.date.today() - datetime.timedelta(days=7)
         dateend = datetime.date.today()
-    with open(TIMECLOCK_FILE, "r") as f:
-        date_total = 0
-        all_time_total = 0
-        current_date = None
-        last_event = None
-        for ent in f:
-            entry = parse_log_entry(ent)
-            if entry["event"] == "IN":
-                last_event = "IN"
-                clock_in_time = entry["timestamp"]
-                clock_in_date = entry["timestamp_dt"].date()
-                if clock_in_date != current_date:
-                    if current_date and ((current_date >= datestart) and 
-                                         (current_date <= dateend)):
-                        print("%s - %.1f hours" % (current_date.isoformat(),
-                              date_total / (60.0 * 60)))
-                    all_time_total += date_total
-                    date_total = 0
-                    current_date = clock_in_date
-            elif entry["event"] == "OUT":
-                last_event = "OUT"
-                clock_out_time = entry["timestamp"]
-                if not (current_date >= datestart and
-                        current_date <= dateend):
-                    continue
-                else:
-                    date_total += clock_out_time - clock_in_time
-            else:
+    if binary is not None:
+        import binlog
+        totals = binlog.daily_totals(binary, datestart, dateend)
+    else:
+        totals = daily_totals(datestart, dateend)
+    if totals is None:
+        with open(TIMECLOCK_FILE, "r") as f:
+            try:
+                totals = scan_totals(f, datestart, dateend)
+            except ValueError:
                 print("Timeclock file parse error.")
                 raise SystemExit
-        if (current_date >= datestart and current_date <= dateend):
-            if last_event == "OUT":
-                print("%s - %.1f hours" % (clock_in_date.isoformat(),
-                      date_total / (60.0 * 60)))
-                all_time_total += date_total
-            elif last_event is None:
-                print("No records to report.")
-            else:
-                now = int(time.time())
-                print("%s - %.1f (still clocked in)" % (
-                    clock_in_date.isoformat(),
-                    (((now - clock_in_time) + date_total) / (60.0 * 60))))
-                all_time_total += (now - clock_in_time) + date_total
-        print("\n%.1f hours total between %s and %s" % (all_time_total/(60.0*60), 
-              datestart.isoformat(), dateend.isoformat()))
+    print_totals(totals, datestart, dateend)
 
 
 if __name__ == '__main__':
@@ -166,8 +429,14 @@ if __name__ == '__main__':
     parser.add_option('-f', '--force', action='store_true',
         help="Force clock out even with multiple logins", dest="force",
         default=False)
+    parser.add_option('-s', '--sync', action='store_true', dest="sync",
+        help="fsync the log after clocking in or out", default=False)
+    parser.add_option('-b', '--binary', action='store', dest="binary",
+        help="Report from this binary log (see binlog.py) instead",
+        default=None)
 
     options, args = parser.parse_args(sys.argv)
+    FSYNC = options.sync
 
     funcs = {'in': clock_in,
             'out': clock_out,
@@ -176,7 +445,7 @@ if __name__ == '__main__':
         if len(args) > 1:
             parser.print_help()
         else:
-            calculate_daily_totals(*(None, None))
+            calculate_daily_totals(*(None, None), binary=options.binary)
     elif (options.report):
         fmt = "%Y%m%d"
         try:
@@ -185,7 +454,8 @@ if __name__ == '__main__':
         except Exception as e:
             print("ERROR: Date ranges must be in YYYYMMDD format.")
             raise SystemExit
-        calculate_daily_totals(*(starttime.date(), endtime.date()))
+        calculate_daily_totals(*(starttime.date(), endtime.date()),
+                               binary=options.binary)
     elif (options.clockout):
         clock_out(options.force)
     elif (options.clockin):
@@ -1,3 +1,9 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 from mock import Mock, patch, MagicMock, call
 import timeclock as tc
@@ -9,10 +15,12 @@ def _entry(action, date):
 
 class clockTests(unittest.TestCase):
     def setUp(self):
-        pass
+        # no log on disk, so there's nothing to index
+        self.saved = tc.TIMECLOCK_FILE
+        tc.TIMECLOCK_FILE = "/nonexistent/.01timeclock"
 
     def tearDown(self):
-        pass
+        tc.TIMECLOCK_FILE = self.saved
 
     @patch('__builtin__.print')
     @patch("__builtin__.open")
@@ -65,5 +73,204 @@ class clockTests(unittest.TestCase):
             call('\n3.0 hours total between 2013-10-01 and 2013-10-07')])
 
 
+class lastLogEntryTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = tc.TIMECLOCK_FILE
+        tc.TIMECLOCK_FILE = os.path.join(self.dir, "timeclock")
+
+    def tearDown(self):
+        tc.TIMECLOCK_FILE = self.saved
+        shutil.rmtree(self.dir)
+
+    def _write(self, data):
+        with open(tc.TIMECLOCK_FILE, "w") as f:
+            f.write(data)
+
+    def test_last_log_entry(self):
+        first = _entry("IN", datetime(2013, 10, 1, 1, 0, 0))
+        last = _entry("OUT", datetime(2013, 10, 1, 2, 14, 0))
+        self._write("%s\n%s\n" % (first, last))
+        self.assertEquals(tc.parse_log_entry(last), tc.last_log_entry())
+
+    def test_last_log_entry__no_trailing_newline(self):
+        first = _entry("IN", datetime(2013, 10, 1, 1, 0, 0))
+        last = _entry("OUT", datetime(2013, 10, 1, 2, 14, 0))
+        self._write("%s\n%s" % (first, last))
+        self.assertEquals(tc.parse_log_entry(last), tc.last_log_entry())
+
+    def test_last_log_entry__single_entry(self):
+        only = _entry("IN", datetime(2013, 10, 1, 1, 0, 0))
+        self._write(only)
+        self.assertEquals(tc.parse_log_entry(only), tc.last_log_entry())
+
+    def test_last_log_entry__empty(self):
+        self._write("")
+        self.assertEquals("OUT", tc.last_log_entry()["event"])
+        self._write("\n\n")
+        self.assertEquals("OUT", tc.last_log_entry()["event"])
+
+    def test_read_last_line__spans_blocks(self):
+        entries = [_entry("IN", datetime(2013, 10, 1, 1, 0, i))
+                   for i in range(50)]
+        self._write("\n".join(entries) + "\n\n")
+        with open(tc.TIMECLOCK_FILE, "rb") as f:
+            self.assertEquals(entries[-1], tc.read_last_line(f, blocksize=7))
+
+
+class indexTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = tc.TIMECLOCK_FILE
+        tc.TIMECLOCK_FILE = os.path.join(self.dir, "timeclock")
+        for day in range(1, 29):
+            for hour in (1, 5):
+                tc.write_log(_entry("IN", datetime(2013, 9, day, hour, 0)))
+                tc.write_log(_entry("OUT", datetime(2013, 9, day, hour, 30)))
+
+    def tearDown(self):
+        tc.TIMECLOCK_FILE = self.saved
+        shutil.rmtree(self.dir)
+
+    def _report(self, start, end):
+        with patch('__builtin__.print') as mockprint:
+            tc.calculate_daily_totals(start, end)
+        return mockprint.call_args_list
+
+    def _full_report(self, start, end):
+        with patch.object(tc, 'daily_totals', return_value=None):
+            return self._report(start, end)
+
+    def _index(self):
+        with open(tc.index_file()) as f:
+            return [(day, int(offset), int(seconds))
+                    for day, offset, seconds in (line.split() for line in f)]
+
+    def _age_index(self):
+        stamp = os.stat(tc.TIMECLOCK_FILE).st_mtime
+        os.utime(tc.index_file(), (stamp - 10, stamp - 10))
+
+    def test_report_matches_full_scan(self):
+        for start, end in [(date(2013, 9, 10), date(2013, 9, 12)),
+                           (date(2013, 8, 1), date(2013, 9, 1)),
+                           (date(2013, 9, 28), date(2013, 10, 7)),
+                           (date(2013, 10, 1), date(2013, 10, 7))]:
+            self.assertEquals(self._full_report(start, end),
+                              self._report(start, end))
+
+    def test_report_reads_no_entries(self):
+        self._report(date(2013, 9, 10), date(2013, 9, 12))
+        with patch.object(tc, 'parse_log_entry',
+                          side_effect=tc.parse_log_entry) as parse:
+            self._report(date(2013, 9, 10), date(2013, 9, 12))
+        # just the last one, to see if it's an open session
+        self.assertEquals(1, parse.call_count)
+
+    def test_open_session(self):
+        tc.write_log(_entry("IN", datetime(2013, 9, 28, 8, 0)))
+        now = int(datetime(2013, 9, 28, 10, 30).strftime("%s"))
+        start, end = date(2013, 9, 27), date(2013, 9, 28)
+        with patch.object(tc.time, 'time', return_value=now):
+            self.assertEquals(self._full_report(start, end),
+                              self._report(start, end))
+            self.assertEquals(call("2013-09-28 - 3.5 (still clocked in)"),
+                              self._report(start, end)[1])
+
+    def test_out_without_in(self):
+        tc.build_index()
+        tc.write_log(_entry("OUT", datetime(2013, 9, 28, 8, 0)))
+        self.assertFalse(os.path.exists(tc.index_file()))
+        start, end = date(2013, 9, 27), date(2013, 9, 28)
+        self.assertEquals(self._full_report(start, end),
+                          self._report(start, end))
+
+    def test_index_built_and_appended(self):
+        self._report(date(2013, 9, 1), date(2013, 9, 2))
+        self.assertEquals(28, len(self._index()))
+        offset = os.path.getsize(tc.TIMECLOCK_FILE)
+        tc.write_log(_entry("IN", datetime(2013, 9, 29, 1, 0)))
+        tc.write_log(_entry("OUT", datetime(2013, 9, 29, 2, 0)))
+        self.assertTrue(tc.index_is_fresh())
+        self.assertEquals(("2013-09-29", offset, 3600), self._index()[-1])
+        self.assertEquals(("2013-09-28", 3600), self._index()[-2][::2])
+
+    def test_stale_index_rebuilt(self):
+        tc.build_index()
+        self._age_index()
+        self.assertFalse(tc.index_is_fresh())
+        # a stale index isn't appended to
+        tc.write_log(_entry("IN", datetime(2013, 9, 29, 1, 0)))
+        self.assertEquals(28, len(self._index()))
+        self._report(date(2013, 9, 1), date(2013, 9, 2))
+        self.assertEquals(29, len(self._index()))
+        self.assertTrue(tc.index_is_fresh())
+
+    def test_edited_log_repaired(self):
+        tc.build_index()
+        with open(tc.TIMECLOCK_FILE, "r") as f:
+            lines = f.readlines()
+        with open(tc.TIMECLOCK_FILE, "w") as f:
+            f.writelines(lines[4:])
+        # edited without the index noticing
+        os.utime(tc.index_file(), None)
+        start, end = date(2013, 9, 2), date(2013, 9, 3)
+        self.assertEquals(self._full_report(start, end),
+                          self._report(start, end))
+        self.assertEquals("2013-09-02", self._index()[0][0])
+
+    def test_out_of_order_not_indexed(self):
+        tc.write_log(_entry("IN", datetime(2013, 9, 2, 1, 0)))
+        tc.write_log(_entry("OUT", datetime(2013, 9, 2, 2, 0)))
+        self.assertEquals(None, tc.daily_totals(date(2013, 9, 1),
+                                                date(2013, 9, 2)))
+        self.assertFalse(os.path.exists(tc.index_file()))
+
+
+class lockTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = tc.TIMECLOCK_FILE
+        tc.TIMECLOCK_FILE = os.path.join(self.dir, "timeclock")
+
+    def tearDown(self):
+        tc.TIMECLOCK_FILE = self.saved
+        shutil.rmtree(self.dir)
+
+    def _entries(self):
+        with open(tc.TIMECLOCK_FILE) as f:
+            return [line.split()[0] for line in f]
+
+    def test_clock_in_waits_for_lock(self):
+        here = os.path.dirname(os.path.abspath(__file__))
+        script = ("import timeclock as tc; tc.TIMECLOCK_FILE = %r; "
+                  "tc.clock_in()" % tc.TIMECLOCK_FILE)
+        with tc.log_lock():
+            tc.write_log(_entry("IN", datetime(2013, 10, 1, 1, 0, 0)))
+            proc = subprocess.Popen([sys.executable, "-c", script],
+                                    cwd=here)
+            time.sleep(0.2)
+            self.assertEquals(None, proc.poll())
+            tc.write_log(_entry("OUT", datetime(2013, 10, 1, 2, 0, 0)))
+        self.assertEquals(0, proc.wait())
+        self.assertEquals(["IN", "OUT", "IN"], self._entries())
+
+    @patch("timeclock.os.fsync")
+    def test_fsync(self, fsync):
+        tc.write_log(_entry("IN", datetime(2013, 10, 1, 1, 0, 0)))
+        self.assertFalse(fsync.called)
+        tc.FSYNC = True
+        try:
+            tc.write_log(_entry("OUT", datetime(2013, 10, 1, 2, 0, 0)))
+        finally:
+            tc.FSYNC = False
+        self.assertEquals(1, fsync.call_count)
+
+    @patch("timeclock.os.write")
+    def test_one_write_per_entry(self, write):
+        write.side_effect = lambda fd, data: len(data)
+        tc.write_log(_entry("IN", datetime(2013, 10, 1, 1, 0, 0)))
+        self.assertEquals(1, write.call_count)
+
+
 if __name__ == "__main__":
     unittest.main()